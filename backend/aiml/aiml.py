@@ -2,118 +2,950 @@
 Buildease AI/ML Service
 ========================
 - Multi-floor architectural blueprint generation (Ground / First / Second)
+- Background blueprint jobs with per-floor progress (polling or server-sent events)
+- `candidates=N` blueprint mode: layout variants scored in bulk, best few rendered
 - ML-based cost estimation using Polynomial Ridge Regression
 - Budget prediction with category breakdown & monthly projection
 - Contractor quotation generator with construction phases
 - Extra-features parser: study, pooja, gym, terrace, etc.
+- Versioned model artifact, prebuilt with `python aiml.py build-model`
+- Precomputed estimate grid (interpolated lookups, served at /api/ai/estimate-grid)
+- Scenario sweeps: cost surfaces over area × quality × floors × materials grids
+- Rate tables loaded from rates.json, hot-reloaded via /admin/reload or file watch
+- Prometheus /metrics with per-route and per-stage latency; opt-in slow-request profiler
+- ASGI mode (`uvicorn asgi:app`): inline estimates, bounded blueprint pool with 429 shedding
+- AIML_ROLE=estimator|renderer|all; matplotlib and scikit-learn load only when needed
 """
 
-import io, os, math, base64
+import io, os, re, sys, hmac, math, json, uuid, random, time, atexit, base64, bisect, hashlib, tempfile, threading
+_import_t0 = time.perf_counter()
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from types import MappingProxyType
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from functools import partial
+from xml.sax.saxutils import escape as xml_escape
 import numpy as np
-from flask import Flask, request, jsonify
+from flask import Flask, Response, g, request, jsonify, send_file, abort
 from flask_cors import CORS
-import matplotlib
-matplotlib.use('Agg')
-import matplotlib.pyplot as plt
-from matplotlib.patches import Rectangle, Arc
-from sklearn.linear_model import Ridge
-from sklearn.preprocessing import PolynomialFeatures
-from sklearn.pipeline import make_pipeline
+# matplotlib, scikit-learn and joblib are imported on first use (see
+# _import_matplotlib, _new_pipeline, load_cost_pipeline), so estimator
+# workers serving from prebuilt artifacts never load them.
 
 app = Flask(__name__)
 CORS(app)
 
-plt.rcParams['font.family'] = 'sans-serif'
-plt.rcParams['font.sans-serif'] = ['Arial', 'Helvetica', 'DejaVu Sans']
+# ── Service role ──
+# `estimator` workers serve the cost routes, `renderer` workers the blueprint
+# routes, `all` (default) both; routes of the other role return 404 so the
+# two can be scaled separately behind one proxy.
+SERVICE_ROLES = ('estimator', 'renderer', 'all')
+SERVICE_ROLE = os.environ.get('AIML_ROLE', 'all')
+if SERVICE_ROLE not in SERVICE_ROLES:
+    raise ValueError(f"AIML_ROLE must be one of {', '.join(SERVICE_ROLES)}")
+ESTIMATES = SERVICE_ROLE in ('estimator', 'all')
+RENDERS = SERVICE_ROLE in ('renderer', 'all')
+_ROLE_PREFIXES = {
+    'estimator': ('/api/ai/estimate', '/api/ai/quotation', '/api/ai/prediction',
+                  '/api/ai/sweep', '/api/ai/market-rates'),
+    'renderer': ('/api/ai/blueprint',),
+}
+
+def serves(path):
+    """Whether this worker's role handles `path` (shared routes like /health always)."""
+    for role, prefixes in _ROLE_PREFIXES.items():
+        if path.startswith(prefixes):
+            return SERVICE_ROLE in (role, 'all')
+    return True
+
+STARTUP = {'importSeconds': None, 'modelLoadSeconds': None}
+
+def _peak_rss_mb():
+    # VmHWM is per address space; ru_maxrss would include a forking parent's peak
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return round(int(line.split()[1]) / 1024, 1)
+    except OSError:
+        pass
+    try:
+        import resource
+    except ImportError:     # Windows
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(rss / (1 << 20 if sys.platform == 'darwin' else 1 << 10), 1)
+
+def startup_report():
+    """Role, import and model-load time, peak RSS and which heavy libraries are loaded."""
+    return {'role': SERVICE_ROLE, **STARTUP, 'maxRssMB': _peak_rss_mb(),
+            'loaded': {m: m in sys.modules for m in ('matplotlib', 'sklearn', 'joblib')}}
 
 # ═══════════════════════════════════════════════════════════════════════════════
-# MARKET DATA  (Indian construction rates 2025-26)
+# METRICS  (Prometheus text exposition, per-stage timings, slow-request profiler)
 # ═══════════════════════════════════════════════════════════════════════════════
+# Metrics live in this process, so under gunicorn each worker exposes its own
+# series on /metrics (scrape workers individually or run one per container).
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+def _fmt_labels(names, values):
+    if not names:
+        return ''
+    esc = (str(v).replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n') for v in values)
+    return '{' + ','.join(f'{n}="{v}"' for n, v in zip(names, esc)) + '}'
+
+def _metric_family(name, doc, kind, samples):
+    """Exposition lines for a family of (label_names, label_values, value) samples."""
+    yield f'# HELP {name} {doc}'
+    yield f'# TYPE {name} {kind}'
+    for names, values, value in samples:
+        yield f'{name}{_fmt_labels(names, values)} {value}'
+
+class Counter:
+    def __init__(self, name, doc, labelnames=()):
+        self.name, self.doc, self.labelnames = name, doc, tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def collect(self):
+        with self._lock:
+            items = sorted(self._values.items())
+        return _metric_family(self.name, self.doc, 'counter',
+                              ((self.labelnames, k, v) for k, v in items))
+
+class Histogram:
+    def __init__(self, name, doc, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name, self.doc, self.labelnames = name, doc, tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, *labels):
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][i] += 1
+            series[1] += value
+
+    def collect(self):
+        with self._lock:
+            items = sorted((k, list(c), s) for k, (c, s) in self._series.items())
+        yield f'# HELP {self.name} {self.doc}'
+        yield f'# TYPE {self.name} histogram'
+        names = self.labelnames + ('le',)
+        for labels, counts, total in items:
+            cum = 0
+            for le, n in zip(self.buckets + ('+Inf',), counts):
+                cum += n
+                yield f'{self.name}_bucket{_fmt_labels(names, labels + (le,))} {cum}'
+            yield f'{self.name}_sum{_fmt_labels(self.labelnames, labels)} {total:.6f}'
+            yield f'{self.name}_count{_fmt_labels(self.labelnames, labels)} {cum}'
+
+REQUEST_SECONDS = Histogram('aiml_request_duration_seconds',
+                            'HTTP request latency by route.', ('route', 'method', 'status'))
+STAGE_SECONDS = Histogram('aiml_stage_duration_seconds',
+                          'Time per request spent in each stage (summed across floors).',
+                          ('route', 'stage'))
+SLOW_PROFILES = Counter('aiml_slow_request_profiles_total',
+                        'Slow requests captured by the sampling profiler.', ('route',))
+
+# Callables yielding exposition lines for state owned elsewhere (caches, pools, model)
+METRIC_COLLECTORS = [REQUEST_SECONDS.collect, STAGE_SECONDS.collect, SLOW_PROFILES.collect]
+
+def render_metrics():
+    lines = [line for collect in METRIC_COLLECTORS for line in collect()]
+    return '\n'.join(lines) + '\n'
+
+# ── Stage timing ──
+# A request collects {stage: seconds} in a thread-local dict; stages hit
+# several times (e.g. once per floor) accumulate. Outside a request (CLI,
+# pool workers without a collector) stage() only costs two clock reads.
+
+_stage_local = threading.local()
+
+def record_stage(name, seconds):
+    acc = getattr(_stage_local, 'stages', None)
+    if acc is not None:
+        acc[name] = acc.get(name, 0.0) + seconds
+
+@contextmanager
+def stage(name):
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_stage(name, time.perf_counter() - t0)
+
+@contextmanager
+def collect_stages():
+    """Collect the stages timed in this thread into a fresh dict."""
+    prev = getattr(_stage_local, 'stages', None)
+    acc = _stage_local.stages = {}
+    try:
+        yield acc
+    finally:
+        _stage_local.stages = prev
+
+# ── Slow-request sampling profiler (opt-in) ──
+
+PROFILE_SLOW_MS = float(os.environ.get('AIML_PROFILE_SLOW_MS', 0))
+PROFILE_INTERVAL_MS = float(os.environ.get('AIML_PROFILE_INTERVAL_MS', 5))
+PROFILE_DIR = os.environ.get('AIML_PROFILE_DIR',
+                             os.path.join(tempfile.gettempdir(), 'buildease-profiles'))
+
+class SlowRequestProfiler:
+    """
+    Samples the stacks of request threads every `interval_ms` from a single
+    daemon thread. When a request finishes above `slow_ms`, its samples are
+    written in collapsed-stack format (flamegraph.pl / speedscope) to
+    `out_dir`; faster requests' samples are simply dropped.
+    """
 
-CITY_DATA = {
-    'bangalore': {
-        'basic':   {'min': 1400, 'max': 1700, 'avg': 1550},
-        'mid':     {'min': 1750, 'max': 2100, 'avg': 1900},
-        'premium': {'min': 2200, 'max': 2800, 'avg': 2500},
-        'labor_index': 1.0,  'land_appreciation': 8.5,
-    },
-    'mumbai': {
-        'basic':   {'min': 1700, 'max': 2100, 'avg': 1900},
-        'mid':     {'min': 2100, 'max': 2600, 'avg': 2350},
-        'premium': {'min': 2700, 'max': 3400, 'avg': 3050},
-        'labor_index': 1.15, 'land_appreciation': 6.2,
-    },
-    'delhi': {
-        'basic':   {'min': 1500, 'max': 1850, 'avg': 1650},
-        'mid':     {'min': 1900, 'max': 2300, 'avg': 2100},
-        'premium': {'min': 2400, 'max': 3000, 'avg': 2700},
-        'labor_index': 1.05, 'land_appreciation': 7.0,
-    },
-    'chennai': {
-        'basic':   {'min': 1350, 'max': 1650, 'avg': 1500},
-        'mid':     {'min': 1700, 'max': 2050, 'avg': 1850},
-        'premium': {'min': 2100, 'max': 2700, 'avg': 2400},
-        'labor_index': 0.95, 'land_appreciation': 7.5,
-    },
-    'hyderabad': {
-        'basic':   {'min': 1300, 'max': 1600, 'avg': 1450},
-        'mid':     {'min': 1650, 'max': 2000, 'avg': 1800},
-        'premium': {'min': 2050, 'max': 2650, 'avg': 2350},
-        'labor_index': 0.92, 'land_appreciation': 9.0,
-    },
-    'pune': {
-        'basic':   {'min': 1400, 'max': 1750, 'avg': 1575},
-        'mid':     {'min': 1800, 'max': 2150, 'avg': 1950},
-        'premium': {'min': 2250, 'max': 2850, 'avg': 2550},
-        'labor_index': 0.98, 'land_appreciation': 7.8,
-    },
-}
+    def __init__(self, slow_ms, interval_ms, out_dir, keep=50):
+        self.slow_ms = slow_ms
+        self.interval = interval_ms / 1000
+        self.out_dir = out_dir
+        self.recent = deque(maxlen=keep)
+        self._active = {}            # thread ident -> {folded stack: samples}
+        self._lock = threading.Lock()
+        self._thread = None
+
+    @property
+    def enabled(self):
+        return self.slow_ms > 0
+
+    def begin(self):
+        ident = threading.get_ident()
+        with self._lock:
+            self._active[ident] = {}
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='aiml-profiler',
+                                                daemon=True)
+                self._thread.start()
+
+    def end(self, route, seconds):
+        with self._lock:
+            samples = self._active.pop(threading.get_ident(), None)
+        if not samples or seconds * 1000 < self.slow_ms:
+            return None
+        slug = re.sub(r'[^A-Za-z0-9]+', '_', route).strip('_') or 'root'
+        name = f"{time.strftime('%Y%m%dT%H%M%S')}-{slug}-{round(seconds * 1000)}ms.folded"
+        try:
+            os.makedirs(self.out_dir, exist_ok=True)
+            with open(os.path.join(self.out_dir, name), 'w') as f:
+                f.writelines(f'{stack} {n}\n' for stack, n in samples.items())
+        except OSError as e:
+            print(f"Could not write profile {name}: {e}")
+            return None
+        SLOW_PROFILES.inc(route)
+        self.recent.append({'route': route, 'ms': round(seconds * 1000, 1), 'file': name,
+                            'samples': sum(samples.values())})
+        return name
+
+    def _run(self):
+        me = threading.get_ident()
+        while True:
+            time.sleep(self.interval)
+            with self._lock:
+                idents = [i for i in self._active if i != me]
+            if not idents:
+                continue
+            frames = sys._current_frames()
+            for ident in idents:
+                frame = frames.get(ident)
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f'{os.path.basename(code.co_filename)}:{code.co_name}')
+                    frame = frame.f_back
+                folded = ';'.join(reversed(stack))
+                with self._lock:
+                    samples = self._active.get(ident)
+                    if samples is not None:
+                        samples[folded] = samples.get(folded, 0) + 1
+
+PROFILER = SlowRequestProfiler(PROFILE_SLOW_MS, PROFILE_INTERVAL_MS, PROFILE_DIR)
 
-QUALITY_MAP = {'basic': 0, 'mid': 1, 'premium': 2}
 
-COST_BREAKDOWN = {
-    'foundation': 0.12, 'structure': 0.18, 'brickwork': 0.10,
-    'plumbing': 0.08, 'electrical': 0.07, 'flooring': 0.10,
-    'doors_windows': 0.08, 'painting': 0.05, 'kitchen': 0.06,
-    'bathroom': 0.06, 'miscellaneous': 0.10,
-}
+# ═══════════════════════════════════════════════════════════════════════════════
+# MARKET DATA  (versioned rate tables, hot-reloadable)
+# ═══════════════════════════════════════════════════════════════════════════════
+
+RATES_FILE = os.environ.get('AIML_RATES_FILE',
+                            os.path.join(os.path.dirname(os.path.abspath(__file__)), 'rates.json'))
+
+class RateIndex:
+    """
+    One loaded version of the rate tables plus read-only lookups built from
+    it, so request handlers never scan the dicts: city → index,
+    [city, quality] → (min, max, avg), and the pre-serialised
+    /api/ai/market-rates body with its ETag.
+    """
+    __slots__ = ('version', 'city_data', 'quality_map', 'cost_breakdown', 'key',
+                 'cities', 'city_idx', 'quality_idx', 'rates', 'labor', 'shares',
+                 'market_rates_body', 'market_rates_etag')
+
+    def __init__(self, city_data, quality_map, cost_breakdown, version=''):
+        self.version = version
+        self.city_data = MappingProxyType(city_data)
+        self.quality_map = MappingProxyType(dict(quality_map))
+        self.cost_breakdown = MappingProxyType(dict(cost_breakdown))
+        blob = json.dumps({'city': city_data, 'quality': quality_map}, sort_keys=True)
+        self.key = hashlib.sha256(blob.encode('utf-8')).hexdigest()[:16]
+
+        self.cities = tuple(city_data)
+        self.city_idx = MappingProxyType({c: i for i, c in enumerate(self.cities)})
+        self.quality_idx = self.quality_map
+        qualities = sorted(quality_map, key=quality_map.get)
+        self.rates = np.array([[[city_data[c][q][k] for k in ('min', 'max', 'avg')]
+                                for q in qualities] for c in self.cities])
+        self.labor = np.array([city_data[c]['labor_index'] for c in self.cities])
+        self.shares = np.array(list(cost_breakdown.values()), dtype=float)
+        for arr in (self.rates, self.labor, self.shares):
+            arr.setflags(write=False)
+
+        market = {c: {'basic': info['basic']['avg'], 'mid': info['mid']['avg'],
+                      'premium': info['premium']['avg'],
+                      'appreciation': info['land_appreciation']}
+                  for c, info in city_data.items()}
+        self.market_rates_body = json.dumps(market, sort_keys=True,
+                                            separators=(',', ':')).encode('utf-8')
+        self.market_rates_etag = hashlib.sha256(self.market_rates_body).hexdigest()[:16]
+
+    def city(self, name):
+        """Index of `name`, falling back to the first city like the handlers always have."""
+        return self.city_idx.get(name, 0)
+
+    def rate_info(self, city, quality):
+        lo, hi, avg = self.rates[self.city(city), self.quality_idx[quality]].tolist()
+        return {'min': lo, 'max': hi, 'avg': avg}
+
+def load_rate_tables(path=RATES_FILE):
+    """Read and validate a rate-table file; raise ValueError if it is malformed."""
+    with open(path, encoding='utf-8') as f:
+        raw = json.load(f)
+    try:
+        cities, quality = raw['cities'], raw['quality']
+        breakdown = raw['cost_breakdown']
+        if not cities or sorted(quality.values()) != list(range(len(quality))):
+            raise ValueError("'cities' must be non-empty and quality codes 0..n-1")
+        return RateIndex(cities, quality, breakdown, str(raw.get('version', '')))
+    except (KeyError, TypeError) as e:
+        raise ValueError(f"Malformed rate table {path}: {e!r}") from e
 
 # ═══════════════════════════════════════════════════════════════════════════════
 # ML MODEL
 # ═══════════════════════════════════════════════════════════════════════════════
 
-def generate_training_data():
-    np.random.seed(42)
-    X, y = [], []
-    for city_name, city_info in CITY_DATA.items():
-        ci = list(CITY_DATA.keys()).index(city_name)
-        for qname, qi in QUALITY_MAP.items():
-            rates = city_info[qname]
-            for _ in range(200):
-                area = np.random.randint(500, 5000)
-                mat  = np.random.choice([0, 1])
-                fl   = np.random.randint(1, 4)
-                rate = np.random.uniform(rates['min'], rates['max'])
-                cost = area * rate * (1.0 if mat == 0 else 1.35)
-                cost *= (1.0 + (fl - 1) * 0.08) * city_info['labor_index']
-                cost *= np.random.normal(1.0, 0.03)
-                X.append([ci, area, qi, mat, fl])
-                y.append(cost)
-    return np.array(X), np.array(y)
-
-def train_model():
-    X, y = generate_training_data()
-    m = make_pipeline(PolynomialFeatures(degree=2, include_bias=False), Ridge(alpha=1.0))
+TRAIN_SAMPLES_PER_CELL = int(os.environ.get('AIML_TRAIN_SAMPLES', 200))
+ENSEMBLE_MEMBERS = int(os.environ.get('AIML_ENSEMBLE_MEMBERS', 32))
+
+def generate_training_data(samples_per_cell=TRAIN_SAMPLES_PER_CELL, seed=42, tables=None):
+    """
+    Synthetic (city, area, quality, material, floors) → cost samples,
+    `samples_per_cell` rows for every city × quality pair, built in one batch.
+    """
+    idx = tables or rate_tables()
+    rng = np.random.default_rng(seed)
+    n_city, n_q = idx.rates.shape[:2]
+
+    cell = np.repeat(np.arange(n_city * n_q), samples_per_cell)
+    ci, qi = np.divmod(cell, n_q)
+    n = cell.size
+
+    area = rng.integers(500, 5000, n)
+    mat  = rng.integers(0, 2, n)
+    fl   = rng.integers(1, 4, n)
+    rate = rng.uniform(idx.rates[ci, qi, 0], idx.rates[ci, qi, 1])
+    cost = area * rate * np.where(mat == 0, 1.0, 1.35)
+    cost *= (1.0 + (fl - 1) * 0.08) * idx.labor[ci]
+    cost *= rng.normal(1.0, 0.03, n)
+
+    X = np.column_stack([ci, area, qi, mat, fl]).astype(float)
+    return X, cost
+
+def _new_pipeline():
+    """Unfitted PolynomialFeatures(2) + Ridge pipeline; imports scikit-learn on first use."""
+    from sklearn.linear_model import Ridge
+    from sklearn.pipeline import make_pipeline
+    from sklearn.preprocessing import PolynomialFeatures
+    return make_pipeline(PolynomialFeatures(degree=2, include_bias=False), Ridge(alpha=1.0))
+
+def train_model(samples_per_cell=TRAIN_SAMPLES_PER_CELL, tables=None):
+    X, y = generate_training_data(samples_per_cell, tables=tables)
+    m = _new_pipeline()
     m.fit(X, y)
     return m
 
-cost_model = train_model()
-print("ML Model trained successfully.")
+# ── Persisted model artifact ──
+# Bump MODEL_VERSION whenever training code changes in a way the rate tables
+# do not capture, so stale artifacts are never picked up.
+MODEL_VERSION = 4
+MODEL_DIR = os.environ.get('AIML_MODEL_DIR',
+                           os.path.join(os.path.dirname(os.path.abspath(__file__)), 'models'))
+
+def model_key(tables=None):
+    """Short hash of the rate tables and sample count the model is trained on."""
+    idx = tables or rate_tables()
+    blob = f"{idx.key}:{TRAIN_SAMPLES_PER_CELL}:{ENSEMBLE_MEMBERS}"
+    return hashlib.sha256(blob.encode('utf-8')).hexdigest()[:16]
+
+def model_path(tables=None):
+    return os.path.join(MODEL_DIR, f"cost_model-v{MODEL_VERSION}-{model_key(tables)}.joblib")
+
+def evaluator_path(tables=None):
+    return os.path.join(MODEL_DIR, f"cost_evaluator-v{MODEL_VERSION}-{model_key(tables)}.npz")
+
+def _write_atomic(path, write):
+    """Call write(tmp_path) on a temp file in MODEL_DIR, then move it to `path`."""
+    os.makedirs(MODEL_DIR, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=MODEL_DIR, suffix='.tmp')
+    os.close(fd)
+    try:
+        write(tmp)
+        os.replace(tmp, path)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+
+def build_model_artifact(force=False, tables=None):
+    """
+    Train the cost model and write it atomically to MODEL_DIR, together with
+    its closed-form evaluator, bootstrap ensemble and estimate grid; return
+    the model path.
+    """
+    path = model_path(tables)
+    if os.path.exists(path) and not force:
+        return path
+    import joblib
+    tables = tables or rate_tables()
+    model = train_model(tables=tables)
+    # uncompressed, so arrays can be memory-mapped
+    _write_atomic(path, lambda tmp: joblib.dump(model, tmp))
+    evaluator = _save_evaluator(model, tables)
+    ensemble = CostEnsemble.load(build_ensemble_artifact(tables, force=True))
+    build_estimate_grid(evaluator, ensemble, tables, force=True)
+    return path
+
+def load_cost_pipeline(tables):
+    """The sklearn pipeline for `tables`, memory-mapped (trained in memory if MODEL_DIR is read-only)."""
+    import joblib
+    try:
+        path = build_model_artifact(tables=tables)
+        model = joblib.load(path, mmap_mode='r')
+        print(f"ML Model loaded from {os.path.basename(path)} (rates {tables.version})")
+        return model
+    except OSError as e:
+        print(f"Model artifact unavailable ({e}); training in memory.")
+        return train_model(tables=tables)
+
+# ── Closed-form inference ──
+
+class PolyRidgeEvaluator:
+    """
+    NumPy evaluator for the PolynomialFeatures(degree=2) + Ridge pipeline.
+    Every polynomial term is the product of two columns of [1, x], so a
+    prediction is one gather-multiply and one dot product, with none of
+    sklearn's per-call validation.
+    """
+    __slots__ = ('left', 'right', 'coef', 'intercept')
+
+    def __init__(self, left, right, coef, intercept):
+        self.left, self.right = left, right
+        self.coef, self.intercept = coef, float(intercept)
+
+    @classmethod
+    def from_pipeline(cls, pipeline):
+        poly, ridge = pipeline[0], pipeline[-1]
+        if poly.powers_.sum(axis=1).max() > 2:
+            raise ValueError("PolyRidgeEvaluator supports degree <= 2 only")
+        pairs = []
+        for powers in poly.powers_:
+            cols = [j + 1 for j, p in enumerate(powers) for _ in range(p)]
+            pairs.append((cols + [0, 0])[:2])   # column 0 of [1, x] is the constant
+        left, right = np.array(pairs).T
+        return cls(left, right, np.array(ridge.coef_, dtype=float), ridge.intercept_)
+
+    def predict(self, X):
+        X = np.asarray(X, dtype=float)
+        Xa = np.empty((X.shape[0], X.shape[1] + 1))
+        Xa[:, 0] = 1.0
+        Xa[:, 1:] = X
+        return (Xa[:, self.left] * Xa[:, self.right]) @ self.coef + self.intercept
+
+    def save(self, path):
+        np.savez(path, left=self.left, right=self.right, coef=self.coef,
+                 intercept=self.intercept)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as z:
+            return cls(z['left'], z['right'], z['coef'], z['intercept'])
+
+def _parity_probe(tables):
+    """Every city × quality × material × floors combination over a spread of areas."""
+    grids = np.meshgrid(np.arange(len(tables.cities)), np.linspace(300, 10000, 9),
+                        list(tables.quality_map.values()), [0, 1], [1, 2, 3], indexing='ij')
+    return np.column_stack([g.ravel() for g in grids])
+
+def check_evaluator_parity(pipeline, evaluator, tables=None):
+    """True when the evaluator reproduces pipeline.predict on the probe grid."""
+    X = _parity_probe(tables or rate_tables())
+    return bool(np.allclose(evaluator.predict(X), pipeline.predict(X), rtol=1e-9, atol=1e-6))
+
+def _save_evaluator(model, tables):
+    """
+    Closed-form evaluator for the pipeline, written to MODEL_DIR; the pipeline
+    itself if the two disagree.
+    """
+    evaluator = PolyRidgeEvaluator.from_pipeline(model)
+    if not check_evaluator_parity(model, evaluator, tables):
+        print("Closed-form evaluator disagrees with the pipeline; using sklearn predict.")
+        return model
+
+    def write(tmp):
+        with open(tmp, 'wb') as f:
+            evaluator.save(f)
+    _write_atomic(evaluator_path(tables), write)
+    return evaluator
+
+def load_evaluator(tables):
+    """
+    The cost evaluator for `tables`. Loading the .npz needs only NumPy; the
+    pipeline (and scikit-learn) is loaded only to build it when missing.
+    """
+    path = evaluator_path(tables)
+    if not os.path.exists(path):
+        model = load_cost_pipeline(tables)      # writes the evaluator if it trains
+        if not os.path.exists(path):
+            try:
+                return _save_evaluator(model, tables)
+            except OSError as e:
+                print(f"Evaluator artifact unavailable ({e}); keeping it in memory.")
+                evaluator = PolyRidgeEvaluator.from_pipeline(model)
+                return evaluator if check_evaluator_parity(model, evaluator, tables) else model
+    return PolyRidgeEvaluator.load(path)
+
+# ── Bootstrap ensemble (prediction intervals) ──
+
+RESIDUAL_LEVELS = np.linspace(0.05, 0.95, 10)
+CONFIDENCE_BAND = 0.10      # confidence = P(actual cost within ±10% of P50)
+MIN_P10_RATIO = 0.5         # P10 never drops below half the estimate
+_INTERVAL_LEVELS = np.array([0.1, 0.5, 0.9])
+
+class CostEnsemble:
+    """
+    Bootstrap ensemble of the cost pipeline, stacked for inference: member
+    b's Ridge coefficients are column b of `coef`, so one matrix multiply
+    scores every member. Each member also carries quantiles of its
+    out-of-bag relative residuals per city × quality × material × floors
+    cell; a row's predictive distribution is every member's prediction
+    scaled by each of those residual quantiles. Intervals take the shape of
+    that distribution relative to its median and centre it on the served
+    estimate, so P50 is the estimate and P10 ≤ estimate ≤ P90 always holds.
+    """
+    __slots__ = ('left', 'right', 'coef', 'intercept', 'residuals')
+
+    def __init__(self, left, right, coef, intercept, residuals):
+        self.left, self.right = left, right
+        self.coef, self.intercept = coef, intercept      # (terms, B), (B,)
+        self.residuals = residuals           # (B, city, quality, material, floors, levels)
+
+    def members(self, X):
+        """(n, B) predictions of every member."""
+        X = np.asarray(X, dtype=float)
+        Xa = np.empty((X.shape[0], X.shape[1] + 1))
+        Xa[:, 0] = 1.0
+        Xa[:, 1:] = X
+        return (Xa[:, self.left] * Xa[:, self.right]) @ self.coef + self.intercept
+
+    def intervals(self, X, point, chunk=4096):
+        """
+        (n, 4) array of P10, P50, P90 and confidence for each row, centred on
+        `point`, the served model's estimate for each row.
+        """
+        X = np.asarray(X, dtype=float)
+        point = np.asarray(point, dtype=float)
+        _, n_c, n_q, n_m, n_f, _ = self.residuals.shape
+        out = np.empty((len(X), 4))
+        for a in range(0, len(X), chunk):
+            Xc = X[a:a + chunk]
+            ci = np.clip(Xc[:, 0].astype(np.intp), 0, n_c - 1)
+            qi = np.clip(Xc[:, 2].astype(np.intp), 0, n_q - 1)
+            mi = np.clip(Xc[:, 3].astype(np.intp), 0, n_m - 1)
+            fi = np.clip(Xc[:, 4].astype(np.intp) - 1, 0, n_f - 1)
+            scale = 1 + self.residuals[:, ci, qi, mi, fi].transpose(1, 0, 2)
+            samples = np.sort((self.members(Xc)[:, :, None] * scale).reshape(len(Xc), -1))
+            # Linear-interpolated percentiles (np.quantile's default) on the sorted rows
+            pos = _INTERVAL_LEVELS * (samples.shape[1] - 1)
+            lo = pos.astype(np.intp)
+            hi = np.minimum(lo + 1, samples.shape[1] - 1)
+            q = samples[:, lo] + (samples[:, hi] - samples[:, lo]) * (pos - lo)
+            # Spread relative to the ensemble median (1.0 at P50), put on the estimate
+            rel = samples / np.maximum(q[:, 1:2], 1.0)
+            q_rel = q / np.maximum(q[:, 1:2], 1.0)
+            q_rel[:, 0] = np.clip(q_rel[:, 0], MIN_P10_RATIO, 1.0)
+            q_rel[:, 1] = 1.0
+            q_rel[:, 2] = np.maximum(q_rel[:, 2], 1.0)
+            out[a:a + chunk, :3] = point[a:a + chunk, None] * q_rel
+            out[a:a + chunk, 3] = (np.abs(rel - 1) <= CONFIDENCE_BAND).mean(axis=1)
+        return out
+
+    def save(self, path):
+        np.savez(path, left=self.left, right=self.right, coef=self.coef,
+                 intercept=self.intercept, residuals=self.residuals)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as z:
+            return cls(z['left'], z['right'], z['coef'], z['intercept'], z['residuals'])
+
+def train_ensemble(members=ENSEMBLE_MEMBERS, tables=None, seed=7):
+    """Fit `members` pipelines on bootstrap resamples of the training data."""
+    idx = tables or rate_tables()
+    X, y = generate_training_data(tables=idx)
+    n_c, n_q = idx.rates.shape[:2]
+    n_m, n_f = 2, int(X[:, 4].max())
+    cell = ((X[:, 0].astype(np.intp) * n_q + X[:, 2].astype(np.intp)) * n_m
+            + X[:, 3].astype(np.intp)) * n_f + X[:, 4].astype(np.intp) - 1
+    in_cell = [cell == c for c in range(n_c * n_q * n_m * n_f)]
+    rng = np.random.default_rng(seed)
+    evals, residuals = [], []
+    for _ in range(members):
+        sample = rng.integers(0, len(y), len(y))
+        oob = np.ones(len(y), dtype=bool)
+        oob[sample] = False
+        ev = PolyRidgeEvaluator.from_pipeline(_new_pipeline().fit(X[sample], y[sample]))
+        rel = y / ev.predict(X) - 1
+        # Out-of-bag rows of each cell (all of its rows in the rare case none are)
+        residuals.append([np.quantile(rel[rows & oob if (rows & oob).any() else rows],
+                                      RESIDUAL_LEVELS)
+                          for rows in in_cell])
+        evals.append(ev)
+    return CostEnsemble(evals[0].left, evals[0].right,
+                        np.column_stack([ev.coef for ev in evals]),
+                        np.array([ev.intercept for ev in evals]),
+                        np.array(residuals).reshape(members, n_c, n_q, n_m, n_f, -1))
+
+def ensemble_path(tables=None):
+    return os.path.join(MODEL_DIR, f"cost_ensemble-v{MODEL_VERSION}-{model_key(tables)}.npz")
+
+def build_ensemble_artifact(tables, force=False):
+    """Train the ensemble and write it atomically to MODEL_DIR; return its path."""
+    path = ensemble_path(tables)
+    if os.path.exists(path) and not force:
+        return path
+    ensemble = train_ensemble(tables=tables)
+
+    def write(tmp):
+        with open(tmp, 'wb') as f:
+            ensemble.save(f)
+    _write_atomic(path, write)
+    return path
+
+def load_ensemble(tables):
+    """Load the ensemble for `tables`, training it first if needed (in memory if MODEL_DIR is read-only)."""
+    try:
+        return CostEnsemble.load(build_ensemble_artifact(tables))
+    except OSError as e:
+        print(f"Ensemble artifact unavailable ({e}); training in memory.")
+        return train_ensemble(tables=tables)
+
+# ── Precomputed estimate grid ──
+# The estimate inputs are a handful of categories plus area, so the model is
+# evaluated once per node of a dense grid and requests interpolate along
+# area. Each node holds the point estimate plus the ensemble's P10/P50/P90
+# and confidence. Stored as a float32 .npy next to the model (memory-mapped,
+# shared by workers) and served to clients for offline quoting.
+
+GRID_AREA = (300, 10000, 10)        # first node, last node, step (sq.ft)
+GRID_FLOORS = (1, 2, 3)
+GRID_MATERIALS = ('indian', 'foreign')
+GRID_CHANNELS = ('cost', 'p10', 'p50', 'p90', 'confidence')
+
+def estimate_grid_path(tables=None):
+    return os.path.join(MODEL_DIR, f"estimate_grid-v{MODEL_VERSION}-{model_key(tables)}.npy")
+
+def compute_estimate_grid(evaluator, ensemble, tables):
+    """
+    Model and ensemble on every node; float32 array of shape
+    (city, quality, material, floors, area, channel).
+    """
+    start, stop, step = GRID_AREA
+    axes = (np.arange(len(tables.cities)), np.arange(len(tables.quality_map)),
+            np.arange(len(GRID_MATERIALS)), np.array(GRID_FLOORS),
+            np.arange(start, stop + step, step))
+    ci, qi, mi, fl, area = np.meshgrid(*axes, indexing='ij')
+    X = np.column_stack([ci.ravel(), area.ravel(), qi.ravel(), mi.ravel(), fl.ravel()])
+    X = X.astype(float)
+    cost = evaluator.predict(X)
+    values = np.column_stack([cost, ensemble.intervals(X, cost)])
+    return values.reshape(*ci.shape, len(GRID_CHANNELS)).astype(np.float32)
+
+def build_estimate_grid(evaluator, ensemble, tables, force=False):
+    """Write the estimate grid for `tables` atomically to MODEL_DIR; return its path."""
+    path = estimate_grid_path(tables)
+    if os.path.exists(path) and not force:
+        return path
+    values = compute_estimate_grid(evaluator, ensemble, tables)
+
+    def write(tmp):
+        with open(tmp, 'wb') as f:
+            np.save(f, values)
+    _write_atomic(path, write)
+    return path
+
+class EstimateGrid:
+    """
+    Model costs and intervals on the estimate grid, looked up with linear
+    interpolation along area. Rows off the grid (area outside GRID_AREA,
+    floors outside GRID_FLOORS, unknown categories) are computed directly
+    with `fallback` (the model evaluator) and the ensemble. Interpolated
+    costs stay within a few rupees of the model.
+    """
+    __slots__ = ('values', 'flat', 'fallback', 'ensemble', 'path')
+
+    def __init__(self, values, fallback, ensemble, path=None):
+        self.values, self.fallback, self.ensemble, self.path = values, fallback, ensemble, path
+        # plain-ndarray view of the (possibly memory-mapped) data for take()
+        self.flat = np.asarray(values).reshape(-1)
+
+    def _direct(self, X):
+        cost = self.fallback.predict(X)
+        return np.column_stack([cost, self.ensemble.intervals(X, cost)])
+
+    def lookup(self, row):
+        """
+        (cost, p10, p50, p90, confidence) for one
+        [city_idx, area, quality_idx, material, floors] row.
+        """
+        ci, area, qi, mi, fl = row
+        start, stop, step = GRID_AREA
+        n_c, n_q, n_m, n_f, n_a, n_ch = self.values.shape
+        if (start <= area <= stop and fl in GRID_FLOORS
+                and 0 <= ci < n_c and 0 <= qi < n_q and 0 <= mi < n_m):
+            pos = (area - start) / step
+            i = min(int(pos), n_a - 2)
+            base = ((((ci * n_q + qi) * n_m + mi) * n_f + fl - GRID_FLOORS[0]) * n_a + i) * n_ch
+            v = self.flat[base:base + 2 * n_ch].astype(float)    # nodes i and i + 1
+            return tuple((v[:n_ch] + (v[n_ch:] - v[:n_ch]) * (pos - i)).tolist())
+        return tuple(self._direct(np.array([row], dtype=float))[0].tolist())
+
+    def predict(self, X):
+        """Vectorised lookup for an (n, 5) feature array; returns (n, channels)."""
+        X = np.asarray(X, dtype=float)
+        ci, area, qi, mi, fl = X.T
+        start, _, step = GRID_AREA
+        n_c, n_q, n_m, n_f, n_a, n_ch = self.values.shape
+        fi = fl - GRID_FLOORS[0]
+        pos = (area - start) / step
+        on = ((pos >= 0) & (pos <= n_a - 1) & (fi >= 0) & (fi < n_f) & (fi == np.floor(fi))
+              & (ci >= 0) & (ci < n_c) & (qi >= 0) & (qi < n_q) & (mi >= 0) & (mi < n_m))
+        i = np.minimum(pos.astype(np.intp), n_a - 2)
+        node = ((((ci * n_q + qi) * n_m + mi) * n_f + fi) * n_a).astype(np.intp) + i
+        node[~on] = 0
+        flat = (node * n_ch)[:, None] + np.arange(n_ch)
+        lo = self.flat.take(flat).astype(float)
+        out = lo + (self.flat.take(flat + n_ch) - lo) * (pos - i)[:, None]
+        if not on.all():
+            out[~on] = self._direct(X[~on])
+        return out
+
+    def data_offset(self):
+        """Byte offset of the array data in the .npy file (its header length)."""
+        buf = io.BytesIO()
+        np.lib.format.write_array_header_1_0(
+            buf, np.lib.format.header_data_from_array_1_0(self.values))
+        return buf.tell()
+
+    def manifest(self, tables):
+        """Axis labels and layout so a client can index the raw array itself."""
+        start, stop, step = GRID_AREA
+        return {
+            'modelVersion': MODEL_VERSION,
+            'ratesVersion': tables.version,
+            'dtype': '<f4',
+            'shape': list(self.values.shape),
+            'order': ['city', 'quality', 'materials', 'floors', 'area', 'channel'],
+            'axes': {
+                'city': list(tables.cities),
+                'quality': sorted(tables.quality_map, key=tables.quality_map.get),
+                'materials': list(GRID_MATERIALS),
+                'floors': list(GRID_FLOORS),
+                'area': {'start': start, 'stop': stop, 'step': step},
+                'channel': list(GRID_CHANNELS),
+            },
+            'interpolation': 'linear in area; outside the grid use the API',
+        }
+
+def load_estimate_grid(evaluator, ensemble, tables):
+    """Memory-map the grid for `tables`, building it first if needed (in memory if MODEL_DIR is read-only)."""
+    try:
+        path = build_estimate_grid(evaluator, ensemble, tables)
+        return EstimateGrid(np.load(path, mmap_mode='r'), evaluator, ensemble, path)
+    except OSError as e:
+        print(f"Estimate grid unavailable on disk ({e}); computing in memory.")
+        return EstimateGrid(compute_estimate_grid(evaluator, ensemble, tables), evaluator, ensemble)
+
+# ── Active rate tables + model ──
+# Handlers read `_active` once per request and use that snapshot throughout,
+# so a reload can swap in new tables and a new model in one assignment
+# while in-flight requests finish on the old pair.
+
+class ModelSnapshot:
+    # `model` (the sklearn pipeline) is only loaded on demand by get_cost_model();
+    # requests are served from the evaluator, ensemble and grid.
+    __slots__ = ('rates', 'evaluator', 'grid', 'model')
+
+    def __init__(self, rates, evaluator=None, grid=None, model=None):
+        self.rates, self.evaluator, self.grid, self.model = rates, evaluator, grid, model
+
+def _load_snapshot(tables):
+    """Load (or build) the evaluator, ensemble and estimate grid for `tables`."""
+    t0 = time.perf_counter()
+    evaluator = load_evaluator(tables)
+    grid = load_estimate_grid(evaluator, load_ensemble(tables), tables)
+    if STARTUP['modelLoadSeconds'] is None:
+        STARTUP['modelLoadSeconds'] = round(time.perf_counter() - t0, 3)
+    print(f"Cost model v{MODEL_VERSION}-{model_key(tables)} ready (rates {tables.version}, "
+          f"{time.perf_counter() - t0:.2f}s)")
+    return ModelSnapshot(tables, evaluator, grid)
+
+_active = ModelSnapshot(load_rate_tables())
+_model_lock = threading.Lock()
+
+def rate_tables():
+    """Rate tables currently being served (available without loading the model)."""
+    return _active.rates
+
+def current_snapshot():
+    """
+    Return the active snapshot, loading its model on first use.
+    The artifact is memory-mapped so all workers share the same pages; it is
+    trained and written once if missing (or trained in memory if MODEL_DIR is
+    not writable).
+    """
+    global _active
+    snap = _active
+    if snap.grid is None:
+        with _model_lock:
+            snap = _active
+            if snap.grid is None:
+                snap = _active = _load_snapshot(snap.rates)
+    return snap
+
+def model_ready():
+    """True once the active snapshot's model is loaded (lookups will not block)."""
+    return _active.grid is not None
+
+def get_cost_model():
+    """Return the sklearn cost pipeline, loading it (and scikit-learn) on first use."""
+    snap = current_snapshot()
+    if snap.model is None:
+        snap.model = load_cost_pipeline(snap.rates)
+    return snap.model
+
+def get_cost_evaluator():
+    """Return the fast evaluator for request handlers (falls back to the pipeline)."""
+    return current_snapshot().evaluator
+
+def predict_cost(row, snap=None):
+    """Predict the cost of one [city_idx, area, quality_idx, material, floors] row."""
+    return (snap or current_snapshot()).grid.lookup(row)[0]
+
+def predict_interval(row, snap=None):
+    """(cost, p10, p50, p90, confidence) for one feature row."""
+    return (snap or current_snapshot()).grid.lookup(row)
+
+# ── Reloading ──
+
+_reload_lock = threading.Lock()
+_reload_status = {'state': 'idle', 'error': None}
+
+def reload_rate_tables(path=None, wait=False):
+    """
+    Re-read the rate tables and retrain on a background thread, swapping the
+    new snapshot in only once its model is ready. Returns False if a reload
+    is already running.
+    """
+    if not _reload_lock.acquire(blocking=False):
+        return False
+    _reload_status.update(state='running', error=None)
+
+    def run():
+        global _active
+        try:
+            tables = load_rate_tables(path or RATES_FILE)
+            if tables.key == _active.rates.key and _active.grid is not None:
+                _active = ModelSnapshot(tables, _active.evaluator, _active.grid, _active.model)
+            elif _active.grid is None:
+                _active = ModelSnapshot(tables)     # model not loaded yet: load lazily
+            else:
+                _active = _load_snapshot(tables)
+            _reload_status.update(state='idle')
+            print(f"Rate tables {tables.version} active (key {tables.key}).")
+        except (OSError, ValueError) as e:
+            _reload_status.update(state='failed', error=str(e))
+            print(f"Rate table reload failed: {e}")
+        finally:
+            _reload_lock.release()
+
+    t = threading.Thread(target=run, name='rates-reload', daemon=True)
+    t.start()
+    if wait:
+        t.join()
+    return True
+
+RATES_WATCH_SECONDS = float(os.environ.get('AIML_RATES_WATCH_SECONDS', 0))
+_watcher = None
+
+def _rates_mtime():
+    try:
+        return os.stat(RATES_FILE).st_mtime_ns
+    except OSError:
+        return None
+
+def _watch_rates_file():
+    last = _rates_mtime()
+    while True:
+        time.sleep(RATES_WATCH_SECONDS)
+        mtime = _rates_mtime()
+        if mtime is not None and mtime != last and reload_rate_tables():
+            last = mtime
+
+def start_rates_watcher():
+    """Poll RATES_FILE for changes (only when AIML_RATES_WATCH_SECONDS > 0)."""
+    global _watcher
+    if RATES_WATCH_SECONDS > 0 and _watcher is None:
+        _watcher = threading.Thread(target=_watch_rates_file, name='rates-watch', daemon=True)
+        _watcher.start()
+
+def __getattr__(name):
+    # Keep `aiml.cost_model` and the old table constants working for external
+    # callers, always reflecting the active snapshot.
+    if name == 'cost_model':
+        return get_cost_model()
+    if name in ('CITY_DATA', 'QUALITY_MAP', 'COST_BREAKDOWN'):
+        tables = rate_tables()
+        return {'CITY_DATA': tables.city_data, 'QUALITY_MAP': tables.quality_map,
+                'COST_BREAKDOWN': tables.cost_breakdown}[name]
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 # ═══════════════════════════════════════════════════════════════════════════════
 # EXTRA-FEATURES PARSER
 # ═══════════════════════════════════════════════════════════════════════════════
 
+# Keyword / phrase → (room name, room type). Several keywords can map to the
+# same room; results follow the order in which each room first appears here.
 _FEATURE_KW = {
     'study':        ('Study Room',    'study'),
     'office':       ('Home Office',   'study'),
@@ -134,31 +966,261 @@ _FEATURE_KW = {
     'play area':    ('Play Area',     'play'),
     'terrace':      ('Terrace',       'terrace'),
     'walk-in closet': ('Walk-in Closet', 'closet'),
+    # Synonyms, spelling variants and Hindi / regional terms
+    'home theatre': ('Home Theater',  'entertainment'),
+    'storeroom':    ('Store Room',    'utility'),
+    'godown':       ('Store Room',    'utility'),
+    'bhandar':      ('Store Room',    'utility'),
+    'wash area':    ('Utility Room',  'utility'),
+    'mandir':       ('Pooja Room',    'pooja'),
+    'pooja ghar':   ('Pooja Room',    'pooja'),
+    'puja ghar':    ('Pooja Room',    'pooja'),
+    'devghar':      ('Pooja Room',    'pooja'),
+    'devara mane':  ('Pooja Room',    'pooja'),
+    'pooja arai':   ('Pooja Room',    'pooja'),
+    'पूजा':          ('Pooja Room',    'pooja'),
+    'मंदिर':         ('Pooja Room',    'pooja'),
+    'mehman':       ('Guest Room',    'bedroom'),
+    'mehmaan':      ('Guest Room',    'bedroom'),
+    'मेहमान':        ('Guest Room',    'bedroom'),
+    'servant quarter': ('Servant Room', 'bedroom'),
+    'domestic help': ('Maid Room',    'bedroom'),
+    'chhat':        ('Terrace',       'terrace'),
+    'छत':           ('Terrace',       'terrace'),
+    'जिम':          ('Gym',           'gym'),
 }
 
+# \w misses Devanagari vowel signs, so word boundaries list them explicitly
+_WORD = r'\w\u0900-\u097F'
+_SEP_RE = re.compile(r'[\s-]+')
+
+def _is_word_char(ch):
+    return ch.isalnum() or ch == '_' or '\u0900' <= ch <= '\u097f'
+
+def _word_forms(word):
+    """A keyword's last word plus its English plural."""
+    if not word.isascii():
+        return [word]
+    if re.search(r'[^aeiou]y$', word):
+        return [word, word[:-1] + 'ies']
+    if re.search(r'(?:s|x|ch|sh)$', word):
+        return [word, word + 'es']
+    return [word, word + 's']
+
+def _trie_pattern(words):
+    """
+    Regex for a set of phrases with shared prefixes factored out, so the
+    engine walks one character trie instead of trying every alternative.
+    Spaces in a phrase match any run of spaces or hyphens.
+    """
+    trie = {}
+    for word in words:
+        node = trie
+        for ch in word:
+            node = node.setdefault(ch, {})
+        node[''] = {}
+
+    def emit(node):
+        branches = [(r'[\s-]+' if ch == ' ' else re.escape(ch)) + emit(child)
+                    for ch, child in sorted(node.items()) if ch]
+        if not branches:
+            return ''
+        body = branches[0] if len(branches) == 1 else f"(?:{'|'.join(branches)})"
+        if '' in node:          # a phrase may also end here; prefer the longer one
+            return f'(?:{body})?' if len(branches) == 1 else f'{body}?'
+        return body
+    return emit(trie)
+
+def _build_feature_matcher(table):
+    """Compiled keyword trie for `table` plus {normalised matched text: feature}."""
+    forms = {}
+    for kw, feature in table.items():
+        *head, last = _SEP_RE.split(kw)
+        for form in _word_forms(last):
+            forms.setdefault(' '.join((*head, form)), feature)
+    # The right-hand word boundary is in the regex; the left-hand one is checked
+    # per match, which keeps the engine's first-character scan fast.
+    return re.compile(rf'(?:{_trie_pattern(forms)})(?![{_WORD}])'), forms
+
+_FEATURE_RE, _FEATURE_FORMS = _build_feature_matcher(_FEATURE_KW)
+_FEATURE_ORDER = {}
+for _i, (_name, _) in enumerate(_FEATURE_KW.values()):
+    _FEATURE_ORDER.setdefault(_name, _i)
+
+# A count directly before a keyword ("2 guest rooms", "no gym"); a negator
+# may also sit further back behind articles ("without a gym", "no any gym")
+_COUNT_WORDS = {'a': 1, 'an': 1, 'one': 1, 'two': 2, 'three': 3, 'four': 4,
+                'no': 0, 'without': 0}
+_NEGATORS = frozenset({'no', 'without'})
+_ARTICLES = frozenset({'a', 'an', 'the', 'any'})
+MAX_FEATURE_COUNT = 3       # "10 guest rooms" still yields at most three
+
 def parse_extra_features(text):
+    """
+    Extra rooms requested in free text, found in one pass of a keyword-trie
+    regex built at import. Keywords match whole words only, plurals and a
+    leading count are understood ("2 guest rooms" → Guest Room, Guest Room 2)
+    and "no gym" / "without a gym" drops the room. Output order is fixed by
+    _FEATURE_KW, not by the text.
+    """
     if not text or not text.strip():
         return []
     low = text.lower()
-    found, seen = [], set()
-    for kw, (name, rtype) in _FEATURE_KW.items():
-        if kw in low and name not in seen:
-            found.append({'name': name, 'type': rtype})
-            seen.add(name)
+    counts = {}
+    for m in _FEATURE_RE.finditer(low):
+        start = m.start()
+        if start and _is_word_char(low[start - 1]):
+            continue
+        kw = m.group()
+        feature = _FEATURE_FORMS.get(kw) or _FEATURE_FORMS[_SEP_RE.sub(' ', kw)]
+        lo = max(0, start - 32)
+        words = low[lo:start].split() if low[start - 1:start].isspace() else []
+        if lo and words and not low[lo - 1].isspace() and not low[lo].isspace():
+            words = words[1:]       # cut mid-word by the window
+        prev = words[-1] if words else ''
+        n = int(prev) if prev.isdecimal() else _COUNT_WORDS.get(prev, 1)
+        for word in reversed(words):
+            if word in _NEGATORS:
+                n = 0
+            if word not in _ARTICLES:
+                break
+        counts[feature] = max(counts.get(feature, 0), min(n, MAX_FEATURE_COUNT))
+    found = []
+    for (name, rtype), n in sorted(counts.items(), key=lambda kv: _FEATURE_ORDER[kv[0][0]]):
+        found.extend({'name': name if k == 0 else f'{name} {k + 1}', 'type': rtype}
+                     for k in range(n))
     return found
 
+# ═══════════════════════════════════════════════════════════════════════════════
+# ROOM RECORDS  (one structured array per floor layout, interned type codes)
+# ═══════════════════════════════════════════════════════════════════════════════
+
+ROOM_TYPES = ('living', 'dining', 'kitchen', 'bedroom', 'bathroom', 'balcony', 'garage',
+              'staircase', 'corridor', 'study', 'pooja', 'utility', 'gym',
+              'entertainment', 'terrace', 'closet', 'play')
+ZONES = ('top', 'mid', 'bottom')
+TYPE_CODE = {t: i for i, t in enumerate(ROOM_TYPES)}
+ZONE_CODE = {z: i for i, z in enumerate(ZONES)}
+_TOP, _MID, _BOTTOM = range(len(ZONES))
+_LIVING, _BATHROOM, _STAIRCASE, _CORRIDOR = (
+    TYPE_CODE[t] for t in ('living', 'bathroom', 'staircase', 'corridor'))
+
+# x/y/w/h in feet; id indexes Layout.names
+ROOM_DTYPE = np.dtype([('x', 'f8'), ('y', 'f8'), ('w', 'f8'), ('h', 'f8'),
+                       ('weight', 'f8'), ('id', 'u2'), ('type', 'u1'), ('zone', 'u1')])
+
+def round_like_python(x, ndigits):
+    """
+    Element-wise round(x, ndigits) for float arrays, same results as the
+    builtin. np.round scales first, so 8.05 (binary 8.0500000000000007)
+    becomes the tie 80.5 and rounds to 8.0 where round() gives 8.1; here
+    float ties are settled by the exact product x * 10**ndigits, recovered
+    with Dekker's error-free multiplication.
+    """
+    p = 10.0 ** ndigits
+    y = x * p
+    split = 134217729.0                             # 2**27 + 1
+    xc, pc = split * x, split * p
+    xh, ph = xc - (xc - x), pc - (pc - p)
+    xl, pl = x - xh, p - ph
+    err = ((xh * ph - y) + xh * pl + xl * ph) + xl * pl    # x * p == y + err exactly
+    q = np.rint(y)
+    tie = (np.abs(y - q) == 0.5) & (err != 0)
+    return np.where(tie, np.floor(y) + (err > 0), q) / p
+
+def _type_flags(types):
+    """Boolean lookup indexed by type code, True for the given room types."""
+    return np.isin(ROOM_TYPES, list(types))
+
+class Layout:
+    """
+    The rooms of one floor: a ROOM_DTYPE record array plus the names its 'id'
+    field points into. Room specs are Layouts with zero geometry;
+    position_rooms() fills in the rectangles and appends the passage. The
+    layout search permutes and re-zones records, never the shared names.
+    """
+    __slots__ = ('rooms', 'names', '_dims')
+
+    def __init__(self, rooms, names):
+        self.rooms = rooms
+        self.names = names
+        self._dims = None
+
+    def __len__(self):
+        return len(self.rooms)
+
+    @classmethod
+    def from_specs(cls, specs):
+        """Layout from (name, type, zone, weight) rows, in order."""
+        # ids (plus the passage appended by position_rooms) must fit the u2 field
+        assert len(specs) < np.iinfo(ROOM_DTYPE['id']).max, f"{len(specs)} rooms on one floor"
+        rooms = np.array([(0.0, 0.0, 0.0, 0.0, weight, i, TYPE_CODE[rtype], ZONE_CODE[zone])
+                          for i, (_, rtype, zone, weight) in enumerate(specs)], ROOM_DTYPE)
+        return cls(rooms, tuple(s[0] for s in specs))
+
+    @classmethod
+    def empty(cls):
+        return cls(np.zeros(0, ROOM_DTYPE), ())
+
+    def room_names(self):
+        return [self.names[i] for i in self.rooms['id'].tolist()]
+
+    def rows(self):
+        """(x, y, w, h, type, zone) tuples, for per-room loops."""
+        return self.rooms[['x', 'y', 'w', 'h', 'type', 'zone']].tolist()
+
+    def dims(self):
+        """(width, length, area) per room: sides rounded to 0.1 ft, area to whole sq.ft."""
+        if self._dims is None:
+            self._dims = []
+            for w, h in self.rooms[['w', 'h']].tolist():
+                w, h = round(w, 1), round(h, 1)
+                self._dims.append((w, h, round(w * h)))
+        return self._dims
+
 # ═══════════════════════════════════════════════════════════════════════════════
 # ROOM DISTRIBUTION ACROSS FLOORS
 # ═══════════════════════════════════════════════════════════════════════════════
 
+FLOOR_NAMES = ('Ground', 'First', 'Second', 'Third', 'Fourth',
+               'Fifth', 'Sixth', 'Seventh', 'Eighth', 'Ninth')
+MAX_FLOORS = len(FLOOR_NAMES)
+# Blueprint request bounds; layout and render cost grow with each
+MAX_BEDROOMS = 20
+MAX_BATHROOMS = 20
+MAX_AREA = 50_000
+
 def _r(name, rtype, zone, weight):
-    """Shorthand for a room spec dict."""
-    return {'name': name, 'type': rtype, 'zone': zone, 'weight': weight}
+    """Shorthand for a room spec row."""
+    return name, rtype, zone, weight
+
+def _floor_label(i):
+    return f"{FLOOR_NAMES[i]} Floor Plan" if i < len(FLOOR_NAMES) else f"Floor {i} Plan"
+
+def _split_evenly(n, parts, low_first=False):
+    """
+    n rooms over `parts` floors as evenly as possible, the remainder on the
+    higher floors (on the lower ones with low_first).
+    """
+    base, extra = divmod(n, parts)
+    return [base + (i < extra if low_first else i >= parts - extra) for i in range(parts)]
 
 def build_floor_specs(total_area, beds, baths, floors, has_garage, has_balcony, extras):
     """
-    Return a list of floor dicts, each with 'label', 'room_specs', 'area'.
-    zone = 'top' (back of house) or 'bottom' (front / entrance side).
+    Return a list of floor dicts, each with 'label', 'room_specs' (a Layout)
+    and 'area'. zone = 'top' (back of house) or 'bottom' (front / entrance side).
+
+    Multi-storey: the ground floor holds the living areas and one of the
+    baths; the requested bedrooms and remaining baths go on the upper floors
+    and are never exceeded. Two and three floors keep their original split
+    (three floors: up to two bedrooms and one bath on the first floor, the
+    rest on top); from four floors up both are spread evenly, spare bedrooms
+    on the lowest upper floors and spare baths on the highest, so every upper
+    floor gets a room while floors <= max(3, beds + baths). Baths are numbered across
+    the house, the first upper one being the Attached Bath when it shares the
+    Master Bedroom's floor. From three floors up the top floor has a terrace.
+    Every requested extra is placed: utility/pooja/closet rooms on the
+    ground floor, the others round-robin over the upper floors.
     """
     per_floor = total_area / floors
     result = []
@@ -184,141 +1246,445 @@ def build_floor_specs(total_area, beds, baths, floors, has_garage, has_balcony,
             rooms.append(_r('Balcony', 'balcony', 'top', 1.2))
         if has_garage:
             rooms.append(_r('Garage', 'garage', 'bottom', 2.0))
-        for e in extras[:2]:
+        for e in extras:
             rooms.append(_r(e['name'], e['type'], 'top', 1.2))
-        result.append({'label': 'Ground Floor Plan', 'room_specs': rooms, 'area': per_floor})
-
-    elif floors == 2:
-        # ── Ground floor ──
-        g = [
-            _r('Living Room', 'living',  'bottom', 3.5),
-            _r('Dining Room', 'dining',  'bottom', 2.0),
-            _r('Kitchen',     'kitchen', 'top',    2.0),
-            _r('Bathroom',    'bathroom','top',    1.0),
-            _r('Staircase',   'staircase','top',   1.5),
-        ]
-        if has_garage:
-            g.append(_r('Garage', 'garage', 'bottom', 2.0))
-        for e in ground_extras[:1]:
-            g.append(_r(e['name'], e['type'], 'top', 1.0))
-        result.append({'label': 'Ground Floor Plan', 'room_specs': g, 'area': per_floor})
-
-        # ── First floor ──
-        f1 = []
-        for i in range(beds):
-            nm = 'Master Bedroom' if i == 0 else f'Bedroom {i+1}'
-            f1.append(_r(nm, 'bedroom', 'bottom', 2.5 if i == 0 else 2.0))
-        rem_b = max(baths - 1, 1)
-        for i in range(rem_b):
-            nm = 'Attached Bath' if i == 0 else f'Bathroom {i+2}'
-            f1.append(_r(nm, 'bathroom', 'top', 1.0))
-        f1.append(_r('Staircase', 'staircase', 'top', 1.5))
-        if has_balcony:
-            f1.append(_r('Balcony', 'balcony', 'top', 1.5))
-        for e in upper_extras[:2]:
-            f1.append(_r(e['name'], e['type'], 'top', 1.3))
-        result.append({'label': 'First Floor Plan', 'room_specs': f1, 'area': per_floor})
-
-    else:  # 3 floors
-        # ── Ground ──
-        g = [
-            _r('Living Room', 'living',  'bottom', 3.5),
-            _r('Dining Room', 'dining',  'bottom', 2.0),
-            _r('Kitchen',     'kitchen', 'top',    2.0),
-            _r('Bathroom',    'bathroom','top',    1.0),
-            _r('Staircase',   'staircase','top',   1.5),
-        ]
-        if has_garage:
-            g.append(_r('Garage', 'garage', 'bottom', 2.0))
-        for e in ground_extras[:1]:
-            g.append(_r(e['name'], e['type'], 'top', 1.0))
-        result.append({'label': 'Ground Floor Plan', 'room_specs': g, 'area': per_floor})
-
-        # ── First floor ──
-        beds_f1 = min(beds, 2)
-        f1 = []
-        for i in range(beds_f1):
-            nm = 'Master Bedroom' if i == 0 else f'Bedroom {i+1}'
-            f1.append(_r(nm, 'bedroom', 'bottom', 2.5 if i == 0 else 2.0))
-        f1.append(_r('Attached Bath', 'bathroom', 'top', 1.0))
-        f1.append(_r('Staircase', 'staircase', 'top', 1.5))
-        if has_balcony:
-            f1.append(_r('Balcony', 'balcony', 'top', 1.5))
-        for e in upper_extras[:1]:
-            f1.append(_r(e['name'], e['type'], 'top', 1.3))
-        result.append({'label': 'First Floor Plan', 'room_specs': f1, 'area': per_floor})
-
-        # ── Second floor ──
-        beds_f2 = max(beds - beds_f1, 1)
-        f2 = []
-        for i in range(beds_f2):
-            nm = f'Bedroom {beds_f1 + i + 1}'
-            f2.append(_r(nm, 'bedroom', 'bottom', 2.0))
-        baths_f2 = max(baths - 2, 1)
-        for i in range(baths_f2):
-            f2.append(_r('Bathroom', 'bathroom', 'top', 1.0))
-        f2.append(_r('Staircase', 'staircase', 'top', 1.5))
-        f2.append(_r('Terrace', 'terrace', 'top', 2.0))
-        for e in top_extras[:1]:
-            pass  # already added terrace
-        for e in upper_extras[1:2]:
-            f2.append(_r(e['name'], e['type'], 'top', 1.3))
-        result.append({'label': 'Second Floor Plan', 'room_specs': f2, 'area': per_floor})
+        result.append({'label': _floor_label(0), 'room_specs': Layout.from_specs(rooms),
+                       'area': per_floor})
+        return result
+
+    # ── Ground floor ──
+    g = [
+        _r('Living Room', 'living',  'bottom', 3.5),
+        _r('Dining Room', 'dining',  'bottom', 2.0),
+        _r('Kitchen',     'kitchen', 'top',    2.0),
+        _r('Bathroom',    'bathroom','top',    1.0),
+        _r('Staircase',   'staircase','top',   1.5),
+    ]
+    if has_garage:
+        g.append(_r('Garage', 'garage', 'bottom', 2.0))
+    for e in ground_extras:
+        g.append(_r(e['name'], e['type'], 'top', 1.0))
+    result.append({'label': _floor_label(0), 'room_specs': Layout.from_specs(g),
+                   'area': per_floor})
+
+    # ── Upper floors ──
+    uppers = floors - 1
+    upper_baths = max(baths - 1, 0)     # the ground floor has one
+    if uppers == 1:
+        bed_counts, bath_counts = [beds], [upper_baths]
+    elif uppers == 2:
+        bed_counts = [min(beds, 2), max(beds - 2, 0)]
+        bath_counts = [min(upper_baths, 1), max(upper_baths - 1, 0)]
+    else:
+        bed_counts = _split_evenly(beds, uppers, low_first=True)
+        bath_counts = _split_evenly(upper_baths, uppers)
+    bed_no = 0                      # bedrooms named so far
+    bath_no = 1                     # baths named so far (the ground floor's)
+    for u in range(1, floors):
+        top = u == floors - 1
+        rooms = []
+        for _ in range(bed_counts[u - 1]):
+            bed_no += 1
+            nm = 'Master Bedroom' if bed_no == 1 else f'Bedroom {bed_no}'
+            rooms.append(_r(nm, 'bedroom', 'bottom', 2.5 if bed_no == 1 else 2.0))
+        master_here = 0 < bed_no == bed_counts[u - 1]
+        for _ in range(bath_counts[u - 1]):
+            bath_no += 1
+            nm = 'Attached Bath' if bath_no == 2 and master_here else f'Bathroom {bath_no}'
+            rooms.append(_r(nm, 'bathroom', 'top', 1.0))
+        rooms.append(_r('Staircase', 'staircase', 'top', 1.5))
+        if u == 1 and has_balcony:
+            rooms.append(_r('Balcony', 'balcony', 'top', 1.5))
+        if top and (floors >= 3 or top_extras):
+            rooms.append(_r('Terrace', 'terrace', 'top', 2.0))
+        for e in upper_extras[u - 1::uppers]:
+            rooms.append(_r(e['name'], e['type'], 'top', 1.3))
+        result.append({'label': _floor_label(u), 'room_specs': Layout.from_specs(rooms),
+                       'area': per_floor})
 
     return result
 
 # ═══════════════════════════════════════════════════════════════════════════════
-# ROOM POSITIONING (zone-based grid with automatic sub-row splitting)
+# ROOM POSITIONING (zone bands filled by a squarified treemap)
 # ═══════════════════════════════════════════════════════════════════════════════
 
 WALL = 0.75  # outer wall thickness in feet
+ZONE_SHARE_LIMITS = (0.3, 0.7)  # min/max share of the floor depth for either zone
 
-def _place_row(rooms, x, y, w, h):
-    """Place a list of rooms in a single horizontal row."""
-    tw = sum(r['weight'] for r in rooms) or 1
-    placed, cx = [], x
-    for r in rooms:
-        rw = (r['weight'] / tw) * w
-        placed.append({**r, 'x': round(cx, 2), 'y': round(y, 2),
-                        'w': round(rw, 2), 'h': round(h, 2)})
-        cx += rw
+def _squarify(weights, x, y, w, h):
+    """
+    Squarified treemap (Bruls, Huizing & van Wijk): rooms get area in
+    proportion to their weight, laid in strips along the shorter side of the
+    remaining rectangle, each strip grown only while its worst aspect ratio
+    improves. Rooms are laid in the given order, the first at the left /
+    bottom; returns their (x, y, w, h) rounded to 0.01 ft. O(n).
+    """
+    if not weights:
+        return []
+    weights = [max(wt, 1e-6) for wt in weights]
+    scale = w * h / sum(weights)
+    areas = [wt * scale for wt in weights]
+
+    placed, i, n = [], 0, len(areas)
+    while i < n:
+        side = min(w, h)
+        side2 = side * side
+        # Grow the strip [i, j) while its worst aspect ratio improves; the
+        # worst room in a strip is either its largest or its smallest.
+        j, s = i + 1, areas[i]
+        hi = lo = areas[i]
+        worst = max(side2 / hi, hi / side2)
+        while j < n:
+            s2 = s + areas[j]
+            hi2, lo2 = max(hi, areas[j]), min(lo, areas[j])
+            w2 = max(side2 * hi2 / (s2 * s2), s2 * s2 / (side2 * lo2))
+            if w2 > worst:
+                break
+            s, worst, hi, lo, j = s2, w2, hi2, lo2, j + 1
+        depth = s / side
+        offset = 0.0
+        for a in areas[i:j]:
+            length = a / depth
+            if w >= h:           # vertical strip on the left
+                rect = (x, y + offset, depth, length)
+            else:                # horizontal strip along the bottom
+                rect = (x + offset, y, length, depth)
+            offset += length
+            placed.append((round(rect[0], 2), round(rect[1], 2),
+                           round(rect[2], 2), round(rect[3], 2)))
+        if w >= h:
+            x, w = x + depth, w - depth
+        else:
+            y, h = y + depth, h - depth
+        i = j
     return placed
 
-def _place_zone(rooms, zx, zy, zw, zh):
-    """Place rooms in a zone; split into sub-rows if >3 rooms."""
-    if not rooms:
-        return []
-    if len(rooms) <= 3:
-        return _place_row(rooms, zx, zy, zw, zh)
-    mid = (len(rooms) + 1) // 2
-    sh = zh / 2
-    top_placed = _place_row(rooms[:mid], zx, zy + sh, zw, sh)
-    bot_placed = _place_row(rooms[mid:], zx, zy, zw, sh)
-    return top_placed + bot_placed
-
-def position_rooms(room_specs, plot_w, plot_h):
-    """Position all rooms within a floor, return list of placed rooms."""
+def position_rooms(room_specs, plot_w, plot_h, share_shift=0.0, keep_order=False):
+    """
+    Position all rooms of a floor and return the placed Layout: top zone,
+    the passage (an extra 'Passage' record), bottom zone.
+    share_shift moves the passage (as a share of the depth, before clamping)
+    and keep_order fills each zone in spec order; both are used by the
+    layout-candidate search and default to the canonical layout.
+    """
     iw = plot_w - 2 * WALL
     ih = plot_h - 2 * WALL
     corr_h = max(4.0, ih * 0.08)
-    top_h  = (ih - corr_h) * 0.52
-    bot_h  = (ih - corr_h) * 0.48
-
-    top_rooms = [r for r in room_specs if r['zone'] == 'top']
-    bot_rooms = [r for r in room_specs if r['zone'] == 'bottom']
 
-    placed = []
-    # Top zone (back of house)
-    placed += _place_zone(top_rooms, WALL, WALL + bot_h + corr_h, iw, top_h)
+    specs = room_specs.rooms.tolist()   # (x, y, w, h, weight, id, type, zone) tuples
+    weight = [s[4] for s in specs]
+    zone = [s[7] for s in specs]
+    top = [i for i, z in enumerate(zone) if z == _TOP]
+    bot = [i for i, z in enumerate(zone) if z == _BOTTOM]
+
+    # Zone depths follow the room weights on either side of the passage
+    top_w = sum(weight[i] for i in top)
+    bot_w = sum(weight[i] for i in bot)
+    share = (top_w / (top_w + bot_w) if top_w + bot_w else 0.5) + share_shift
+    if top and bot:
+        share = min(max(share, ZONE_SHARE_LIMITS[0]), ZONE_SHARE_LIMITS[1])
+    top_h = (ih - corr_h) * share
+    bot_h = (ih - corr_h) - top_h
+
+    if not keep_order:           # heaviest first, ties keep spec order
+        top.sort(key=lambda i: -weight[i])
+        bot.sort(key=lambda i: -weight[i])
+    # Top zone (back of house); first strips sit against the passage
+    rects = _squarify([weight[i] for i in top], WALL, WALL + bot_h + corr_h, iw, top_h)
     # Passage
-    placed.append({'name': 'Passage', 'type': 'corridor', 'zone': 'mid',
-                   'weight': 0,
-                   'x': WALL, 'y': round(WALL + bot_h, 2),
-                   'w': round(iw, 2), 'h': round(corr_h, 2)})
-    # Bottom zone (entrance side)
-    placed += _place_zone(bot_rooms, WALL, WALL, iw, bot_h)
+    rects.append((WALL, round(WALL + bot_h, 2), round(iw, 2), round(corr_h, 2)))
+    # Bottom zone (entrance side), mirrored so it also fills from the passage
+    rects += [(x, round(WALL + bot_h - (y - WALL) - h, 2), w, h)
+              for x, y, w, h in _squarify([weight[i] for i in bot], WALL, WALL, iw, bot_h)]
+
+    passage = (0.0, len(specs), _CORRIDOR, _MID)
+    records = [specs[i][4:] for i in top] + [passage] + [specs[i][4:] for i in bot]
+    placed = np.array([r + s for r, s in zip(rects, records)], ROOM_DTYPE)
+    return Layout(placed, room_specs.names + ('Passage',))
+
+# ═══════════════════════════════════════════════════════════════════════════════
+# LAYOUT CANDIDATES  (seeded variants of one floor, scored in bulk with NumPy)
+# ═══════════════════════════════════════════════════════════════════════════════
+
+MAX_CANDIDATES = 500
+MAX_TOP_CANDIDATES = 5
+
+# Rooms that stay on their side of the passage in every variant
+_ZONE_FIXED_TYPES = frozenset({'living', 'dining', 'bedroom', 'garage', 'staircase', 'terrace'})
+# Smallest comfortable side per room type (feet); unlisted types use the default
+_MIN_ROOM_SIDE = {'living': 10.0, 'bedroom': 9.0, 'dining': 8.0, 'kitchen': 7.0,
+                  'garage': 9.0, 'bathroom': 5.0, 'staircase': 4.0, 'balcony': 4.0}
+_MIN_ROOM_SIDE_DEFAULT = 6.0
+# Room types that should get an exterior wall for a window
+_NEEDS_WINDOW = frozenset({'living', 'dining', 'bedroom', 'kitchen', 'study', 'gym',
+                           'entertainment', 'play', 'balcony', 'terrace'})
+SPUR_WIDTH = 3.0  # width of the notional corridor reaching a room off the passage
+
+# Penalties (each 0..1) are combined into score = 1 - Σ weight × penalty
+SCORE_WEIGHTS = {'aspect': 0.35, 'minSide': 0.25, 'windows': 0.25, 'corridor': 0.15}
+
+# Per-type lookups of the above, indexed by type code
+_MOVABLE = ~_type_flags(_ZONE_FIXED_TYPES)
+_MIN_SIDE_BY_TYPE = np.array([_MIN_ROOM_SIDE.get(t, _MIN_ROOM_SIDE_DEFAULT) for t in ROOM_TYPES])
+_WANTS_WINDOW = _type_flags(_NEEDS_WINDOW)
+
+def _variant_plan(variant, zone, movable, weight):
+    """
+    (zone, order, share_shift, keep_order) of candidate `variant` from the
+    specs' zone codes and weights as lists; movable lists the rooms that
+    may change zone and order is None for spec order.
+    """
+    rng = random.Random(variant)
+    new = list(zone)
+    for i in movable:
+        if rng.random() < 0.25:
+            new[i] = _BOTTOM if new[i] == _TOP else _TOP
+    if set(new) != set(zone):
+        new = zone               # never empty a zone
+    keep_order = rng.random() < 0.5
+    order = None
+    if keep_order:
+        keys = [-w * rng.uniform(0.7, 1.3) for w in weight]
+        order = sorted(range(len(keys)), key=keys.__getitem__)
+    return new, order, rng.uniform(-0.15, 0.15), keep_order
+
+def _spec_lists(room_specs):
+    rooms = room_specs.rooms
+    return (rooms['zone'].tolist(), np.flatnonzero(_MOVABLE[rooms['type']]).tolist(),
+            rooms['weight'].tolist())
+
+def layout_variant(room_specs, variant):
+    """
+    (room_specs, share_shift, keep_order) for candidate `variant`; variant 0
+    is the canonical layout. Others are seeded by the variant number, so the
+    same request always yields the same candidates: movable rooms may switch
+    zone, the passage moves by up to ±15% of the depth, and half the variants
+    fill zones in a jittered-weight order instead of heaviest-first.
+    """
+    if variant == 0:
+        return room_specs, 0.0, False
+    zone, order, shift, keep_order = _variant_plan(variant, *_spec_lists(room_specs))
+    rooms = room_specs.rooms.copy()
+    rooms['zone'] = zone
+    if order is not None:
+        rooms = rooms[order]
+    return Layout(rooms, room_specs.names), shift, keep_order
+
+def _squarify_rows(areas, first, first_rect, next_rect):
+    """
+    _squarify() over many zones at once, with the same results. areas is
+    (L, n): each row holds the room areas of up to two zones in fill order,
+    a zone opening at every column where `first` is True (always column 0).
+    Zones opening at column 0 fill first_rect, later ones next_rect, both
+    (x, y, w, h) tuples of per-row arrays. The greedy strip walk steps
+    through the columns with all rows at once, so a candidate search costs
+    n array steps rather than L × n Python iterations. Returns the
+    unrounded (x, y, w, h) arrays, each (L, n).
+    """
+    L, n = areas.shape
+    rx, ry, rw, rh = first_rect
+    s = hi = lo = worst = side = np.zeros(L)
+    vert = np.zeros(L, bool)
+    # Per room: the state of its strip as of that column
+    strip_s, strip_side = np.empty((L, n)), np.empty((L, n))
+    strip_x, strip_y = np.empty((L, n)), np.empty((L, n))
+    strip_vert, opens = np.empty((L, n), bool), np.empty((L, n), bool)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        for k in range(n):
+            a = areas[:, k]
+            new_zone = first[:, k]
+            # The worst room in a strip is either its largest or its smallest
+            side2 = side * side
+            s2 = s + a
+            hi2, lo2 = np.maximum(hi, a), np.minimum(lo, a)
+            w2 = np.maximum(side2 * hi2 / (s2 * s2), s2 * s2 / (side2 * lo2))
+            grow = ~new_zone & ~(w2 > worst)
+            if k:
+                # A finished strip takes its depth off the rectangle's left or bottom
+                depth = s / side
+                cut_x = ~grow & ~new_zone & vert
+                cut_y = ~grow & ~new_zone & ~vert
+                rx, rw = np.where(cut_x, rx + depth, rx), np.where(cut_x, rw - depth, rw)
+                ry, rh = np.where(cut_y, ry + depth, ry), np.where(cut_y, rh - depth, rh)
+                if new_zone.any():
+                    rx, ry, rw, rh = (np.where(new_zone, z, r) for z, r in
+                                      zip(next_rect, (rx, ry, rw, rh)))
+            side = np.where(grow, side, np.minimum(rw, rh))
+            vert = np.where(grow, vert, rw >= rh)
+            side2 = side * side
+            s, hi, lo = np.where(grow, s2, a), np.where(grow, hi2, a), np.where(grow, lo2, a)
+            worst = np.where(grow, w2, np.maximum(side2 / a, a / side2))
+            strip_s[:, k], strip_side[:, k], opens[:, k] = s, side, ~grow
+            strip_x[:, k], strip_y[:, k], strip_vert[:, k] = rx, ry, vert
+
+    # A strip's depth comes from its total area, known at its last room
+    total = strip_s
+    for k in range(n - 2, -1, -1):
+        total[:, k] = np.where(opens[:, k + 1], strip_s[:, k], total[:, k + 1])
+    depth = total / strip_side
+    length = areas / depth
+    offset = np.zeros((L, n))
+    for k in range(1, n):
+        offset[:, k] = np.where(opens[:, k], 0.0, offset[:, k - 1] + length[:, k - 1])
+    # Vertical strips run up the left of the rectangle, others along its bottom
+    return (np.where(strip_vert, strip_x, strip_x + offset),
+            np.where(strip_vert, strip_y + offset, strip_y),
+            np.where(strip_vert, depth, length), np.where(strip_vert, length, depth))
+
+def _place_rooms(specs, share_shift, keep_order, plot_w, plot_h):
+    """
+    position_rooms() for L variants of one floor at once, as (L, n + 1)
+    placed records identical to its Layouts. specs is an (L, n) ROOM_DTYPE
+    array, share_shift and keep_order hold one value per variant. Per-call
+    NumPy overhead makes this slower than position_rooms() for a single
+    layout and several times faster for a candidate search.
+    """
+    L, n = specs.shape
+    iw = plot_w - 2 * WALL
+    ih = plot_h - 2 * WALL
+    corr_h = max(4.0, ih * 0.08)
+
+    # Zone depths follow the room weights on either side of the passage
+    # (cumsum adds in room order, like the sequential sum it replaces)
+    is_top, is_bot = specs['zone'] == _TOP, specs['zone'] == _BOTTOM
+    top_w = np.cumsum(np.where(is_top, specs['weight'], 0.0), axis=1)[:, -1]
+    bot_w = np.cumsum(np.where(is_bot, specs['weight'], 0.0), axis=1)[:, -1]
+    total = top_w + bot_w
+    share = np.divide(top_w, total, out=np.full(L, 0.5), where=total != 0) + share_shift
+    share = np.where(is_top.any(1) & is_bot.any(1), np.clip(share, *ZONE_SHARE_LIMITS), share)
+    top_h = (ih - corr_h) * share
+    bot_h = (ih - corr_h) - top_h
+
+    # Append the passage and sort each row by zone code (top, passage,
+    # bottom), heaviest first within a zone (ties keep spec order) unless
+    # the variant keeps its own order
+    placed = np.zeros((L, n + 1), ROOM_DTYPE)
+    placed[:, :n] = specs
+    placed['id'][:, n], placed['type'][:, n], placed['zone'][:, n] = n, _CORRIDOR, _MID
+    key = np.where(keep_order[:, None], 0.0, -placed['weight'])
+    placed = np.take_along_axis(placed, np.lexsort((key, placed['zone']), axis=1), axis=1)
+    room = placed['zone'] != _MID
+
+    n_top = is_top.sum(1)
+    in_top = np.arange(n) < n_top[:, None]
+    wts = np.maximum(placed['weight'][room].reshape(L, n), 1e-6)
+    top_sum = np.cumsum(np.where(in_top, wts, 0.0), axis=1)[:, -1]
+    bot_sum = np.cumsum(np.where(in_top, 0.0, wts), axis=1)[:, -1]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        areas = wts * np.where(in_top, (iw * top_h / top_sum)[:, None],
+                               (iw * bot_h / bot_sum)[:, None])
+
+    walls, inner_w = np.full(L, WALL), np.full(L, iw)
+    bot_rect = (walls, walls, inner_w, bot_h)
+    top_rect = (walls, WALL + bot_h + corr_h, inner_w, top_h)
+    # Column 0 opens the top zone, or the bottom one on floors without top rooms
+    first_rect = tuple(np.where(n_top > 0, t, b) for t, b in zip(top_rect, bot_rect))
+    first = (np.arange(n) == 0) | (np.arange(n) == n_top[:, None])
+    x, y, w, h = (round_like_python(v, 2)
+                  for v in _squarify_rows(areas, first, first_rect, bot_rect))
+    # Mirror the bottom zone vertically so it also fills from the passage
+    y = np.where(in_top, y, round_like_python(WALL + bot_h[:, None] - (y - WALL) - h, 2))
+
+    passage = ~room
+    for field, v in zip('xywh', (x, y, w, h)):
+        placed[field][room] = v.ravel()
+    placed['x'][passage] = WALL
+    placed['y'][passage] = round_like_python(WALL + bot_h, 2)
+    placed['w'][passage] = round(iw, 2)
+    placed['h'][passage] = round(corr_h, 2)
     return placed
 
+def generate_layouts(room_specs, plot_w, plot_h, n):
+    """Placed records of variants 0..n-1 of one floor, as an (n, rooms + 1) array."""
+    lists = _spec_lists(room_specs)
+    plans = [(lists[0], None, 0.0, False)] + [_variant_plan(v, *lists) for v in range(1, n)]
+    zones, orders, shifts, keep = zip(*plans)
+    spec_order = list(range(len(room_specs)))
+    order = np.array([spec_order if o is None else o for o in orders])
+    specs = room_specs.rooms[order]
+    specs['zone'] = np.take_along_axis(np.array(zones, np.uint8), order, axis=1)
+    return _place_rooms(specs, np.array(shifts), np.array(keep), plot_w, plot_h)
+
+def score_layouts(layouts, plot_w, plot_h):
+    """
+    Score many layouts of the same floor at once. layouts is the (L, rooms)
+    record array from generate_layouts(); per-room terms are computed with
+    array arithmetic over all of it and reduced along each layout's row.
+
+    Returns (score, metrics): score is an array (higher is better) and
+    metrics a dict of per-layout arrays — area-weighted mean and worst aspect
+    ratio, smallest room side, share of window rooms on an exterior wall and
+    corridor waste (passage plus spurs to rooms that do not open onto it, as
+    a share of the floor).
+    """
+    x, y, w, h = layouts['x'], layouts['y'], layouts['w'], layouts['h']
+    rtype = layouts['type']
+    corr = rtype == _CORRIDOR
+    room = ~corr
+
+    def per_layout(values, mask=room):
+        return np.where(mask, values, 0).sum(axis=1)
+
+    area = w * h
+    side = np.minimum(w, h)
+    aspect = np.maximum(w, h) / np.maximum(side, 1e-6)
+    room_area = per_layout(area)
+    mean_aspect = per_layout(area * aspect) / np.maximum(room_area, 1e-9)
+    worst_aspect = np.where(room, aspect, 0).max(axis=1)
+    smallest = np.where(room, side, np.inf).min(axis=1)
+    min_side = _MIN_SIDE_BY_TYPE[rtype]
+    short = np.clip((min_side - side) / min_side, 0, 1)
+    n_rooms = np.maximum(room.sum(axis=1), 1)
+
+    eps = 0.05
+    exterior = ((x <= WALL + eps) | (y <= WALL + eps) |
+                (x + w >= plot_w - WALL - eps) | (y + h >= plot_h - WALL - eps))
+    wants = room & _WANTS_WINDOW[rtype]
+    n_window = wants.sum(axis=1)
+    exposure = np.where(n_window > 0, (exterior & wants).sum(axis=1)
+                        / np.maximum(n_window, 1), 1.0)
+
+    # Passage position per layout; rooms whose near edge is not on it need a spur
+    corr_lo = per_layout(y, corr)[:, None]
+    corr_hi = per_layout(y + h, corr)[:, None]
+    above = y >= corr_hi - eps
+    gap = np.where(above, y - corr_hi, corr_lo - (y + h))
+    spur = np.clip(gap, 0, None) * SPUR_WIDTH
+    floor_area = (plot_w - 2 * WALL) * (plot_h - 2 * WALL)
+    corridor = (per_layout(area, corr) + per_layout(spur)) / floor_area
+
+    penalty = (SCORE_WEIGHTS['aspect'] * (1 - 1 / mean_aspect)
+               + SCORE_WEIGHTS['minSide'] * per_layout(short) / n_rooms
+               + SCORE_WEIGHTS['windows'] * (1 - exposure)
+               + SCORE_WEIGHTS['corridor'] * np.minimum(corridor, 1))
+    metrics = {'meanAspect': mean_aspect, 'worstAspect': worst_aspect,
+               'smallestSide': smallest, 'windowExposure': exposure,
+               'corridorWaste': corridor}
+    return 1 - penalty, metrics
+
+def rank_layouts(room_specs, plot_w, plot_h, n, top):
+    """
+    Generate n variants of one floor, score them and return up to `top`
+    distinct ones, best first, as (variant, placed, score, metrics) tuples.
+    """
+    names = room_specs.names + ('Passage',)
+    with stage('layout'):
+        layouts = generate_layouts(room_specs, plot_w, plot_h, n)
+    with stage('score'):
+        score, metrics = score_layouts(layouts, plot_w, plot_h)
+        ranked, seen = [], set()
+        for v in np.argsort(-score, kind='stable'):
+            sig = layouts[v].tobytes()
+            if sig in seen:
+                continue
+            seen.add(sig)
+            ranked.append((int(v), Layout(layouts[v], names), float(score[v]),
+                           {m: float(vals[v]) for m, vals in metrics.items()}))
+            if len(ranked) == top:
+                break
+    return ranked
+
 # ═══════════════════════════════════════════════════════════════════════════════
 # BLUEPRINT DRAWING
 # ═══════════════════════════════════════════════════════════════════════════════
@@ -331,6 +1697,9 @@ ROOM_COLORS = {
     'gym': '#ef4444', 'entertainment': '#ec4899', 'terrace': '#0ea5e9',
     'closet': '#a855f7', 'play': '#22c55e',
 }
+# Fill colour (RGB, 0..1) per type code
+_TYPE_RGB = np.array([[int(c[i:i + 2], 16) / 255 for i in (1, 3, 5)]
+                      for c in (ROOM_COLORS.get(t, '#374151') for t in ROOM_TYPES)])
 
 BG_DARK  = '#0f172a'
 BG_MID   = '#1e293b'
@@ -341,257 +1710,1233 @@ CLR_CYAN = '#22d3ee'
 def draw_floor_plan(placed, plot_w, plot_h, title, floor_area,
                      is_ground=False, is_top_floor=False):
     """Render an architectural floor-plan image and return base64 PNG."""
-    fig, ax = plt.subplots(figsize=(14, 12), facecolor=BG_DARK)
-    ax.set_facecolor(BG_MID)
-
-    # ── 1. Room fills ──
-    for r in placed:
-        c = ROOM_COLORS.get(r['type'], '#374151')
-        h = '////' if r['type'] == 'bathroom' else None
-        alpha = 0.20 if r['type'] == 'corridor' else 0.40
-        rect = Rectangle((r['x'], r['y']), r['w'], r['h'],
-                          facecolor=c, alpha=alpha, hatch=h,
-                          edgecolor='#475569' if h else 'none',
-                          linewidth=0.5 if h else 0, zorder=1)
-        ax.add_patch(rect)
-
-    # ── 2. Outer walls ──
-    for (x, y, w, h) in [(0, 0, plot_w, WALL),
-                          (0, plot_h - WALL, plot_w, WALL),
-                          (0, 0, WALL, plot_h),
-                          (plot_w - WALL, 0, WALL, plot_h)]:
-        ax.add_patch(Rectangle((x, y), w, h,
-                     facecolor='#475569', edgecolor=CLR_WALL,
-                     linewidth=0.8, zorder=3))
-
-    # ── 3. Partition walls (room borders) ──
-    for r in placed:
-        if r['type'] == 'corridor':
+    png = render_floor_png(placed, plot_w, plot_h, title, floor_area,
+                           is_ground, is_top_floor)
+    with stage('encode'):
+        return base64.b64encode(png).decode('utf-8')
+
+def render_floor_png(placed, plot_w, plot_h, title, floor_area,
+                     is_ground=False, is_top_floor=False, dpi=150):
+    """Render an architectural floor-plan image and return the PNG bytes."""
+    return _thread_renderer().render(placed, plot_w, plot_h, title, floor_area,
+                                     is_ground, is_top_floor, dpi)
+
+_renderers = threading.local()
+Figure = FigureCanvasAgg = LineCollection = PatchCollection = PolyCollection = None
+Rectangle = to_rgba = None
+
+def _import_matplotlib():
+    """Import matplotlib (Agg backend) on the first render; estimator workers never do."""
+    global Figure, FigureCanvasAgg, LineCollection, PatchCollection, PolyCollection
+    global Rectangle, to_rgba
+    if Figure is not None:
+        return
+    import matplotlib
+    matplotlib.use('Agg')
+    matplotlib.rcParams['font.family'] = 'sans-serif'
+    matplotlib.rcParams['font.sans-serif'] = ['Arial', 'Helvetica', 'DejaVu Sans']
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from matplotlib.collections import LineCollection, PatchCollection, PolyCollection
+    from matplotlib.colors import to_rgba
+    from matplotlib.patches import Rectangle
+    from matplotlib.figure import Figure
+
+def _thread_renderer():
+    # Figures are not thread-safe, so each thread (or pool process) gets its own
+    r = getattr(_renderers, 'renderer', None)
+    if r is None:
+        r = _renderers.renderer = FloorPlanRenderer()
+    return r
+
+def _rect_verts(rooms):
+    """(k, 4, 2) corner arrays of room records, for a PolyCollection."""
+    x0, y0 = rooms['x'], rooms['y']
+    x1, y1 = x0 + rooms['w'], y0 + rooms['h']
+    return np.stack([np.column_stack(c) for c in ((x0, y0), (x1, y0), (x1, y1), (x0, y1))],
+                    axis=1)
+
+def _segments(x1, y1, x2, y2):
+    """(k, 2, 2) line segments from endpoint arrays."""
+    return np.stack([np.column_stack([x1, y1]), np.column_stack([x2, y2])], axis=1)
+
+def _quarter_arcs(cx, cy, r, theta1):
+    """(k, 13, 2) polylines for 90° arcs starting at `theta1` degrees."""
+    t = np.radians(theta1[:, None] + np.linspace(0, 90, 13))
+    return np.stack([cx[:, None] + r[:, None] * np.cos(t),
+                     cy[:, None] + r[:, None] * np.sin(t)], axis=-1)
+
+def _doors(rooms):
+    """
+    Door of every room record, in the wall facing the passage: opening
+    start x, wall y and width, the hinge x, the open leaf's far y and
+    whether the door is in the room's bottom edge (rooms above the passage).
+    """
+    door_w = np.minimum(2.8, rooms['w'] * 0.25)
+    dx = rooms['x'] + rooms['w'] * 0.35
+    down = rooms['zone'] != _BOTTOM
+    dy = np.where(down, rooms['y'], rooms['y'] + rooms['h'])
+    hinge = np.where(down, dx + door_w, dx)
+    leaf = np.where(down, dy + door_w * 0.9, dy - door_w * 0.9)
+    return dx, dy, door_w, hinge, leaf, down
+
+# Rooms drawn without windows
+_NO_WINDOWS = frozenset(TYPE_CODE[t] for t in ('bathroom', 'corridor', 'staircase', 'closet'))
+
+def _window_segments(rows, plot_w, plot_h):
+    """Window strokes on the exterior walls: three parallel lines per outside wall of a room."""
+    segs = []
+    for x, y, w, h, t, _ in rows:
+        if t in _NO_WINDOWS:
             continue
-        ax.add_patch(Rectangle((r['x'], r['y']), r['w'], r['h'],
-                     facecolor='none', edgecolor=CLR_WALL,
-                     linewidth=1.8, zorder=2))
+        win_l = min(3.0, w * 0.28)
+        wx = x + w * 0.5 - win_l / 2
+        wy = y + h * 0.5 - win_l / 2
+        for d in (-0.15, 0, 0.15):
+            if y <= WALL + 0.1:
+                segs.append([(wx, d), (wx + win_l, d)])
+            if y + h >= plot_h - WALL - 0.1:
+                segs.append([(wx, plot_h + d), (wx + win_l, plot_h + d)])
+            if x <= WALL + 0.1:
+                segs.append([(d, wy), (d, wy + win_l)])
+            if x + w >= plot_w - WALL - 0.1:
+                segs.append([(plot_w + d, wy), (plot_w + d, wy + win_l)])
+    return segs
+
+def _room_labels(placed, rows):
+    """(cx, cy, h, name, font size, (width, length, area) or None) per room."""
+    labels = []
+    for name, (x, y, w, h, t, _), dims in zip(placed.room_names(), rows, placed.dims()):
+        min_dim = min(w, h)
+        fs = 11 if min_dim > 8 else 10 if min_dim > 5 else 8 if min_dim > 3 else 7
+        labels.append((x + w / 2, y + h / 2, h, name, fs, None if t == _CORRIDOR else dims))
+    return labels
 
-    # ── 4. Doors ──
-    for r in placed:
-        if r['type'] in ('corridor',):
-            continue
-        door_w = min(2.8, r['w'] * 0.25)
-        # Rooms in top zone → door on bottom edge; bottom zone → door on top
-        if r['zone'] == 'top' or (r['zone'] == 'mid'):
-            dx = r['x'] + r['w'] * 0.35
-            dy = r['y']
-            # "erase" wall at door
-            ax.plot([dx, dx + door_w], [dy, dy],
-                    color=BG_MID, linewidth=5, zorder=4, solid_capstyle='butt')
-            # arc
-            arc = Arc((dx + door_w, dy), door_w * 1.8, door_w * 1.8,
-                      angle=0, theta1=90, theta2=180,
-                      color=CLR_GOLD, linewidth=1.0, linestyle='--', zorder=5)
-            ax.add_patch(arc)
-            ax.plot([dx + door_w, dx + door_w], [dy, dy + door_w * 0.9],
-                    color=CLR_GOLD, linewidth=1.2, zorder=5)
-        else:
-            dx = r['x'] + r['w'] * 0.35
-            dy = r['y'] + r['h']
-            ax.plot([dx, dx + door_w], [dy, dy],
-                    color=BG_MID, linewidth=5, zorder=4, solid_capstyle='butt')
-            arc = Arc((dx, dy), door_w * 1.8, door_w * 1.8,
-                      angle=0, theta1=270, theta2=360,
-                      color=CLR_GOLD, linewidth=1.0, linestyle='--', zorder=5)
-            ax.add_patch(arc)
-            ax.plot([dx, dx], [dy, dy - door_w * 0.9],
-                    color=CLR_GOLD, linewidth=1.2, zorder=5)
-
-    # ── 5. Windows on exterior walls ──
-    for r in placed:
-        if r['type'] in ('bathroom', 'corridor', 'staircase', 'closet'):
-            continue
-        win_l = min(3.0, r['w'] * 0.28)
-        # Bottom exterior
-        if r['y'] <= WALL + 0.1:
-            wx = r['x'] + r['w'] * 0.5 - win_l / 2
-            for d in (-0.15, 0, 0.15):
-                ax.plot([wx, wx + win_l], [d, d],
-                        color=CLR_CYAN, linewidth=1.4, zorder=4)
-        # Top exterior
-        if r['y'] + r['h'] >= plot_h - WALL - 0.1:
-            wx = r['x'] + r['w'] * 0.5 - win_l / 2
-            for d in (-0.15, 0, 0.15):
-                ax.plot([wx, wx + win_l], [plot_h + d, plot_h + d],
-                        color=CLR_CYAN, linewidth=1.4, zorder=4)
-        # Left exterior
-        if r['x'] <= WALL + 0.1:
-            wy = r['y'] + r['h'] * 0.5 - win_l / 2
-            for d in (-0.15, 0, 0.15):
-                ax.plot([d, d], [wy, wy + win_l],
-                        color=CLR_CYAN, linewidth=1.4, zorder=4)
-        # Right exterior
-        if r['x'] + r['w'] >= plot_w - WALL - 0.1:
-            wy = r['y'] + r['h'] * 0.5 - win_l / 2
-            for d in (-0.15, 0, 0.15):
-                ax.plot([plot_w + d, plot_w + d], [wy, wy + win_l],
-                        color=CLR_CYAN, linewidth=1.4, zorder=4)
-
-    # ── 6. Staircase symbol ──
-    for r in placed:
-        if r['type'] != 'staircase':
-            continue
-        num = int(r['h'] / 1.0) or 4
-        for t in range(num):
-            ty = r['y'] + t * (r['h'] / num)
-            ax.plot([r['x'] + 0.5, r['x'] + r['w'] - 0.5], [ty, ty],
-                    color='#94a3b8', linewidth=0.6, zorder=2)
-        cx = r['x'] + r['w'] / 2
+def _legend_types(rows):
+    """Room types present (passage excluded), in order of first appearance."""
+    return [ROOM_TYPES[t] for t in dict.fromkeys(r[4] for r in rows) if t != _CORRIDOR]
+
+def _entrance_x(rows):
+    """Left end of the main entrance: under the living room, else near the corner."""
+    living = next((r for r in rows if r[4] == _LIVING), None)
+    return living[0] + living[2] * 0.4 if living else WALL + 2
+
+class FloorPlanRenderer:
+    """
+    Reusable floor-plan figure. The figure, Agg canvas and axes are set up
+    once per thread/process; each render adds its artists, saves the PNG and
+    removes only those artists. Room fills, walls, doors, windows and stair
+    treads go into a handful of Patch/LineCollections instead of one patch or
+    Line2D per element.
+    """
+
+    def __init__(self):
+        _import_matplotlib()
+        self.fig = Figure(figsize=(14, 12), facecolor=BG_DARK)
+        FigureCanvasAgg(self.fig)
+        self.ax = self.fig.add_subplot()
+        self.ax.set_facecolor(BG_MID)
+        self.ax.set_aspect('equal')
+        self.ax.axis('off')
+
+    def render(self, placed, plot_w, plot_h, title, floor_area,
+               is_ground=False, is_top_floor=False, dpi=150):
+        t0 = time.perf_counter()
+        ax = self.ax
+        added = []
+
+        def add(artist):
+            added.append(artist)
+            return artist
+
+        def lines(segs, **kw):
+            if len(segs):
+                add(ax.add_collection(LineCollection(segs, **kw), autolim=False))
+
+        def text(*args, **kw):
+            add(ax.text(*args, **kw))
+
+        rec = placed.rooms
+        rooms = rec[rec['type'] != _CORRIDOR]
+        rows = placed.rows()
+
+        # ── 1. Room fills (hatched bathrooms in their own collection) ──
+        for hatched in (False, True):
+            group = rec[(rec['type'] == _BATHROOM) == hatched]
+            if not len(group):
+                continue
+            alpha = np.where(group['type'] == _CORRIDOR, 0.20, 0.40)
+            pc = PolyCollection(
+                _rect_verts(group),
+                facecolors=np.column_stack([_TYPE_RGB[group['type']], alpha]),
+                edgecolors=to_rgba('#475569', 0.40) if hatched else 'none',
+                linewidths=0.5 if hatched else 0, zorder=1)
+            if hatched:
+                pc.set_hatch('////')
+            add(ax.add_collection(pc, autolim=False))
+
+        # ── 2. Outer walls ──
+        walls = [(0, 0, plot_w, WALL), (0, plot_h - WALL, plot_w, WALL),
+                 (0, 0, WALL, plot_h), (plot_w - WALL, 0, WALL, plot_h)]
+        add(ax.add_collection(PatchCollection(
+            [Rectangle((x, y), w, h) for (x, y, w, h) in walls],
+            facecolors='#475569', edgecolors=CLR_WALL, linewidths=0.8, zorder=3),
+            autolim=False))
+
+        # ── 3. Partition walls (room borders) ──
+        if len(rooms):
+            add(ax.add_collection(PolyCollection(
+                _rect_verts(rooms), facecolors='none', edgecolors=CLR_WALL,
+                linewidths=1.8, zorder=2), autolim=False))
+
+        # ── 4. Doors ──
+        dx, dy, door_w, hinge, leaf, down = _doors(rooms)
+        lines(_segments(dx, dy, dx + door_w, dy),
+              colors=BG_MID, linewidths=5, zorder=4, capstyle='butt')
+        lines(_quarter_arcs(hinge, dy, door_w * 0.9, np.where(down, 90, 270)),
+              colors=CLR_GOLD, linewidths=1.0, linestyles='--', zorder=5)
+        lines(_segments(hinge, dy, hinge, leaf),
+              colors=CLR_GOLD, linewidths=1.2, zorder=5, capstyle='projecting')
+
+        # ── 5. Windows on exterior walls ──
+        lines(_window_segments(rows, plot_w, plot_h),
+              colors=CLR_CYAN, linewidths=1.4, zorder=4, capstyle='projecting')
+
+        # ── 6. Staircase symbol ──
+        treads = []
+        for x, y, w, h, t, _ in rows:
+            if t != _STAIRCASE:
+                continue
+            num = int(h / 1.0) or 4
+            for i in range(num):
+                ty = y + i * (h / num)
+                treads.append([(x + 0.5, ty), (x + w - 0.5, ty)])
+            label = '▲ UP' if is_ground else '▼ DN' if is_top_floor else '▲▼'
+            text(x + w / 2, y + h / 2, label,
+                 ha='center', va='center', fontsize=8, color=CLR_GOLD,
+                 fontweight='bold', zorder=6)
+        lines(treads, colors='#94a3b8', linewidths=0.6, zorder=2, capstyle='projecting')
+
+        # ── 7. Entrance marker (ground floor only) ──
         if is_ground:
-            label = '▲ UP'
-        elif is_top_floor:
-            label = '▼ DN'
-        else:
-            label = '▲▼'
-        ax.text(cx, r['y'] + r['h'] / 2, label,
-                ha='center', va='center', fontsize=8, color=CLR_GOLD,
-                fontweight='bold', zorder=6)
+            ex = _entrance_x(rows)
+            ew = 4.0
+            add(ax.add_patch(Rectangle((ex, -0.1), ew, WALL + 0.2,
+                                       facecolor=BG_MID, edgecolor='none', zorder=4)))
+            add(ax.annotate('', xy=(ex + ew / 2, WALL + 0.5), xytext=(ex + ew / 2, -3),
+                            arrowprops=dict(arrowstyle='->', color=CLR_GOLD, lw=2.5),
+                            zorder=6))
+            text(ex + ew / 2, -4, 'MAIN ENTRANCE',
+                 ha='center', fontsize=9, fontweight='bold', color=CLR_GOLD, zorder=6)
+            lines([[(ex, 0), (ex + ew * 0.48, 0)], [(ex + ew * 0.52, 0), (ex + ew, 0)]],
+                  colors=CLR_GOLD, linewidths=3, zorder=5, capstyle='projecting')
+
+        # ── 8. Room labels ──
+        for cx, cy, h, name, fs, dims in _room_labels(placed, rows):
+            text(cx, cy + h * 0.13, name, ha='center', va='center',
+                 fontsize=fs, fontweight='bold', color='white', zorder=6)
+            if dims:
+                dw, dh, area = dims
+                text(cx, cy - h * 0.06, f"{dw}' × {dh}'", ha='center', va='center',
+                     fontsize=max(fs - 1, 6), color='#e2e8f0', zorder=6)
+                text(cx, cy - h * 0.22, f"{area} sq.ft", ha='center',
+                     va='center', fontsize=max(fs - 2, 6), color='#94a3b8', zorder=6)
+
+        # ── 9. Dimension arrows ──
+        dy_bot = -2.5 if is_ground else -1.5
+        add(ax.annotate('', xy=(plot_w, dy_bot), xytext=(0, dy_bot),
+                        arrowprops=dict(arrowstyle='<->', color=CLR_GOLD, lw=1.5), zorder=6))
+        text(plot_w / 2, dy_bot - 1.5, f"{round(plot_w, 1)}'  ({round(plot_w * 0.3048, 1)} m)",
+             ha='center', fontsize=10, color=CLR_GOLD, fontweight='bold', zorder=6)
+        dx_left = -1.5
+        add(ax.annotate('', xy=(dx_left, plot_h), xytext=(dx_left, 0),
+                        arrowprops=dict(arrowstyle='<->', color=CLR_GOLD, lw=1.5), zorder=6))
+        text(dx_left - 2, plot_h / 2, f"{round(plot_h, 1)}'  ({round(plot_h * 0.3048, 1)} m)",
+             ha='center', fontsize=10, color=CLR_GOLD, fontweight='bold',
+             rotation=90, zorder=6)
+
+        # ── 10. Compass ──
+        comp_x, comp_y = plot_w + 2, plot_h - 3
+        add(ax.annotate('N', xy=(comp_x, comp_y + 3), fontsize=12,
+                        fontweight='bold', color=CLR_GOLD, ha='center', zorder=6))
+        add(ax.annotate('', xy=(comp_x, comp_y + 2.7), xytext=(comp_x, comp_y + 0.5),
+                        arrowprops=dict(arrowstyle='->', color=CLR_GOLD, lw=2), zorder=6))
+
+        # ── 11. Legend ──
+        uniq = _legend_types(rows)
+        legend_y = dy_bot - 4.5 if is_ground else dy_bot - 3.5
+        cols = max(len(uniq), 1)
+        if uniq:
+            add(ax.add_collection(PatchCollection(
+                [Rectangle((i * (plot_w / cols), legend_y), 1.5, 1.0) for i in range(len(uniq))],
+                facecolors=[to_rgba(ROOM_COLORS.get(rt, '#374151'), 0.6) for rt in uniq],
+                edgecolors=to_rgba('#94a3b8', 0.6), linewidths=0.6, zorder=6), autolim=False))
+        for i, rt in enumerate(uniq):
+            text(i * (plot_w / cols) + 2.2, legend_y + 0.5, rt.replace('_', ' ').title(),
+                 fontsize=7.5, color='#d1d5db', va='center', zorder=6)
+
+        # ── 12. Scale bar ──
+        scale_y = legend_y - 2
+        bar_len = 10  # 10 feet
+        lines([[(0, scale_y), (bar_len, scale_y)]], colors=CLR_WALL, linewidths=2, zorder=6,
+              capstyle='projecting')
+        lines([[(t, scale_y - 0.3), (t, scale_y + 0.3)] for t in range(0, bar_len + 1, 5)],
+              colors=CLR_WALL, linewidths=1, zorder=6, capstyle='projecting')
+        text(bar_len / 2, scale_y - 1, f"Scale: {bar_len} ft",
+             ha='center', fontsize=8, color='#94a3b8', zorder=6)
+
+        # ── 13. Title ──
+        title_y = plot_h + 3
+        text(plot_w / 2, title_y, title,
+             ha='center', fontsize=14, fontweight='bold', color='white', zorder=6)
+        text(plot_w / 2, title_y - 1.5,
+             f"Floor Area: {round(floor_area)} sq.ft  |  {len(rooms)} Rooms  |  "
+             f"Plot: {round(plot_w, 1)}' × {round(plot_h, 1)}'",
+             ha='center', fontsize=9, color='#9ca3af', zorder=6)
+
+        # ── Axis limits ──
+        ax.set_xlim(dx_left - 3.5, plot_w + 5)
+        yl = legend_y - 3 if is_ground else legend_y - 2
+        ax.set_ylim(min(yl, scale_y - 2.5), title_y + 2)
+
+        record_stage('draw', time.perf_counter() - t0)
+        try:
+            with stage('savefig'):
+                buf = io.BytesIO()
+                self.fig.savefig(buf, format='png', dpi=dpi, bbox_inches='tight',
+                                 facecolor=BG_DARK, edgecolor='none')
+            return buf.getvalue()
+        finally:
+            for artist in added:
+                artist.remove()
 
-    # ── 7. Entrance marker (ground floor only) ──
-    if is_ground:
-        # Find the living room to position entrance near it
-        living = next((r for r in placed if r['type'] == 'living'), None)
-        if living:
-            ex = living['x'] + living['w'] * 0.4
-        else:
-            ex = WALL + 2
-        ew = 4.0
-        # "Erase" outer wall at entrance
-        ax.add_patch(Rectangle((ex, -0.1), ew, WALL + 0.2,
-                     facecolor=BG_MID, edgecolor='none', zorder=4))
-        # Entrance arrow & label
-        ax.annotate('', xy=(ex + ew / 2, WALL + 0.5),
-                    xytext=(ex + ew / 2, -3),
-                    arrowprops=dict(arrowstyle='->', color=CLR_GOLD, lw=2.5),
-                    zorder=6)
-        ax.text(ex + ew / 2, -4, 'MAIN ENTRANCE',
-                ha='center', fontsize=9, fontweight='bold', color=CLR_GOLD, zorder=6)
-        # Double-door lines
-        ax.plot([ex, ex + ew * 0.48], [0, 0], color=CLR_GOLD, lw=3, zorder=5)
-        ax.plot([ex + ew * 0.52, ex + ew], [0, 0], color=CLR_GOLD, lw=3, zorder=5)
-
-    # ── 8. Room labels ──
-    for r in placed:
-        cx = r['x'] + r['w'] / 2
-        cy = r['y'] + r['h'] / 2
-        min_dim = min(r['w'], r['h'])
-        fs = 11 if min_dim > 8 else 10 if min_dim > 5 else 8 if min_dim > 3 else 7
+# ═══════════════════════════════════════════════════════════════════════════════
+# SVG BLUEPRINT WRITER  (vector output straight from the placed rooms)
+# ═══════════════════════════════════════════════════════════════════════════════
 
-        ax.text(cx, cy + r['h'] * 0.13, r['name'],
-                ha='center', va='center', fontsize=fs,
-                fontweight='bold', color='white', zorder=6)
-
-        if r['type'] != 'corridor':
-            dw = round(r['w'], 1)
-            dh = round(r['h'], 1)
-            ax.text(cx, cy - r['h'] * 0.06,
-                    f"{dw}' × {dh}'",
-                    ha='center', va='center', fontsize=max(fs - 1, 6),
-                    color='#e2e8f0', zorder=6)
-            ax.text(cx, cy - r['h'] * 0.22,
-                    f"{round(dw * dh)} sq.ft",
-                    ha='center', va='center', fontsize=max(fs - 2, 6),
-                    color='#94a3b8', zorder=6)
-
-    # ── 9. Dimension arrows ──
-    dy_bot = -2.5 if is_ground else -1.5
-    ax.annotate('', xy=(plot_w, dy_bot), xytext=(0, dy_bot),
-                arrowprops=dict(arrowstyle='<->', color=CLR_GOLD, lw=1.5), zorder=6)
-    ax.text(plot_w / 2, dy_bot - 1.5,
-            f"{round(plot_w, 1)}'  ({round(plot_w * 0.3048, 1)} m)",
-            ha='center', fontsize=10, color=CLR_GOLD, fontweight='bold', zorder=6)
+SVG_PX_PER_FT = 20
+
+class _SvgCanvas:
+    """
+    Minimal SVG builder in floor-plan feet (y up). Font sizes and line widths
+    are given in matplotlib points and scaled so the drawing matches the
+    PNG render.
+    """
 
+    def __init__(self, x0, x1, y0, y1):
+        self.x0, self.y1 = x0, y1
+        self.w = (x1 - x0) * SVG_PX_PER_FT
+        self.h = (y1 - y0) * SVG_PX_PER_FT
+        # The PNG axes span 77.5% × 77% of a 14 × 12 inch figure at equal aspect
+        pt_per_ft = min(14 * 72 * 0.775 / (x1 - x0), 12 * 72 * 0.77 / (y1 - y0))
+        self.pt = SVG_PX_PER_FT / pt_per_ft                 # px per matplotlib point
+        self.parts = []
+
+    def X(self, x):
+        return f"{(x - self.x0) * SVG_PX_PER_FT:.1f}"
+
+    def Y(self, y):
+        return f"{(self.y1 - y) * SVG_PX_PER_FT:.1f}"
+
+    def L(self, v):
+        return f"{v * SVG_PX_PER_FT:.1f}"
+
+    def rect(self, x, y, w, h, fill='none', stroke='none', lw=0, opacity=1.0):
+        self.parts.append(
+            f'<rect x="{self.X(x)}" y="{self.Y(y + h)}" width="{self.L(w)}" height="{self.L(h)}" '
+            f'fill="{fill}" fill-opacity="{opacity}" stroke="{stroke}" stroke-width="{lw * self.pt:.2f}"/>')
+
+    def line(self, x1, y1, x2, y2, color, lw, arrows=''):
+        """`arrows` is '', 'end' or 'both'."""
+        extra = ' marker-end="url(#arrow)"' if arrows else ''
+        if arrows == 'both':
+            extra += ' marker-start="url(#arrow-start)"'
+        self.parts.append(
+            f'<line x1="{self.X(x1)}" y1="{self.Y(y1)}" x2="{self.X(x2)}" y2="{self.Y(y2)}" '
+            f'stroke="{color}" stroke-width="{lw * self.pt:.2f}"{extra}/>')
+
+    def arc(self, x1, y1, x2, y2, r, color, lw):
+        self.parts.append(
+            f'<path d="M{self.X(x1)},{self.Y(y1)} A{self.L(r)},{self.L(r)} 0 0 0 '
+            f'{self.X(x2)},{self.Y(y2)}" fill="none" stroke="{color}" '
+            f'stroke-width="{lw * self.pt:.2f}" stroke-dasharray="6 4"/>')
+
+    def text(self, x, y, s, size, color, bold=False, anchor='middle', rotate=False):
+        attrs = f' font-weight="bold"' if bold else ''
+        if rotate:
+            attrs += f' transform="rotate(-90 {self.X(x)} {self.Y(y)})"'
+        self.parts.append(
+            f'<text x="{self.X(x)}" y="{self.Y(y)}" font-size="{size * self.pt:.1f}" fill="{color}" '
+            f'text-anchor="{anchor}" dominant-baseline="central"{attrs}>{xml_escape(s)}</text>')
+
+    def tostring(self):
+        head = (f'<svg xmlns="http://www.w3.org/2000/svg" viewBox="0 0 {self.w:.0f} {self.h:.0f}" '
+                f'width="{self.w:.0f}" height="{self.h:.0f}" xml:space="preserve" '
+                f'font-family="Arial, Helvetica, DejaVu Sans, sans-serif">'
+                '<defs>'
+                '<pattern id="hatch" width="8" height="8" patternUnits="userSpaceOnUse" '
+                'patternTransform="rotate(45)"><line x1="0" y1="0" x2="0" y2="8" '
+                'stroke="#475569" stroke-width="1.5"/></pattern>'
+                f'<marker id="arrow" viewBox="0 0 10 10" refX="9" refY="5" markerWidth="6" '
+                f'markerHeight="6" orient="auto"><path d="M0,0 L10,5 L0,10" fill="none" '
+                f'stroke="{CLR_GOLD}" stroke-width="1.5"/></marker>'
+                f'<marker id="arrow-start" viewBox="0 0 10 10" refX="1" refY="5" markerWidth="6" '
+                f'markerHeight="6" orient="auto"><path d="M10,0 L0,5 L10,10" fill="none" '
+                f'stroke="{CLR_GOLD}" stroke-width="1.5"/></marker>'
+                '</defs>'
+                f'<rect width="100%" height="100%" fill="{BG_DARK}"/>')
+        return head + ''.join(self.parts) + '</svg>'
+
+def render_floor_svg(placed, plot_w, plot_h, title, floor_area,
+                     is_ground=False, is_top_floor=False):
+    """Draw the same floor plan as render_floor_png() as an SVG string, without matplotlib."""
+    dy_bot = -2.5 if is_ground else -1.5
     dx_left = -1.5
-    ax.annotate('', xy=(dx_left, plot_h), xytext=(dx_left, 0),
-                arrowprops=dict(arrowstyle='<->', color=CLR_GOLD, lw=1.5), zorder=6)
-    ax.text(dx_left - 2, plot_h / 2,
-            f"{round(plot_h, 1)}'  ({round(plot_h * 0.3048, 1)} m)",
-            ha='center', fontsize=10, color=CLR_GOLD, fontweight='bold',
-            rotation=90, zorder=6)
-
-    # ── 10. Compass ──
-    comp_x = plot_w + 2
-    comp_y = plot_h - 3
-    ax.annotate('N', xy=(comp_x, comp_y + 3), fontsize=12,
-                fontweight='bold', color=CLR_GOLD, ha='center', zorder=6)
-    ax.annotate('', xy=(comp_x, comp_y + 2.7), xytext=(comp_x, comp_y + 0.5),
-                arrowprops=dict(arrowstyle='->', color=CLR_GOLD, lw=2), zorder=6)
-
-    # ── 11. Legend ──
-    uniq = list(dict.fromkeys(r['type'] for r in placed if r['type'] != 'corridor'))
     legend_y = dy_bot - 4.5 if is_ground else dy_bot - 3.5
+    scale_y = legend_y - 2
+    title_y = plot_h + 3
+    yl = legend_y - 3 if is_ground else legend_y - 2
+    cv = _SvgCanvas(dx_left - 3.5, plot_w + 5, min(yl, scale_y - 2.5), title_y + 2)
+
+    rows = placed.rows()
+    rooms = [r for r in rows if r[4] != _CORRIDOR]
+
+    # ── Room fills ──
+    for x, y, w, h, t, _ in rows:
+        cv.rect(x, y, w, h, fill=ROOM_COLORS.get(ROOM_TYPES[t], '#374151'),
+                opacity=0.20 if t == _CORRIDOR else 0.40)
+        if t == _BATHROOM:
+            cv.rect(x, y, w, h, fill='url(#hatch)')
+
+    # ── Partition walls, then outer walls on top ──
+    for x, y, w, h, _, _ in rooms:
+        cv.rect(x, y, w, h, stroke=CLR_WALL, lw=1.8)
+    for (x, y, w, h) in [(0, 0, plot_w, WALL), (0, plot_h - WALL, plot_w, WALL),
+                         (0, 0, WALL, plot_h), (plot_w - WALL, 0, WALL, plot_h)]:
+        cv.rect(x, y, w, h, fill='#475569', stroke=CLR_WALL, lw=0.8)
+
+    # ── Doors ──
+    for x, y, w, h, _, zone in rooms:
+        door_w = min(2.8, w * 0.25)
+        rad = door_w * 0.9
+        dx = x + w * 0.35
+        if zone != _BOTTOM:
+            dy = y
+            cv.line(dx, dy, dx + door_w, dy, BG_MID, 5)
+            cv.arc(dx + door_w, dy + rad, dx + door_w - rad, dy, rad, CLR_GOLD, 1.0)
+            cv.line(dx + door_w, dy, dx + door_w, dy + rad, CLR_GOLD, 1.2)
+        else:
+            dy = y + h
+            cv.line(dx, dy, dx + door_w, dy, BG_MID, 5)
+            cv.arc(dx, dy - rad, dx + rad, dy, rad, CLR_GOLD, 1.0)
+            cv.line(dx, dy, dx, dy - rad, CLR_GOLD, 1.2)
+
+    # ── Windows on exterior walls ──
+    for (x1, y1), (x2, y2) in _window_segments(rows, plot_w, plot_h):
+        cv.line(x1, y1, x2, y2, CLR_CYAN, 1.4)
+
+    # ── Staircase symbol ──
+    for x, y, w, h, t, _ in rows:
+        if t != _STAIRCASE:
+            continue
+        num = int(h / 1.0) or 4
+        for i in range(num):
+            ty = y + i * (h / num)
+            cv.line(x + 0.5, ty, x + w - 0.5, ty, '#94a3b8', 0.6)
+        label = '▲ UP' if is_ground else '▼ DN' if is_top_floor else '▲▼'
+        cv.text(x + w / 2, y + h / 2, label, 8, CLR_GOLD, bold=True)
+
+    # ── Entrance marker (ground floor only) ──
+    if is_ground:
+        ex = _entrance_x(rows)
+        ew = 4.0
+        cv.rect(ex, -0.1, ew, WALL + 0.2, fill=BG_MID)
+        cv.line(ex + ew / 2, -3, ex + ew / 2, WALL + 0.5, CLR_GOLD, 2.5, arrows='end')
+        cv.text(ex + ew / 2, -4, 'MAIN ENTRANCE', 9, CLR_GOLD, bold=True)
+        cv.line(ex, 0, ex + ew * 0.48, 0, CLR_GOLD, 3)
+        cv.line(ex + ew * 0.52, 0, ex + ew, 0, CLR_GOLD, 3)
+
+    # ── Room labels ──
+    for cx, cy, h, name, fs, dims in _room_labels(placed, rows):
+        cv.text(cx, cy + h * 0.13, name, fs, 'white', bold=True)
+        if dims:
+            dw, dh, area = dims
+            cv.text(cx, cy - h * 0.06, f"{dw}' × {dh}'", max(fs - 1, 6), '#e2e8f0')
+            cv.text(cx, cy - h * 0.22, f"{area} sq.ft", max(fs - 2, 6), '#94a3b8')
+
+    # ── Dimension arrows ──
+    cv.line(0, dy_bot, plot_w, dy_bot, CLR_GOLD, 1.5, arrows='both')
+    cv.text(plot_w / 2, dy_bot - 1.5, f"{round(plot_w, 1)}'  ({round(plot_w * 0.3048, 1)} m)",
+            10, CLR_GOLD, bold=True)
+    cv.line(dx_left, 0, dx_left, plot_h, CLR_GOLD, 1.5, arrows='both')
+    cv.text(dx_left - 2, plot_h / 2, f"{round(plot_h, 1)}'  ({round(plot_h * 0.3048, 1)} m)",
+            10, CLR_GOLD, bold=True, rotate=True)
+
+    # ── Compass ──
+    comp_x, comp_y = plot_w + 2, plot_h - 3
+    cv.line(comp_x, comp_y + 0.5, comp_x, comp_y + 2.7, CLR_GOLD, 2, arrows='end')
+    cv.text(comp_x, comp_y + 3.4, 'N', 12, CLR_GOLD, bold=True)
+
+    # ── Legend ──
+    uniq = _legend_types(rows)
     cols = max(len(uniq), 1)
     for i, rt in enumerate(uniq):
         lx = i * (plot_w / cols)
-        ax.add_patch(Rectangle((lx, legend_y), 1.5, 1.0,
-                     facecolor=ROOM_COLORS.get(rt, '#374151'), alpha=0.6,
-                     edgecolor='#94a3b8', linewidth=0.6, zorder=6))
-        ax.text(lx + 2.2, legend_y + 0.5, rt.replace('_', ' ').title(),
-                fontsize=7.5, color='#d1d5db', va='center', zorder=6)
-
-    # ── 12. Scale bar ──
-    scale_y = legend_y - 2
-    bar_len = 10  # 10 feet
-    ax.plot([0, bar_len], [scale_y, scale_y], color=CLR_WALL, lw=2, zorder=6)
+        cv.rect(lx, legend_y, 1.5, 1.0, fill=ROOM_COLORS.get(rt, '#374151'),
+                stroke='#94a3b8', lw=0.6, opacity=0.6)
+        cv.text(lx + 2.2, legend_y + 0.5, rt.replace('_', ' ').title(), 7.5, '#d1d5db',
+                anchor='start')
+
+    # ── Scale bar ──
+    bar_len = 10
+    cv.line(0, scale_y, bar_len, scale_y, CLR_WALL, 2)
     for tick in range(0, bar_len + 1, 5):
-        ax.plot([tick, tick], [scale_y - 0.3, scale_y + 0.3], color=CLR_WALL, lw=1, zorder=6)
-    ax.text(bar_len / 2, scale_y - 1, f"Scale: {bar_len} ft",
-            ha='center', fontsize=8, color='#94a3b8', zorder=6)
+        cv.line(tick, scale_y - 0.3, tick, scale_y + 0.3, CLR_WALL, 1)
+    cv.text(bar_len / 2, scale_y - 1, f"Scale: {bar_len} ft", 8, '#94a3b8')
 
-    # ── 13. Title ──
-    title_y = plot_h + 3
-    ax.text(plot_w / 2, title_y, title,
-            ha='center', fontsize=14, fontweight='bold', color='white', zorder=6)
-    room_count = len([r for r in placed if r['type'] != 'corridor'])
-    ax.text(plot_w / 2, title_y - 1.5,
-            f"Floor Area: {round(floor_area)} sq.ft  |  {room_count} Rooms  |  "
-            f"Plot: {round(plot_w, 1)}' × {round(plot_h, 1)}'",
-            ha='center', fontsize=9, color='#9ca3af', zorder=6)
-
-    # ── Axis limits ──
-    ax.set_xlim(dx_left - 3.5, plot_w + 5)
-    yl = legend_y - 3 if is_ground else legend_y - 2
-    ax.set_ylim(min(yl, scale_y - 2.5), title_y + 2)
-    ax.set_aspect('equal')
-    ax.axis('off')
+    # ── Title ──
+    cv.text(plot_w / 2, title_y, title, 14, 'white', bold=True)
+    cv.text(plot_w / 2, title_y - 1.5,
+            f"Floor Area: {round(floor_area)} sq.ft  |  {len(rooms)} Rooms  |  "
+            f"Plot: {round(plot_w, 1)}' × {round(plot_h, 1)}'", 9, '#9ca3af')
+
+    return cv.tostring()
+
+def floor_geometry(placed):
+    """Room rectangles (feet, origin at the plot's outer bottom-left) for client-side drawing."""
+    return [{'name': name, 'type': ROOM_TYPES[t], 'zone': ZONES[z], 'x': x, 'y': y, 'w': w, 'h': h}
+            for name, (x, y, w, h, t, z) in zip(placed.room_names(), placed.rows())]
+
+# ═══════════════════════════════════════════════════════════════════════════════
+# RENDER CACHE  (per-floor PNGs keyed on the normalised blueprint spec)
+# ═══════════════════════════════════════════════════════════════════════════════
+
+# Bump when layout or drawing code changes so cached/spilled PNGs are not reused.
+RENDER_VERSION = 4
+
+class RenderCache:
+    """
+    Thread-safe LRU of PNG bytes bounded by total size. Entries evicted from
+    memory are spilled to `spill_dir` (when set) and promoted back on a hit.
+    """
+
+    def __init__(self, max_bytes, spill_dir=None):
+        self.max_bytes = max_bytes
+        self.spill_dir = spill_dir
+        self._items = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+        self.hits = self.disk_hits = self.misses = self.evictions = 0
+        if spill_dir:
+            os.makedirs(spill_dir, exist_ok=True)
+
+    def _spill_path(self, key):
+        return os.path.join(self.spill_dir, f"{key}.png")
+
+    def get(self, key):
+        with self._lock:
+            data = self._items.get(key)
+            if data is not None:
+                self._items.move_to_end(key)
+                self.hits += 1
+                return data
+        if self.spill_dir:
+            try:
+                with open(self._spill_path(key), 'rb') as f:
+                    data = f.read()
+            except OSError:
+                data = None
+            if data is not None:
+                with self._lock:
+                    self.disk_hits += 1
+                self.put(key, data, spill=False)
+                return data
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(self, key, data, spill=True):
+        if len(data) > self.max_bytes:
+            return
+        evicted = []
+        with self._lock:
+            old = self._items.pop(key, None)
+            if old is not None:
+                self._size -= len(old)
+            self._items[key] = data
+            self._size += len(data)
+            while self._size > self.max_bytes:
+                k, v = self._items.popitem(last=False)
+                self._size -= len(v)
+                self.evictions += 1
+                evicted.append((k, v))
+        if self.spill_dir and spill:
+            for k, v in evicted:
+                path = self._spill_path(k)
+                if not os.path.exists(path):
+                    tmp = f"{path}.{os.getpid()}.tmp"
+                    try:
+                        with open(tmp, 'wb') as f:
+                            f.write(v)
+                        os.replace(tmp, path)
+                    except OSError:
+                        pass
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.disk_hits + self.misses
+            return {'entries': len(self._items), 'bytes': self._size,
+                    'maxBytes': self.max_bytes, 'hits': self.hits,
+                    'diskHits': self.disk_hits, 'misses': self.misses,
+                    'evictions': self.evictions,
+                    'hitRate': round((self.hits + self.disk_hits) / lookups, 4) if lookups else 0.0}
+
+def blueprint_cache_key(spec, floor_index):
+    """Stable key for one floor of a normalised blueprint spec tuple."""
+    blob = json.dumps([RENDER_VERSION, spec, floor_index], separators=(',', ':'))
+    return hashlib.sha256(blob.encode('utf-8')).hexdigest()
+
+_cache_mb = float(os.environ.get('AIML_BLUEPRINT_CACHE_MB', 64))
+BLUEPRINT_CACHE = (RenderCache(int(_cache_mb * 1024 * 1024),
+                               os.environ.get('AIML_BLUEPRINT_CACHE_DIR') or None)
+                   if _cache_mb > 0 else None)
+
+
+# ═══════════════════════════════════════════════════════════════════════════════
+# IMAGE STORE  (content-addressed PNGs served by URL instead of base64-in-JSON)
+# ═══════════════════════════════════════════════════════════════════════════════
 
-    buf = io.BytesIO()
-    fig.savefig(buf, format='png', dpi=150, bbox_inches='tight',
-                facecolor=BG_DARK, edgecolor='none')
-    plt.close(fig)
-    buf.seek(0)
-    return base64.b64encode(buf.read()).decode('utf-8')
+IMAGE_DIR = os.environ.get('AIML_IMAGE_DIR',
+                           os.path.join(tempfile.gettempdir(), 'buildease-blueprints'))
+IMAGE_TTL_SECONDS = float(os.environ.get('AIML_IMAGE_TTL_HOURS', 24 * 7)) * 3600
+IMAGE_URL_PREFIX = '/api/ai/blueprint/image/'
+_DIGEST_RE = re.compile(r'^[0-9a-f]{64}$')
+_last_prune = 0.0
+
+def _image_path(digest):
+    return os.path.join(IMAGE_DIR, digest[:2], f"{digest}.png")
+
+def store_image(png):
+    """Write `png` under its SHA-256 (once) and return the digest."""
+    digest = hashlib.sha256(png).hexdigest()
+    path = _image_path(digest)
+    if os.path.exists(path):
+        os.utime(path)              # keep recently served images out of pruning
+    else:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, 'wb') as f:
+            f.write(png)
+        os.replace(tmp, path)
+    _maybe_prune_images()
+    return digest
+
+def image_url(digest):
+    return f"{IMAGE_URL_PREFIX}{digest}.png"
+
+def _maybe_prune_images():
+    """Delete images untouched for IMAGE_TTL_SECONDS, at most once an hour."""
+    global _last_prune
+    now = time.time()
+    if IMAGE_TTL_SECONDS <= 0 or now - _last_prune < 3600:
+        return
+    _last_prune = now
+    for root, _, files in os.walk(IMAGE_DIR):
+        for name in files:
+            path = os.path.join(root, name)
+            try:
+                if now - os.stat(path).st_mtime > IMAGE_TTL_SECONDS:
+                    os.remove(path)
+            except OSError:
+                pass
+
+# ═══════════════════════════════════════════════════════════════════════════════
+# RENDER POOL  (floors of one request drawn in parallel worker processes)
+# ═══════════════════════════════════════════════════════════════════════════════
+
+_cpus = os.cpu_count() or 1
+RENDER_PROCESSES = int(os.environ.get('AIML_RENDER_PROCESSES', min(3, _cpus) if _cpus > 1 else 0))
+RENDER_MAX_IN_FLIGHT = int(os.environ.get('AIML_RENDER_MAX_IN_FLIGHT', max(RENDER_PROCESSES, 1) * 2))
+
+def _warm_renderer():
+    """Pool initializer: pay the matplotlib import and font-cache cost up front."""
+    render_floor_png(Layout.empty(), 20.0, 26.0, '', 0)
+
+def _render_job(*job):
+    """Pool task: PNG bytes plus the stage timings measured in the worker."""
+    with collect_stages() as stages:
+        png = render_floor_png(*job)
+    return png, stages
+
+class RenderPool:
+    """
+    Per-worker pool of pre-warmed renderer processes. Processes are spawned
+    (not forked) on first use in the owning PID, so it is safe under
+    gunicorn, and a semaphore caps the renders in flight per worker.
+    With processes=0 everything renders inline.
+    """
+
+    def __init__(self, processes, max_in_flight):
+        self.processes = processes
+        self._slots = threading.BoundedSemaphore(max(max_in_flight, 1))
+        self._lock = threading.Lock()
+        self._executor = None
+        self._pid = None
+        self.in_flight = 0
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None or self._pid != os.getpid():
+                self._executor = ProcessPoolExecutor(
+                    self.processes, mp_context=multiprocessing.get_context('spawn'),
+                    initializer=_warm_renderer)
+                self._pid = os.getpid()
+            return self._executor
+
+    def start(self):
+        """Launch and warm the renderer processes without waiting for them."""
+        if self.processes > 0:
+            with self._lock:
+                started = self._executor is not None and self._pid == os.getpid()
+            if not started:
+                self._get_executor().submit(os.getpid)
+
+    def _reset(self):
+        with self._lock:
+            if self._executor is not None and self._pid == os.getpid():
+                self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def _track(self, n):
+        with self._lock:
+            self.in_flight += n
+
+    def render_many(self, jobs, on_done=None):
+        """
+        Render each render_floor_png argument tuple; results keep job order.
+        on_done(i), if given, is called as each job's PNG becomes available.
+        """
+        pngs = []
+        for png in self.render_iter(jobs):
+            pngs.append(png)
+            if on_done:
+                on_done(len(pngs) - 1)
+        return pngs
+
+    def render_iter(self, jobs):
+        """Yield each job's PNG in job order, as soon as it is ready."""
+        self._track(len(jobs))
+        try:
+            yield from self._render_iter(jobs)
+        finally:
+            self._track(-len(jobs))
+
+    def _render_iter(self, jobs):
+        done = 0
+        if self.processes > 0 and jobs:
+            futures = []
+            try:
+                executor = self._get_executor()
+                for job in jobs:
+                    self._slots.acquire()
+                    try:
+                        fut = executor.submit(_render_job, *job)
+                    except BaseException:
+                        self._slots.release()
+                        raise
+                    fut.add_done_callback(lambda _: self._slots.release())
+                    futures.append(fut)
+                for fut in futures:
+                    png, stages = fut.result()
+                    for name, seconds in stages.items():
+                        record_stage(name, seconds)
+                    yield png
+                    done += 1
+            except BrokenProcessPool:
+                # A renderer died (e.g. OOM-killed); rebuild next time, finish this one inline.
+                self._reset()
+            finally:
+                # Nothing left to wait for if the consumer stopped early
+                for fut in futures:
+                    fut.cancel()
+        for job in jobs[done:]:
+            yield render_floor_png(*job)
+
+    def shutdown(self):
+        self._reset()
+
+RENDER_POOL = RenderPool(RENDER_PROCESSES, RENDER_MAX_IN_FLIGHT)
+atexit.register(RENDER_POOL.shutdown)
+
+def render_floors(spec, jobs, floor_ids=None, on_done=None):
+    """
+    PNG bytes for each floor job, from the render cache or the render pool.
+    floor_ids (default: the job indices) identify each job's layout within
+    the spec for the cache key, e.g. [floor, variant] for layout candidates.
+    on_done(i) is called once per job as its PNG becomes available.
+    """
+    pngs = [None] * len(jobs)
+    for fi, png, _ in iter_floor_renders(spec, jobs, floor_ids):
+        pngs[fi] = png
+        if on_done:
+            on_done(fi)
+    return pngs
+
+def iter_floor_renders(spec, jobs, floor_ids=None, preview_dpi=None):
+    """
+    Yield (job index, PNG, final) as floors become available: cache hits
+    first, then renders in job order. With preview_dpi, every floor that
+    has to be rendered first gets a quick low-dpi preview (final=False);
+    the previews come before any full-resolution render.
+    """
+    if floor_ids is None:
+        floor_ids = range(len(jobs))
+    keys = [blueprint_cache_key(spec, fid) for fid in floor_ids]
+    todo = []
+    for fi, key in enumerate(keys):
+        png = BLUEPRINT_CACHE.get(key) if BLUEPRINT_CACHE else None
+        if png is None:
+            todo.append(fi)
+        else:
+            yield fi, png, True
+    previews = len(todo) if preview_dpi else 0
+    batch = [jobs[fi] + (preview_dpi,) for fi in todo[:previews]] + [jobs[fi] for fi in todo]
+    for i, png in enumerate(RENDER_POOL.render_iter(batch)):
+        final = i >= previews
+        fi = todo[i - previews if final else i]
+        if final and BLUEPRINT_CACHE:
+            BLUEPRINT_CACHE.put(keys[fi], png)
+        yield fi, png, final
+
+
+# ═══════════════════════════════════════════════════════════════════════════════
+# BACKGROUND JOBS
+# ═══════════════════════════════════════════════════════════════════════════════
+
+JOB_WORKERS = int(os.environ.get('AIML_JOB_WORKERS', 2))
+JOB_QUEUE = int(os.environ.get('AIML_JOB_QUEUE', 32))
+JOB_TTL_SECONDS = float(os.environ.get('AIML_JOB_TTL_SECONDS', 900))
+JOB_MAX_RETAINED = int(os.environ.get('AIML_JOB_MAX_RETAINED', 500))
+
+class JobQueue:
+    """
+    In-process background jobs: a per-worker thread pool with a bounded
+    backlog, plus a table of job states. Finished jobs are kept for `ttl`
+    seconds (and at most `max_retained` of them) so clients can collect the
+    result. Every state change bumps the job's version and wakes waiters.
+    """
+
+    def __init__(self, workers, max_queued, ttl, max_retained):
+        self.workers, self.max_queued = workers, max_queued
+        self.ttl, self.max_retained = ttl, max_retained
+        self._jobs = OrderedDict()
+        self._cond = threading.Condition()
+        self._executor = None
+        self._pid = None
+        self.pending = 0
+
+    def _get_executor(self):
+        if self._executor is None or self._pid != os.getpid():
+            self._executor = ThreadPoolExecutor(self.workers, thread_name_prefix='aiml-job')
+            self._pid = os.getpid()
+        return self._executor
+
+    def _evict(self, now):
+        finished = [(jid, job) for jid, job in self._jobs.items() if job['finished']]
+        excess = len(finished) - self.max_retained
+        for i, (jid, job) in enumerate(finished):
+            if i < excess or now - job['finished'] > self.ttl:
+                del self._jobs[jid]
+
+    def submit(self, fn, data):
+        """
+        Queue fn(data, progress) -> (body, status) and return the new job's
+        state, or None when the backlog is full.
+        """
+        with self._cond:
+            now = time.time()
+            self._evict(now)
+            if self.pending >= self.workers + self.max_queued:
+                return None
+            jid = uuid.uuid4().hex
+            self._jobs[jid] = {'id': jid, 'status': 'queued', 'version': 0,
+                               'progress': {'done': 0, 'total': None},
+                               'created': now, 'finished': None,
+                               'httpStatus': None, 'result': None}
+            self.pending += 1
+            self._get_executor().submit(self._run, jid, fn, data)
+            return dict(self._jobs[jid])
+
+    def _update(self, jid, **fields):
+        with self._cond:
+            job = self._jobs.get(jid)
+            if job is not None:
+                job.update(fields)
+                job['version'] += 1
+                self._cond.notify_all()
+
+    def _run(self, jid, fn, data):
+        self._update(jid, status='running')
+        t0 = time.perf_counter()
+        try:
+            with collect_stages() as stages:
+                body, status = fn(data, lambda done, total: self._update(
+                    jid, progress={'done': done, 'total': total}))
+            for name, secs in stages.items():
+                STAGE_SECONDS.observe(secs, JOB_ROUTE, name)
+        except Exception as e:
+            print(f"Blueprint job {jid} failed: {e!r}")
+            body, status = {'message': 'Internal server error'}, 500
+        JOB_SECONDS.observe(time.perf_counter() - t0, str(status))
+        with self._cond:
+            self.pending -= 1
+        self._update(jid, status='done' if status == 200 else 'failed', httpStatus=status,
+                     result=body, finished=time.time())
+
+    def get(self, jid):
+        with self._cond:
+            job = self._jobs.get(jid)
+            return dict(job) if job is not None else None
+
+    def wait(self, jid, version, timeout):
+        """The job's state once its version passes `version` (or after `timeout`)."""
+        def changed():
+            job = self._jobs.get(jid)
+            return job is None or job['version'] > version
+        with self._cond:
+            self._cond.wait_for(changed, timeout)
+            job = self._jobs.get(jid)
+            return dict(job) if job is not None else None
+
+    def counts(self):
+        with self._cond:
+            counts = {'queued': 0, 'running': 0, 'done': 0, 'failed': 0}
+            for job in self._jobs.values():
+                counts[job['status']] += 1
+            return counts
+
+    def shutdown(self):
+        if self._executor is not None and self._pid == os.getpid():
+            self._executor.shutdown(wait=False, cancel_futures=True)
+        self._executor = None
+
+JOB_ROUTE = '/api/ai/blueprint/jobs'
+JOB_SECONDS = Histogram('aiml_blueprint_job_duration_seconds',
+                        'Background blueprint job run time (excluding queueing) by status.',
+                        ('status',))
+METRIC_COLLECTORS.append(JOB_SECONDS.collect)
+BLUEPRINT_JOBS = JobQueue(JOB_WORKERS, JOB_QUEUE, JOB_TTL_SECONDS, JOB_MAX_RETAINED)
 
 
 # ═══════════════════════════════════════════════════════════════════════════════
 # API ROUTES
 # ═══════════════════════════════════════════════════════════════════════════════
 
-@app.route('/health', methods=['GET'])
-def health():
-    return jsonify({'status': 'ok', 'service': 'Buildease AI/ML Engine'})
+@app.before_request
+def _check_role():
+    if not serves(request.path):
+        return jsonify({'message': f"Not served by this worker (AIML_ROLE={SERVICE_ROLE})"}), 404
 
+def start_background_tasks():
+    """Rates watcher, plus the renderer processes for roles that render."""
+    start_rates_watcher()
+    if RENDERS:
+        RENDER_POOL.start()
 
-@app.route('/api/ai/blueprint', methods=['POST'])
-def blueprint_endpoint():
+@app.before_request
+def _start_background_tasks():
+    # Threads and processes do not survive gunicorn's fork, so start them in the worker.
+    start_background_tasks()
+
+
+# ── Request validation ──
+# Bad request fields raise ValueError with a client-facing message naming
+# the field; handlers turn it into a 400.
+
+def _request_object():
+    """The JSON request body as a dict ({} when empty); 400s any other JSON, as asgi.py does."""
     data = request.json or {}
+    if not isinstance(data, dict):
+        resp = jsonify({'message': 'Request body must be a JSON object'})
+        resp.status_code = 400
+        abort(resp)
+    return data
+
+def _positive_int(data, name, default):
+    try:
+        value = int(data.get(name, default))
+    except (TypeError, ValueError):
+        value = 0
+    if value <= 0:
+        raise ValueError(f"'{name}' must be a positive integer")
+    return value
+
+def _number(data, name, default):
+    try:
+        value = float(data.get(name, default))
+    except (TypeError, ValueError):
+        value = math.nan
+    if not math.isfinite(value):
+        raise ValueError(f"'{name}' must be a number")
+    return value
+
+def _quality(data, idx):
+    quality = data.get('quality', 'mid')
+    if not isinstance(quality, str) or quality not in idx.quality_idx:
+        raise ValueError(f"'quality' must be one of "
+                         f"{sorted(idx.quality_idx, key=idx.quality_idx.get)}")
+    return quality
+
+def _city(data, idx):
+    city = data.get('city', 'bangalore')
+    if not isinstance(city, str) or city not in idx.city_idx:
+        raise ValueError(f"'city' must be one of {list(idx.cities)}")
+    return city
+
+def _materials(data):
+    materials = data.get('materials', 'indian')
+    if not isinstance(materials, str) or materials not in GRID_MATERIALS:
+        raise ValueError(f"'materials' must be one of {list(GRID_MATERIALS)}")
+    return materials
+
+
+# ── Request metrics ──
+
+_in_flight = {}
+_in_flight_lock = threading.Lock()
+
+def track_in_flight(route, n):
+    with _in_flight_lock:
+        _in_flight[route] = _in_flight.get(route, 0) + n
+
+@app.before_request
+def _begin_request_metrics():
+    g.metrics_t0 = time.perf_counter()
+    g.metrics_route = request.url_rule.rule if request.url_rule else 'unmatched'
+    g.stages = _stage_local.stages = {}
+    track_in_flight(g.metrics_route, 1)
+    if PROFILER.enabled:
+        PROFILER.begin()
+
+def observe_request(route, method, status, seconds, stages):
+    """Record one finished request; return its Server-Timing header value (or None)."""
+    REQUEST_SECONDS.observe(seconds, route, method, str(status))
+    for name, secs in stages.items():
+        STAGE_SECONDS.observe(secs, route, name)
+    if stages:
+        return ', '.join(f'{name};dur={secs * 1000:.1f}' for name, secs in stages.items())
+    return None
+
+def _stream_with_stages(chunks, stages):
+    """
+    A streamed body that times its stages into `stages`, whichever thread
+    pulls each chunk; closing it closes the wrapped body.
+    """
+    it = iter(chunks)
+    try:
+        while True:
+            prev = getattr(_stage_local, 'stages', None)
+            _stage_local.stages = stages
+            try:
+                chunk = next(it, it)
+            finally:
+                _stage_local.stages = prev
+            if chunk is it:
+                return
+            yield chunk
+    finally:
+        if hasattr(it, 'close'):
+            it.close()
+
+def _finish_streamed_request(route, method, status, t0, stages):
+    observe_request(route, method, status, time.perf_counter() - t0, stages)
+    track_in_flight(route, -1)
+
+@app.after_request
+def _record_request_metrics(resp):
+    route = g.get('metrics_route')
+    if route is None:
+        return resp
+    if resp.is_streamed and not resp.direct_passthrough:
+        # NDJSON / SSE bodies are produced after the view returns: observe the
+        # request and leave in-flight once the body is done or the client leaves.
+        # send_file bodies are passed through untouched (so call_on_close would
+        # never fire, and wsgi.file_wrapper still applies): those finish here
+        resp.response = _stream_with_stages(resp.response, g.stages)
+        resp.call_on_close(partial(_finish_streamed_request, route, request.method,
+                                   resp.status_code, g.metrics_t0, g.stages))
+        g.metrics_observed = g.metrics_deferred = True
+        return resp
+    timing = observe_request(route, request.method, resp.status_code,
+                             time.perf_counter() - g.metrics_t0, g.stages)
+    g.metrics_observed = True
+    if timing:
+        resp.headers['Server-Timing'] = timing
+    return resp
+
+@app.teardown_request
+def _end_request_metrics(exc):
+    route = g.pop('metrics_route', None)
+    if route is None:
+        return
+    seconds = time.perf_counter() - g.metrics_t0
+    if not g.get('metrics_observed'):      # unhandled exception: after_request was skipped
+        REQUEST_SECONDS.observe(seconds, route, request.method, '500')
+    _stage_local.stages = None
+    if not g.get('metrics_deferred'):
+        track_in_flight(route, -1)
+    if PROFILER.enabled:                   # streamed bodies: profiles cover the view only
+        PROFILER.end(route, seconds)
+
+def _state_metrics():
+    """Gauges and counters read from state owned elsewhere at scrape time."""
+    with _in_flight_lock:
+        flying = sorted(_in_flight.items())
+    yield from _metric_family('aiml_requests_in_flight', 'Requests currently being handled.',
+                              'gauge', ((('route',), (r,), n) for r, n in flying))
+    yield from _metric_family('aiml_render_in_flight',
+                              'Floor renders queued or running in the render pool.', 'gauge',
+                              [((), (), RENDER_POOL.in_flight)])
+    yield from _metric_family('aiml_render_processes', 'Configured renderer processes.',
+                              'gauge', [((), (), RENDER_POOL.processes)])
+    yield from _metric_family('aiml_blueprint_jobs', 'Retained blueprint jobs by status.',
+                              'gauge', ((('status',), (k,), n)
+                                        for k, n in BLUEPRINT_JOBS.counts().items()))
+    if BLUEPRINT_CACHE:
+        st = BLUEPRINT_CACHE.stats()
+        yield from _metric_family('aiml_blueprint_cache_lookups_total',
+                                  'Blueprint render cache lookups by result.', 'counter',
+                                  [(('result',), ('hit',), st['hits']),
+                                   (('result',), ('disk_hit',), st['diskHits']),
+                                   (('result',), ('miss',), st['misses'])])
+        yield from _metric_family('aiml_blueprint_cache_hit_ratio',
+                                  'Fraction of lookups served from memory or disk.', 'gauge',
+                                  [((), (), st['hitRate'])])
+        yield from _metric_family('aiml_blueprint_cache_evictions_total',
+                                  'Entries evicted from the in-memory cache.', 'counter',
+                                  [((), (), st['evictions'])])
+        yield from _metric_family('aiml_blueprint_cache_bytes', 'Bytes held in memory.',
+                                  'gauge', [((), (), st['bytes'])])
+        yield from _metric_family('aiml_blueprint_cache_entries', 'Entries held in memory.',
+                                  'gauge', [((), (), st['entries'])])
+    yield from _metric_family('aiml_startup_seconds',
+                              f'Import and first model load time (role {SERVICE_ROLE}).', 'gauge',
+                              [(('phase',), (phase,), secs)
+                               for phase, secs in (('import', STARTUP['importSeconds']),
+                                                   ('model_load', STARTUP['modelLoadSeconds']))
+                               if secs is not None])
+    snap = _active
+    yield from _metric_family(
+        'aiml_model_info', 'Cost model and rate tables being served.', 'gauge',
+        [(('model_version', 'rates_version', 'model_key', 'evaluator', 'loaded'),
+          (MODEL_VERSION, snap.rates.version, model_key(snap.rates),
+           type(snap.evaluator).__name__ if snap.evaluator is not None else '',
+           'true' if snap.grid is not None else 'false'), 1)])
+
+METRIC_COLLECTORS.append(_state_metrics)
+
+
+@app.route('/metrics', methods=['GET'])
+def metrics_endpoint():
+    return Response(render_metrics(), mimetype='text/plain; version=0.0.4')
+
+
+def health_payload():
+    return {'status': 'ok', 'service': 'Buildease AI/ML Engine',
+            'ratesVersion': rate_tables().version,
+            'blueprintCache': BLUEPRINT_CACHE.stats() if BLUEPRINT_CACHE else None,
+            'startup': startup_report()}
 
-    total_area  = int(data.get('area', 1200))
-    beds        = int(data.get('bedrooms', 3))
-    baths       = int(data.get('bathrooms', 2))
-    floors      = int(data.get('floors', 1))
-    style       = data.get('style', 'modern')
-    has_garage  = bool(data.get('garage', False))
-    has_balcony = bool(data.get('balcony', True))
-    extra_text  = data.get('extraFeatures', '')
+@app.route('/health', methods=['GET'])
+def health():
+    return jsonify(health_payload())
+
+
+BLUEPRINT_FORMATS = ('png', 'svg', 'json')
+
+PREVIEW_DPI = int(os.environ.get('AIML_PREVIEW_DPI', 40))
+
+def _png_field(png, delivery):
+    """A floor PNG as an image URL or inline base64, per the delivery mode."""
+    if delivery == 'url':
+        with stage('store'):
+            return {'imageUrl': image_url(store_image(png))}
+    with stage('encode'):
+        return {'image': base64.b64encode(png).decode('utf-8')}
+
+def _floor_payload(fs, placed, image, fmt, delivery):
+    """One floor of the blueprint response: room list plus the image in the requested form."""
+    # Build room list for frontend (exclude corridor)
+    room_list = [{'name': name, 'width': w, 'length': h, 'area': area, 'type': ROOM_TYPES[t]}
+                 for name, t, (w, h, area) in zip(placed.room_names(),
+                                                  placed.rooms['type'].tolist(), placed.dims())
+                 if t != _CORRIDOR]
+
+    floor = {'label': fs['label'], 'rooms': room_list, 'area': round(fs['area'])}
+    if fmt == 'png':
+        floor.update(_png_field(image, delivery))
+    elif fmt == 'svg':
+        floor['svg'] = image
+    else:
+        floor['geometry'] = floor_geometry(placed)
+    return floor
+
+def blueprint_request(data):
+    """
+    Validated, normalised fields of a blueprint request body. Raises
+    ValueError with a client-facing message naming the first bad field.
+    """
+    req = {
+        'total_area':  _positive_int(data, 'area', 1200),
+        'beds':        _positive_int(data, 'bedrooms', 3),
+        'baths':       _positive_int(data, 'bathrooms', 2),
+        'floors':      _positive_int(data, 'floors', 1),
+        'style':       data.get('style', 'modern'),
+        'has_garage':  bool(data.get('garage', False)),
+        'has_balcony': bool(data.get('balcony', True)),
+        'extra_text':  data.get('extraFeatures', '') or '',
+        'fmt':         str(data.get('format', 'png')).lower(),
+        'delivery':    str(data.get('delivery', 'url')).lower(),
+    }
+    if not isinstance(req['style'], str):
+        raise ValueError("'style' must be a string")
+    if not isinstance(req['extra_text'], str):
+        raise ValueError("'extraFeatures' must be a string")
+    if req['fmt'] not in BLUEPRINT_FORMATS:
+        raise ValueError(f"format must be one of {', '.join(BLUEPRINT_FORMATS)}")
+    if req['delivery'] not in ('url', 'inline'):
+        raise ValueError("delivery must be 'url' or 'inline'")
+    if req['total_area'] > MAX_AREA:
+        raise ValueError(f"area must be between 1 and {MAX_AREA}")
+    if req['beds'] > MAX_BEDROOMS:
+        raise ValueError(f"bedrooms must be between 1 and {MAX_BEDROOMS}")
+    if req['baths'] > MAX_BATHROOMS:
+        raise ValueError(f"bathrooms must be between 1 and {MAX_BATHROOMS}")
+    if req['floors'] > MAX_FLOORS:
+        raise ValueError(f"floors must be between 1 and {MAX_FLOORS}")
+    if req['floors'] > max(3, req['beds'] + req['baths']):
+        # a middle floor would hold nothing but the staircase
+        raise ValueError("floors above 3 must be at most bedrooms + bathrooms")
+    n_candidates = req['n_candidates'] = _positive_int(data, 'candidates', 1)
+    n_top = req['n_top'] = _positive_int(data, 'top', min(3, n_candidates))
+    if n_candidates > MAX_CANDIDATES:
+        raise ValueError(f"candidates must be between 1 and {MAX_CANDIDATES}")
+    if n_top > min(n_candidates, MAX_TOP_CANDIDATES):
+        raise ValueError(f"top must be between 1 and min(candidates, {MAX_TOP_CANDIDATES})")
+    return req
+
+def blueprint_plan(req):
+    """
+    Lay out every floor of a validated request (of every alternative when
+    candidates > 1); everything short of rendering.
+    """
+    total_area, beds, baths, floors = (req['total_area'], req['beds'], req['baths'],
+                                       req['floors'])
+    style, has_garage, has_balcony = req['style'], req['has_garage'], req['has_balcony']
+    fmt, delivery = req['fmt'], req['delivery']
+    n_candidates, n_top = req['n_candidates'], req['n_top']
 
-    extras = parse_extra_features(extra_text)
+    with stage('parse'):
+        extras = parse_extra_features(req['extra_text'])
 
     # Plot dimensions (per floor)
     per_floor = total_area / floors
@@ -599,50 +2944,46 @@ def blueprint_endpoint():
     plot_w = math.sqrt(per_floor / aspect)
     plot_h = per_floor / plot_w
 
-    # Build specs & generate each floor
+    # The rendered floors are a pure function of this normalised spec
+    spec = (total_area, beds, baths, floors, style.title(), has_garage, has_balcony,
+            [(e['name'], e['type']) for e in extras])
+
+    # Build specs & lay out each floor; with candidates > 1 every floor is
+    # ranked independently and alternative c takes each floor's c-th best
     floor_specs = build_floor_specs(total_area, beds, baths, floors,
                                      has_garage, has_balcony, extras)
-    floors_out = []
-    for fi, fs in enumerate(floor_specs):
-        placed = position_rooms(fs['room_specs'], plot_w, plot_h)
-
-        bhk = f"{beds}BHK" if beds <= 5 else f"{beds} Bed"
-        title = f"{bhk} {style.title()} Home  –  {fs['label']}"
-
-        image_b64 = draw_floor_plan(
-            placed, plot_w, plot_h, title, fs['area'],
-            is_ground=(fi == 0),
-            is_top_floor=(fi == len(floor_specs) - 1 and floors > 1),
-        )
-
-        # Build room list for frontend (exclude corridor)
-        room_list = []
-        for r in placed:
-            if r['type'] == 'corridor':
-                continue
-            rw = round(r['w'], 1)
-            rh = round(r['h'], 1)
-            room_list.append({
-                'name': r['name'],
-                'width': rw,
-                'length': rh,
-                'area': round(rw * rh),
-                'type': r['type'],
-            })
-
-        floors_out.append({
-            'label': fs['label'],
-            'image': image_b64,
-            'rooms': room_list,
-            'area': round(fs['area']),
-        })
+    bhk = f"{beds}BHK" if beds <= 5 else f"{beds} Bed"
+    if n_candidates > 1:
+        ranked = [rank_layouts(fs['room_specs'], plot_w, plot_h, n_candidates, n_top)
+                  for fs in floor_specs]
+    else:
+        with stage('layout'):
+            ranked = [[(0, position_rooms(fs['room_specs'], plot_w, plot_h), None, None)]
+                      for fs in floor_specs]
+    n_alt = max(len(r) for r in ranked)
+
+    # Jobs are render_floor_png arguments, alternative-major: job c * floors + fi
+    alternatives, jobs, floor_ids, scores = [], [], [], []
+    for c in range(n_alt):
+        picks = [r[min(c, len(r) - 1)] for r in ranked]
+        alternatives.append([placed for _, placed, _, _ in picks])
+        for fi, (fs, (variant, placed, _, _)) in enumerate(zip(floor_specs, picks)):
+            title = f"{bhk} {style.title()} Home  –  {fs['label']}"
+            jobs.append((placed, plot_w, plot_h, title, fs['area'],
+                         fi == 0, fi == len(floor_specs) - 1 and floors > 1))
+            floor_ids.append([fi, variant] if variant else fi)
+        if n_candidates > 1:
+            scores.append({'score': round(sum(p[2] for p in picks) / floors, 4),
+                           'metrics': {m: round(sum(p[3][m] for p in picks) / floors, 3)
+                                       for m in picks[0][3]}})
 
     config = f"{beds}BHK + {baths} Bath"
     if has_garage: config += " + Garage"
     if has_balcony: config += " + Balcony"
 
-    return jsonify({
-        'floors': floors_out,
+    header = {
+        'format': fmt,
+        'wallThickness': WALL,
         'config': config,
         'style': style.title(),
         'totalArea': total_area,
@@ -650,28 +2991,240 @@ def blueprint_endpoint():
         'plotWidth': round(plot_w, 1),
         'plotDepth': round(plot_h, 1),
         'extraFeatures': [e['name'] for e in extras],
-    })
+    }
+    if n_candidates > 1:
+        header['candidatesScored'] = n_candidates
+    return {'fmt': fmt, 'delivery': delivery, 'spec': spec, 'header': header,
+            'floor_specs': floor_specs, 'alternatives': alternatives, 'scores': scores,
+            'jobs': jobs, 'floor_ids': floor_ids}
+
+def blueprint_payload(data, progress=None):
+    """
+    Blueprint response body and status for a request body dict.
+    progress(done, total), if given, is called as each floor image is ready.
+    """
+    try:
+        req = blueprint_request(data)
+    except ValueError as e:
+        return {'message': str(e)}, 400
+    plan = blueprint_plan(req)
+    fmt, jobs, floor_specs = plan['fmt'], plan['jobs'], plan['floor_specs']
+
+    done = 0
+    def floor_done(_):
+        nonlocal done
+        done += 1
+        progress(done, len(jobs))
+    on_done = floor_done if progress else None
+
+    # Render all floors (PNG: cached or in parallel; SVG: direct, no matplotlib)
+    with stage('render'):
+        if fmt == 'png':
+            images = render_floors(plan['spec'], jobs, plan['floor_ids'], on_done)
+        else:
+            images = []
+            for job in jobs:
+                images.append(render_floor_svg(*job) if fmt == 'svg' else None)
+                if on_done:
+                    on_done(len(images) - 1)
+
+    floors = len(floor_specs)
+    results = []
+    for c, placed_floors in enumerate(plan['alternatives']):
+        result = {'floors': [_floor_payload(fs, placed, images[c * floors + fi], fmt, plan['delivery'])
+                             for fi, (fs, placed) in enumerate(zip(floor_specs, placed_floors))]}
+        if plan['scores']:
+            result.update(plan['scores'][c])
+        results.append(result)
+
+    body = {**plan['header'], **results[0]}
+    if plan['scores']:
+        body['alternatives'] = results[1:]
+    return body, 200
+
+def blueprint_lines(plan, preview=False):
+    """
+    NDJSON for a streamed blueprint: a 'blueprint' header line, one 'floor'
+    line per floor as soon as its image is ready, then 'done'. With preview
+    (PNG only), a low-dpi 'preview' line for every floor not already cached
+    comes first. Floor lines carry their alternative and floor index, since
+    cached floors can arrive ahead of rendered ones.
+    """
+    fmt, jobs, floor_specs = plan['fmt'], plan['jobs'], plan['floor_specs']
+    floors = len(floor_specs)
+
+    def line(obj):
+        return app.json.dumps(obj, separators=(',', ':')) + '\n'
+
+    header = {'event': 'blueprint', **plan['header'], 'floorCount': floors,
+              'alternativeCount': len(plan['alternatives'])}
+    if plan['scores']:
+        header['scores'] = plan['scores']
+    yield line(header)
+
+    if fmt == 'png':
+        images = iter_floor_renders(plan['spec'], jobs, plan['floor_ids'],
+                                    PREVIEW_DPI if preview else None)
+    else:
+        images = ((j, render_floor_svg(*job) if fmt == 'svg' else None, True)
+                  for j, job in enumerate(jobs))
+    for j, image, final in images:
+        c, fi = divmod(j, floors)
+        fs = floor_specs[fi]
+        where = {'alternative': c, 'floor': fi}
+        if final:
+            placed = plan['alternatives'][c][fi]
+            yield line({'event': 'floor', **where,
+                        **_floor_payload(fs, placed, image, fmt, plan['delivery'])})
+        else:
+            yield line({'event': 'preview', **where, 'label': fs['label'],
+                        **_png_field(image, plan['delivery'])})
+    yield line({'event': 'done', 'floors': len(jobs)})
 
 
-@app.route('/api/ai/estimate', methods=['POST'])
-def estimate_endpoint():
-    data = request.json or {}
-    city      = data.get('city', 'bangalore')
-    area      = int(data.get('area', 1200))
-    quality   = data.get('quality', 'mid')
-    materials = data.get('materials', 'indian')
-    floors    = int(data.get('floors', 1))
+@app.route('/api/ai/blueprint', methods=['POST'])
+def blueprint_endpoint():
+    """
+    Blueprint floors for a house spec. With "stream": true the response is
+    NDJSON (see blueprint_lines), one line per floor as it is rendered;
+    "preview": true adds quick low-dpi PNG previews ahead of the full images.
+    """
+    data = _request_object()
+    if not data.get('stream'):
+        body, status = blueprint_payload(data)
+        with stage('serialize'):
+            return jsonify(body), status
+    try:
+        req = blueprint_request(data)
+    except ValueError as e:
+        return jsonify({'message': str(e)}), 400
+    resp = Response(blueprint_lines(blueprint_plan(req), bool(data.get('preview'))),
+                    mimetype='application/x-ndjson')
+    resp.headers['Cache-Control'] = 'no-cache'
+    resp.headers['X-Accel-Buffering'] = 'no'
+    return resp
+
+
+JOB_HEARTBEAT_SECONDS = 15
+JOB_RETRY_AFTER_SECONDS = 2
+
+def job_view(job):
+    """Public status of a blueprint job; the blueprint body once it has finished."""
+    view = {'jobId': job['id'], 'status': job['status'], 'progress': job['progress'],
+            'statusUrl': f"{JOB_ROUTE}/{job['id']}",
+            'eventsUrl': f"{JOB_ROUTE}/{job['id']}/events"}
+    if job['finished']:
+        view['httpStatus'] = job['httpStatus']
+        view['result'] = job['result']
+    return view
+
+def job_event(job):
+    """One server-sent event: `progress` while the job runs, then `done` or `failed`."""
+    kind = job['status'] if job['finished'] else 'progress'
+    data = app.json.dumps(job_view(job), separators=(',', ':'))
+    return f"event: {kind}\nid: {job['version']}\ndata: {data}\n\n"
+
+def blueprint_job_payload(data):
+    """
+    Queue a blueprint job; body and status (202, 400 for a body the
+    synchronous route would reject, or 429 when the backlog is full).
+    """
+    try:
+        blueprint_request(data)
+    except ValueError as e:
+        return {'message': str(e)}, 400
+    job = BLUEPRINT_JOBS.submit(blueprint_payload, data)
+    if job is None:
+        return {'message': 'Too many blueprint jobs queued, retry shortly'}, 429
+    return job_view(job), 202
+
+
+@app.route(JOB_ROUTE, methods=['POST'])
+def blueprint_job_endpoint():
+    """
+    Same body as /api/ai/blueprint, generated in the background. Poll
+    `statusUrl` or stream `eventsUrl` (SSE) for per-floor progress; the
+    finished job carries the blueprint response as `result`.
+    """
+    body, status = blueprint_job_payload(_request_object())
+    resp = jsonify(body)
+    resp.status_code = status
+    if status == 202:
+        resp.headers['Location'] = body['statusUrl']
+    elif status == 429:
+        resp.headers['Retry-After'] = str(JOB_RETRY_AFTER_SECONDS)
+    return resp
+
+
+@app.route(f'{JOB_ROUTE}/<job_id>', methods=['GET'])
+def blueprint_job_status_endpoint(job_id):
+    job = BLUEPRINT_JOBS.get(job_id)
+    if job is None:
+        return jsonify({'message': 'Job not found or expired'}), 404
+    return jsonify(job_view(job))
+
+
+@app.route(f'{JOB_ROUTE}/<job_id>/events', methods=['GET'])
+def blueprint_job_events_endpoint(job_id):
+    """
+    Progress as server-sent events until the job finishes. Holds a thread
+    per stream here; asgi.py serves this route without one.
+    """
+    job = BLUEPRINT_JOBS.get(job_id)
+    if job is None:
+        return jsonify({'message': 'Job not found or expired'}), 404
+
+    def stream(job):
+        yield job_event(job)
+        while not job['finished']:
+            nxt = BLUEPRINT_JOBS.wait(job['id'], job['version'], JOB_HEARTBEAT_SECONDS)
+            if nxt is None:
+                return
+            yield job_event(nxt) if nxt['version'] > job['version'] else ': keep-alive\n\n'
+            job = nxt
+
+    resp = Response(stream(job), mimetype='text/event-stream')
+    resp.headers['Cache-Control'] = 'no-cache'
+    resp.headers['X-Accel-Buffering'] = 'no'
+    return resp
+
+
+@app.route(f'{IMAGE_URL_PREFIX}<digest>.png', methods=['GET'])
+def blueprint_image_endpoint(digest):
+    if not _DIGEST_RE.match(digest):
+        abort(404)
+    path = _image_path(digest)
+    if not os.path.exists(path):
+        abort(404)
+    # Content-addressed, so the bytes behind a URL never change
+    resp = send_file(path, mimetype='image/png', etag=digest, max_age=31536000,
+                     conditional=True)
+    resp.headers['Cache-Control'] = 'public, max-age=31536000, immutable'
+    return resp
+
+
+MAX_BATCH_ITEMS = 1000
+
+def _estimate_inputs(data, idx):
+    """
+    Normalise one estimate request into (city, area, quality, materials,
+    floors); raises ValueError naming the first invalid field.
+    """
+    return (_city(data, idx), _positive_int(data, 'area', 1200),
+            _quality(data, idx), _materials(data), _positive_int(data, 'floors', 1))
 
-    ci = list(CITY_DATA.keys()).index(city) if city in CITY_DATA else 0
-    qi = QUALITY_MAP.get(quality, 1)
+def _feature_row(idx, city, area, quality, materials, floors):
+    ci = idx.city(city)
+    qi = idx.quality_idx.get(quality, 1)
     mi = 0 if materials == 'indian' else 1
+    return [ci, area, qi, mi, floors]
 
-    predicted = float(cost_model.predict(np.array([[ci, area, qi, mi, floors]]))[0])
-    predicted = round(predicted / 1000) * 1000
-
-    breakdown = {k: round(predicted * v) for k, v in COST_BREAKDOWN.items()}
-    info = CITY_DATA.get(city, CITY_DATA['bangalore'])[quality]
+def _interval(p10, p50, p90):
+    """Cost percentiles rounded to ₹1000 like the estimates themselves."""
+    return {'p10': round(p10 / 1000) * 1000, 'p50': round(p50 / 1000) * 1000,
+            'p90': round(p90 / 1000) * 1000}
 
+def _estimate_tips(city, area, quality, materials, floors, info):
     tips = []
     if materials == 'foreign' and quality != 'premium':
         tips.append("Foreign materials with non-premium finish may not be cost-effective.")
@@ -683,31 +3236,118 @@ def estimate_endpoint():
         tips.append(f"Premium in {city.title()} typically includes Italian marble, modular kitchen & smart home.")
     if not tips:
         tips.append(f"Current {quality} rate in {city.title()}: ₹{info['min']}–₹{info['max']}/sq.ft.")
+    return tips
+
+
+def estimate_payload(data):
+    """Estimate response body and status for a request body dict."""
+    with stage('model'):
+        snap = current_snapshot()
+    idx = snap.rates
+    try:
+        city, area, quality, materials, floors = _estimate_inputs(data, idx)
+    except ValueError as e:
+        return {'message': str(e)}, 400
+
+    row = _feature_row(idx, city, area, quality, materials, floors)
+    with stage('predict'):
+        predicted, p10, p50, p90, confidence = predict_interval(row, snap)
+    predicted = round(predicted / 1000) * 1000
+
+    breakdown = {k: round(predicted * v) for k, v in idx.cost_breakdown.items()}
+    info = idx.rate_info(city, quality)
 
-    return jsonify({
+    return {
         'estimatedCost': predicted,
         'ratePerSqFt': round(predicted / area),
         'breakdown': breakdown,
-        'confidence': 0.925,
+        'confidence': round(confidence, 3),
+        'interval': _interval(p10, p50, p90),
         'marketRange': {'low': area * info['min'], 'high': area * info['max']},
-        'tips': tips,
+        'tips': _estimate_tips(city, area, quality, materials, floors, info),
         'modelType': 'Polynomial Ridge Regression',
-    })
+    }, 200
 
 
-@app.route('/api/ai/quotation', methods=['POST'])
-def quotation_endpoint():
-    data = request.json or {}
-    city   = data.get('city', 'bangalore')
-    area   = int(data.get('area', 1200))
-    quality= data.get('quality', 'mid')
-    margin = float(data.get('margin', 15))
-    floors = int(data.get('floors', 1))
+@app.route('/api/ai/estimate', methods=['POST'])
+def estimate_endpoint():
+    body, status = estimate_payload(_request_object())
+    with stage('serialize'):
+        return jsonify(body), status
+
+
+def estimate_batch_payload(data):
+    """Batch estimate response body and status for a request body dict."""
+    items = data.get('items')
+    if not isinstance(items, list) or not items:
+        return {'message': "'items' must be a non-empty array"}, 400
+    if len(items) > MAX_BATCH_ITEMS:
+        return {'message': f"At most {MAX_BATCH_ITEMS} items per batch"}, 400
+
+    with stage('model'):
+        snap = current_snapshot()
+    idx = snap.rates
+    parsed = []
+    for i, it in enumerate(items):
+        if not isinstance(it, dict):
+            return {'message': f"items[{i}] is not a valid estimate request"}, 400
+        try:
+            parsed.append(_estimate_inputs(it, idx))
+        except ValueError as e:
+            return {'message': f"items[{i}]: {e}"}, 400
+
+    X = np.array([_feature_row(idx, *p) for p in parsed], dtype=float)
+    with stage('predict'):
+        est = snap.grid.predict(X)
+    predicted, p10, p50, p90 = np.rint(est[:, :4].T / 1000) * 1000
+    areas = X[:, 1]
+
+    rates = idx.rates[X[:, 0].astype(int), X[:, 2].astype(int)]
+    lo = rates[:, 0] * areas
+    hi = rates[:, 1] * areas
+    infos = [{'min': r[0], 'max': r[1]} for r in rates.tolist()]
+    parts = np.rint(predicted[:, None] * idx.shares).astype(int)
+
+    return {
+        'count': len(parsed),
+        'estimatedCost': predicted.astype(int).tolist(),
+        'ratePerSqFt': np.rint(predicted / areas).astype(int).tolist(),
+        'breakdown': {k: parts[:, j].tolist() for j, k in enumerate(idx.cost_breakdown)},
+        'marketRange': {'low': lo.astype(int).tolist(), 'high': hi.astype(int).tolist()},
+        'interval': {'p10': p10.astype(int).tolist(), 'p50': p50.astype(int).tolist(),
+                     'p90': p90.astype(int).tolist()},
+        'confidence': np.round(est[:, 4], 3).tolist(),
+        'tips': [_estimate_tips(*p, inf) for p, inf in zip(parsed, infos)],
+        'modelType': 'Polynomial Ridge Regression',
+    }, 200
 
-    ci = list(CITY_DATA.keys()).index(city) if city in CITY_DATA else 0
-    qi = QUALITY_MAP.get(quality, 1)
 
-    base = float(cost_model.predict(np.array([[ci, area, qi, 0, floors]]))[0])
+@app.route('/api/ai/estimate/batch', methods=['POST'])
+def estimate_batch_endpoint():
+    """
+    Score many configurations with a single model call.
+    Body: {"items": [{city, area, quality, materials, floors}, ...]}
+    Every per-item field in the response is an array aligned with `items`.
+    """
+    body, status = estimate_batch_payload(_request_object())
+    with stage('serialize'):
+        return jsonify(body), status
+
+
+def quotation_payload(data):
+    """Quotation response body and status for a request body dict."""
+    with stage('model'):
+        snap = current_snapshot()
+    try:
+        city, area, quality, _, floors = _estimate_inputs(data, snap.rates)
+        margin = _number(data, 'margin', 15)
+    except ValueError as e:
+        return {'message': str(e)}, 400
+    ci = snap.rates.city(city)
+    qi = snap.rates.quality_idx[quality]
+
+    with stage('predict'):
+        base = predict_cost([ci, area, qi, 0, floors], snap)
     base = round(base / 1000) * 1000
 
     labor  = round(base * 0.08)
@@ -735,28 +3375,36 @@ def quotation_endpoint():
         phases.append({'name': nm, 'duration': f"{dur} month{'s' if dur > 1 else ''}",
                        'cost': round(base * pct), 'percentage': round(pct * 100)})
 
-    return jsonify({
+    return {
         'baseCost': base, 'laborOverhead': labor, 'supervision': supv,
         'permits': permt, 'profit': profit, 'margin': margin,
         'totalQuote': total, 'timeline': f"{bm} months",
         'phases': phases, 'ratePerSqFt': round(total / area),
-    })
+    }, 200
 
 
-@app.route('/api/ai/prediction', methods=['POST'])
-def prediction_endpoint():
-    data = request.json or {}
-    city   = data.get('city', 'bangalore')
-    area   = int(data.get('area', 1200))
-    quality= data.get('quality', 'mid')
-    cont   = float(data.get('contingency', 15))
-    floors = int(data.get('floors', 1))
-
-    ci = list(CITY_DATA.keys()).index(city) if city in CITY_DATA else 0
-    qi = QUALITY_MAP.get(quality, 1)
-
-    b_in  = float(cost_model.predict(np.array([[ci, area, qi, 0, floors]]))[0])
-    b_fr  = float(cost_model.predict(np.array([[ci, area, qi, 1, floors]]))[0])
+@app.route('/api/ai/quotation', methods=['POST'])
+def quotation_endpoint():
+    body, status = quotation_payload(_request_object())
+    with stage('serialize'):
+        return jsonify(body), status
+
+
+def prediction_payload(data):
+    """Budget prediction response body and status for a request body dict."""
+    with stage('model'):
+        snap = current_snapshot()
+    try:
+        city, area, quality, _, floors = _estimate_inputs(data, snap.rates)
+        cont = _number(data, 'contingency', 15)
+    except ValueError as e:
+        return {'message': str(e)}, 400
+    ci = snap.rates.city(city)
+    qi = snap.rates.quality_idx[quality]
+
+    with stage('predict'):
+        b_in, p10, p50, p90, confidence = predict_interval([ci, area, qi, 0, floors], snap)
+        b_fr  = predict_cost([ci, area, qi, 1, floors], snap)
     base  = round(b_in / 1000) * 1000
     c_amt = round(base * (cont / 100))
     total = base + c_amt
@@ -776,27 +3424,274 @@ def prediction_endpoint():
     ind = round(b_in / 1000) * 1000
     frn = round(b_fr / 1000) * 1000
 
-    return jsonify({
+    return {
         'baseCost': base, 'contingency': cont, 'contingencyAmount': c_amt,
         'totalPrediction': total, 'ratePerSqFt': round(base / area),
         'categories': cats, 'monthlyCost': mc, 'estimatedMonths': months,
         'comparison': {'indian': ind, 'foreign': frn, 'savings': frn - ind},
-        'confidence': 0.893,
-    })
+        'interval': _interval(p10, p50, p90),
+        'confidence': round(confidence, 3),
+    }, 200
+
+
+@app.route('/api/ai/prediction', methods=['POST'])
+def prediction_endpoint():
+    body, status = prediction_payload(_request_object())
+    with stage('serialize'):
+        return jsonify(body), status
+
+
+# ── Scenario sweeps ──
+
+MAX_SWEEP_POINTS = 100_000
+MAX_SWEEP_AXIS = 2_000
+SWEEP_AXES = ('city', 'quality', 'materials', 'floors', 'area')
+SWEEP_ENCODINGS = ('base64', 'json', 'ndjson')
+_COST_CHANNELS = frozenset({'cost', 'p10', 'p50', 'p90'})
+
+def _whole(value):
+    """int(value) for whole numbers (or numeric strings of them); ValueError otherwise."""
+    number = float(value)
+    if not number.is_integer():
+        raise ValueError(value)
+    return int(number)
+
+def _sweep_axis(data, name, default, cast):
+    """Values for one axis from a scalar, an array, or {start, stop, step} (stop inclusive)."""
+    spec = data.get(name, default)
+    if isinstance(spec, dict):
+        try:
+            start, stop = float(spec['start']), float(spec['stop'])
+            step = float(spec.get('step', 1))
+        except (KeyError, TypeError, ValueError, OverflowError):
+            raise ValueError(f"'{name}' range needs numeric start and stop")
+        if (cast is str or not all(map(math.isfinite, (start, stop, step)))
+                or step <= 0 or stop < start):
+            raise ValueError(f"'{name}' is not a valid range")
+        if cast is _whole and not (start.is_integer() and step.is_integer()):
+            # truncating fractional points would repeat values
+            raise ValueError(f"'{name}' range needs whole-number start and step")
+        count = int((stop - start) / step + 1e-9) + 1
+        if count > MAX_SWEEP_AXIS:
+            raise ValueError(f"'{name}' has more than {MAX_SWEEP_AXIS} values")
+        spec = (start + step * np.arange(count)).tolist()
+    values = spec if isinstance(spec, list) else [spec]
+    if not values or len(values) > MAX_SWEEP_AXIS:
+        raise ValueError(f"'{name}' needs between 1 and {MAX_SWEEP_AXIS} values")
+    try:
+        return [cast(v) for v in values]
+    except (TypeError, ValueError, OverflowError):
+        raise ValueError(f"'{name}' has an invalid value")
+
+def sweep_surface(data, snap):
+    """
+    Parse a sweep request and evaluate its Cartesian grid in one grid.predict
+    call. Returns (axes, channels, values) with values shaped
+    (city, quality, materials, floors, area, channel); raises ValueError
+    with a client-facing message for bad input.
+    """
+    idx = snap.rates
+    qualities = sorted(idx.quality_idx, key=idx.quality_idx.get)
+    axes = {
+        'city':      _sweep_axis(data, 'city', 'bangalore', str),
+        'quality':   _sweep_axis(data, 'quality', qualities, str),
+        'materials': _sweep_axis(data, 'materials', list(GRID_MATERIALS), str),
+        'floors':    _sweep_axis(data, 'floors', 1, _whole),
+        'area':      _sweep_axis(data, 'area', 1200, _whole),
+    }
+    if any(c not in idx.city_idx for c in axes['city']):
+        raise ValueError(f"'city' must be among {list(idx.cities)}")
+    if any(q not in idx.quality_idx for q in axes['quality']):
+        raise ValueError(f"'quality' must be among {qualities}")
+    if any(m not in GRID_MATERIALS for m in axes['materials']):
+        raise ValueError(f"'materials' must be among {list(GRID_MATERIALS)}")
+    if min(axes['area']) <= 0 or min(axes['floors']) <= 0:
+        raise ValueError("'area' and 'floors' must be positive")
+    channels = data.get('channels', list(GRID_CHANNELS))
+    if not isinstance(channels, list) or not channels or any(c not in GRID_CHANNELS for c in channels):
+        raise ValueError(f"'channels' must be a non-empty subset of {list(GRID_CHANNELS)}")
+    shape = tuple(len(axes[a]) for a in SWEEP_AXES)
+    if math.prod(shape) > MAX_SWEEP_POINTS:
+        raise ValueError(f"Sweep has {math.prod(shape)} points; at most {MAX_SWEEP_POINTS} allowed")
+
+    codes = np.meshgrid([idx.city_idx[c] for c in axes['city']],
+                        [idx.quality_idx[q] for q in axes['quality']],
+                        [GRID_MATERIALS.index(m) for m in axes['materials']],
+                        axes['floors'], axes['area'], indexing='ij')
+    ci, qi, mi, fl, area = (c.reshape(-1) for c in codes)
+    est = snap.grid.predict(np.column_stack([ci, area, qi, mi, fl]).astype(float))
+    cols = [GRID_CHANNELS.index(c) for c in channels]
+    values = est[:, cols]
+    for j, c in enumerate(channels):
+        if c in _COST_CHANNELS:
+            values[:, j] = np.rint(values[:, j] / 1000) * 1000
+    return axes, channels, values.reshape(*shape, len(channels))
+
+def _sweep_header(axes, channels, values, encoding, tables):
+    return {
+        'order': list(SWEEP_AXES), 'axes': axes, 'shape': list(values.shape[:-1]),
+        'count': int(np.prod(values.shape[:-1])), 'channels': channels,
+        'encoding': encoding, 'ratesVersion': tables.version,
+        'modelType': 'Polynomial Ridge Regression',
+    }
+
+def _sweep_lines(header, values):
+    """NDJSON: the header, then one line per (city, quality, materials, floors) series over area."""
+    yield app.json.dumps(header, separators=(',', ':')) + '\n'
+    channels = header['channels']
+    series = values.reshape(-1, values.shape[-2], values.shape[-1])
+    keys = np.ndindex(*values.shape[:4])
+    for key, block in zip(keys, series):
+        line = {a: header['axes'][a][i] for a, i in zip(SWEEP_AXES, key)}
+        for j, c in enumerate(channels):
+            col = block[:, j]
+            line[c] = (col.astype(int) if c in _COST_CHANNELS else np.round(col, 3)).tolist()
+        yield app.json.dumps(line, separators=(',', ':')) + '\n'
+
+def sweep_payload(data):
+    """Sweep response body and status (base64 or JSON arrays) for a request body dict."""
+    encoding = data.get('encoding', 'base64')
+    if encoding not in ('base64', 'json'):
+        return {'message': f"'encoding' must be one of {list(SWEEP_ENCODINGS)}"}, 400
+    with stage('model'):
+        snap = current_snapshot()
+    try:
+        with stage('predict'):
+            axes, channels, values = sweep_surface(data, snap)
+    except ValueError as e:
+        return {'message': str(e)}, 400
+
+    body = _sweep_header(axes, channels, values, encoding, snap.rates)
+    flat = values.reshape(-1, len(channels))
+    if encoding == 'base64':
+        body['dtype'] = '<f4'
+        body['values'] = {c: base64.b64encode(flat[:, j].astype('<f4').tobytes()).decode('ascii')
+                          for j, c in enumerate(channels)}
+    else:
+        body['values'] = {c: (flat[:, j].astype(int) if c in _COST_CHANNELS
+                              else np.round(flat[:, j], 3)).tolist()
+                          for j, c in enumerate(channels)}
+    return body, 200
+
+
+@app.route('/api/ai/sweep', methods=['POST'])
+def sweep_endpoint():
+    """
+    Cost surface over a parameter grid in one call.
+    Body: {city, quality, materials, floors, area, channels?, encoding?} where
+    each axis is a value, an array, or (floors/area) {start, stop, step}.
+    Values are row-major over `order` per channel: little-endian float32 in
+    base64 (default), plain arrays with "json", or "ndjson" lines of one
+    series over area each.
+    """
+    data = _request_object()
+    if data.get('encoding') != 'ndjson':
+        body, status = sweep_payload(data)
+        with stage('serialize'):
+            return jsonify(body), status
+    with stage('model'):
+        snap = current_snapshot()
+    try:
+        with stage('predict'):
+            axes, channels, values = sweep_surface(data, snap)
+    except ValueError as e:
+        return jsonify({'message': str(e)}), 400
+    header = _sweep_header(axes, channels, values, 'ndjson', snap.rates)
+    return Response(_sweep_lines(header, values), mimetype='application/x-ndjson')
 
 
 @app.route('/api/ai/market-rates', methods=['GET'])
 def market_rates_endpoint():
-    rates = {}
-    for city, info in CITY_DATA.items():
-        rates[city] = {'basic': info['basic']['avg'], 'mid': info['mid']['avg'],
-                       'premium': info['premium']['avg'],
-                       'appreciation': info['land_appreciation']}
-    return jsonify(rates)
-
+    idx = rate_tables()
+    if idx.market_rates_etag in request.if_none_match:
+        resp = Response(status=304)
+    else:
+        resp = Response(idx.market_rates_body, mimetype='application/json')
+    resp.set_etag(idx.market_rates_etag)
+    resp.headers['Cache-Control'] = 'public, max-age=60'
+    return resp
+
+
+GRID_URL_PREFIX = '/api/ai/estimate-grid/'
+
+def _grid_key(tables):
+    return f"v{MODEL_VERSION}-{model_key(tables)}"
+
+@app.route('/api/ai/estimate-grid', methods=['GET'])
+def estimate_grid_endpoint():
+    """Manifest of the precomputed estimate grid; the .npy itself is at `url`."""
+    snap = current_snapshot()
+    key = _grid_key(snap.rates)
+    resp = jsonify({**snap.grid.manifest(snap.rates), 'key': key,
+                    'url': f'{GRID_URL_PREFIX}{key}.npy',
+                    'dataOffset': snap.grid.data_offset()})
+    resp.set_etag(key)
+    resp.headers['Cache-Control'] = 'public, max-age=60'
+    return resp.make_conditional(request)
+
+
+@app.route(f'{GRID_URL_PREFIX}<key>.npy', methods=['GET'])
+def estimate_grid_file_endpoint(key):
+    snap = current_snapshot()
+    if key != _grid_key(snap.rates):
+        abort(404)
+    if snap.grid.path:
+        resp = send_file(snap.grid.path, mimetype='application/octet-stream', conditional=True)
+    else:
+        buf = io.BytesIO()
+        np.save(buf, snap.grid.values)
+        resp = Response(buf.getvalue(), mimetype='application/octet-stream')
+    resp.headers['Cache-Control'] = 'public, max-age=31536000, immutable'
+    return resp
+
+
+def _admin_allowed():
+    """Require X-Admin-Token when AIML_ADMIN_TOKEN is set, else loopback callers only."""
+    token = os.environ.get('AIML_ADMIN_TOKEN')
+    if token:
+        return hmac.compare_digest(request.headers.get('X-Admin-Token', ''), token)
+    return request.remote_addr in ('127.0.0.1', '::1')
+
+
+@app.route('/admin/reload', methods=['GET', 'POST'])
+def admin_reload_endpoint():
+    """POST re-reads RATES_FILE and retrains in the background; GET reports status."""
+    if not _admin_allowed():
+        return jsonify({'message': 'Forbidden'}), 403
+    code = 200
+    if request.method == 'POST':
+        if not reload_rate_tables():
+            return jsonify({'message': 'A reload is already in progress'}), 409
+        code = 202
+    tables = rate_tables()
+    return jsonify({**_reload_status, 'version': tables.version, 'key': tables.key}), code
+
+
+@app.route('/admin/profiles', methods=['GET'])
+def admin_profiles_endpoint():
+    """Recent slow-request profiles (collapsed stacks under PROFILE_DIR)."""
+    if not _admin_allowed():
+        return jsonify({'message': 'Forbidden'}), 403
+    return jsonify({'enabled': PROFILER.enabled, 'slowMs': PROFILER.slow_ms,
+                    'intervalMs': PROFILE_INTERVAL_MS, 'dir': PROFILER.out_dir,
+                    'profiles': list(PROFILER.recent)})
+
+
+STARTUP['importSeconds'] = round(time.perf_counter() - _import_t0, 3)
 
 # ═══════════════════════════════════════════════════════════════════════════════
 if __name__ == '__main__':
+    if sys.argv[1:2] == ['build-model']:
+        # Prebuild the model artifact, e.g. during deploy: python aiml.py build-model [--force]
+        path = build_model_artifact(force='--force' in sys.argv)
+        print(f"Model artifact written to {path}")
+        tables = rate_tables()
+        grid = build_estimate_grid(load_evaluator(tables), load_ensemble(tables), tables)
+        print(f"Estimate grid written to {grid}")
+        sys.exit(0)
+    if ESTIMATES and os.environ.get('AIML_PRELOAD_MODEL', '1') != '0':
+        current_snapshot()
+    start_background_tasks()
     port = int(os.environ.get('PORT', os.environ.get('AIML_PORT', 5001)))
-    print(f"Buildease AI/ML Service starting on port {port}")
+    print(f"Buildease AI/ML Service ({SERVICE_ROLE}) starting on port {port}: {startup_report()}")
     app.run(host='0.0.0.0', port=port, debug=False)
@@ -0,0 +1,390 @@
+"""
+Buildease AI/ML Service — ASGI entry point
+==========================================
+Async serving mode for aiml.py, so slow blueprint renders cannot hold up
+cheap quotes on the same worker:
+
+    uvicorn asgi:app --port 5001 [--workers N]
+
+- Estimate, quotation, prediction, market rates and health run inline on
+  the event loop (a grid lookup plus a few dicts each).
+- Blueprint generation runs on a bounded thread pool (PNG floors still go to
+  the render process pool). Once AIML_BLUEPRINT_QUEUE requests are waiting
+  for a thread, further ones are shed with 429 and Retry-After. Streamed
+  blueprints ("stream": true) are sent line by line as floors finish.
+- Blueprint job progress streams (SSE) are served from the event loop, so an
+  open stream does not hold a thread while its job runs.
+- Every other route (batch estimates, job submission, images, metrics,
+  admin) is served by the Flask app on a thread, streamed back chunk by chunk.
+
+Per-route latency, stages and in-flight counts land in the same /metrics
+series as under the Flask server.
+"""
+
+import io, os, sys, json, time, asyncio, traceback
+from concurrent.futures import ThreadPoolExecutor
+from werkzeug.http import parse_etags
+
+import aiml
+from aiml import (app as flask_app, stage, collect_stages, observe_request, track_in_flight,
+                  Counter, METRIC_COLLECTORS, PROFILER, RENDER_POOL, _metric_family)
+
+BLUEPRINT_THREADS = int(os.environ.get('AIML_BLUEPRINT_THREADS',
+                                       max(2, aiml.RENDER_PROCESSES)))
+BLUEPRINT_QUEUE = int(os.environ.get('AIML_BLUEPRINT_QUEUE', 8))
+WSGI_THREADS = int(os.environ.get('AIML_ASGI_THREADS', 8))
+MAX_BODY_BYTES = int(os.environ.get('AIML_MAX_BODY_BYTES', 2 * 1024 * 1024))
+RETRY_AFTER_SECONDS = 2
+JOB_POLL_SECONDS = 0.1
+
+_blueprint_pool = ThreadPoolExecutor(BLUEPRINT_THREADS, thread_name_prefix='blueprint')
+_wsgi_pool = ThreadPoolExecutor(WSGI_THREADS, thread_name_prefix='wsgi')
+_blueprint_pending = 0          # queued + running; only touched on the event loop
+
+SHED_REQUESTS = Counter('aiml_shed_requests_total',
+                        'Requests rejected with 429 because a bounded queue was full.',
+                        ('route',))
+
+def _asgi_metrics():
+    yield from SHED_REQUESTS.collect()
+    yield from _metric_family('aiml_blueprint_pending',
+                              'Blueprint requests queued or running on the blueprint pool.',
+                              'gauge', [((), (), _blueprint_pending)])
+
+METRIC_COLLECTORS.append(_asgi_metrics)
+
+
+# ═══════════════════════════════════════════════════════════════════════════════
+# HANDLERS
+# ═══════════════════════════════════════════════════════════════════════════════
+
+def _dumps(body):
+    """Serialise exactly like flask.jsonify (sorted keys, compact, trailing newline)."""
+    return (flask_app.json.dumps(body, separators=(',', ':')) + '\n').encode('utf-8')
+
+def _run_payload(route, method, payload_fn, data):
+    """
+    Call a `*_payload(data)` handler with the same metrics, stages and
+    profiling as a Flask request; return (status, body bytes, headers).
+    Runs on whichever thread calls it (event loop or pool).
+    """
+    t0 = time.perf_counter()
+    track_in_flight(route, 1)
+    if PROFILER.enabled:
+        PROFILER.begin()
+    try:
+        with collect_stages() as stages:
+            try:
+                body, status = payload_fn(data)
+            except Exception:
+                traceback.print_exc()
+                body, status = {'message': 'Internal server error'}, 500
+            with stage('serialize'):
+                out = _dumps(body)
+    finally:
+        seconds = time.perf_counter() - t0
+        track_in_flight(route, -1)
+        if PROFILER.enabled:
+            PROFILER.end(route, seconds)
+    headers = [(b'content-type', b'application/json')]
+    timing = observe_request(route, method, status, seconds, stages)
+    if timing:
+        headers.append((b'server-timing', timing.encode('latin-1')))
+    return status, out, headers
+
+def _timed(stages, fn, *args):
+    """fn(*args), adding the stages it times on this thread to stages."""
+    with collect_stages() as step:
+        result = fn(*args)
+    for name, seconds in step.items():
+        stages[name] = stages.get(name, 0.0) + seconds
+    return result
+
+def _market_rates(scope):
+    idx = aiml.rate_tables()
+    etag = idx.market_rates_etag
+    inm = _header(scope, b'if-none-match')
+    status, body = (304, b'') if inm and parse_etags(inm).contains(etag) else (200, idx.market_rates_body)
+    return status, body, [(b'content-type', b'application/json'),
+                          (b'etag', f'"{etag}"'.encode('latin-1')),
+                          (b'cache-control', b'public, max-age=60')]
+
+def _health(scope):
+    return 200, _dumps(aiml.health_payload()), [(b'content-type', b'application/json')]
+
+# JSON endpoints handled natively: (method, path) → (payload fn, where it runs)
+INLINE, POOLED = 'inline', 'pooled'
+PAYLOAD_ROUTES = {
+    ('POST', '/api/ai/estimate'):   (aiml.estimate_payload, INLINE),
+    ('POST', '/api/ai/quotation'):  (aiml.quotation_payload, INLINE),
+    ('POST', '/api/ai/prediction'): (aiml.prediction_payload, INLINE),
+    ('POST', '/api/ai/blueprint'):  (aiml.blueprint_payload, POOLED),
+}
+JOB_PREFIX = aiml.JOB_ROUTE + '/'
+JOB_EVENTS_ROUTE = aiml.JOB_ROUTE + '/<job_id>/events'   # the Flask rule, for metrics
+GET_ROUTES = {
+    '/api/ai/market-rates': _market_rates,
+    '/health': _health,
+}
+# Routes outside this worker's AIML_ROLE fall through to Flask, which 404s them
+PAYLOAD_ROUTES = {k: v for k, v in PAYLOAD_ROUTES.items() if aiml.serves(k[1])}
+GET_ROUTES = {k: v for k, v in GET_ROUTES.items() if aiml.serves(k)}
+
+
+# ═══════════════════════════════════════════════════════════════════════════════
+# ASGI PLUMBING
+# ═══════════════════════════════════════════════════════════════════════════════
+
+def _header(scope, name):
+    for key, value in scope['headers']:
+        if key == name:
+            return value.decode('latin-1')
+    return None
+
+async def _read_body(receive):
+    """Request body bytes, or None once it exceeds MAX_BODY_BYTES."""
+    chunks, size = [], 0
+    while True:
+        msg = await receive()
+        if msg['type'] == 'http.disconnect':
+            return b''.join(chunks)
+        chunk = msg.get('body', b'')
+        size += len(chunk)
+        if size > MAX_BODY_BYTES:
+            return None
+        chunks.append(chunk)
+        if not msg.get('more_body'):
+            return b''.join(chunks)
+
+async def _respond(send, status, body, headers=()):
+    headers = list(headers) + [(b'content-length', str(len(body)).encode('latin-1'))]
+    await send({'type': 'http.response.start', 'status': status, 'headers': headers})
+    await send({'type': 'http.response.body', 'body': body})
+
+async def _respond_json(send, status, body, headers=()):
+    await _respond(send, status, _dumps(body), [(b'content-type', b'application/json'), *headers])
+
+def _environ(scope, body):
+    """WSGI environ for an ASGI HTTP scope with an already-read body."""
+    server = scope.get('server') or ('localhost', 80)
+    client = scope.get('client') or ('', 0)
+    env = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': scope.get('root_path', '').encode('utf-8').decode('latin-1'),
+        'PATH_INFO': scope['path'].encode('utf-8').decode('latin-1'),
+        'QUERY_STRING': scope.get('query_string', b'').decode('latin-1'),
+        'SERVER_NAME': server[0],
+        'SERVER_PORT': str(server[1]),
+        'SERVER_PROTOCOL': f"HTTP/{scope.get('http_version', '1.1')}",
+        'REMOTE_ADDR': client[0],
+        'CONTENT_LENGTH': str(len(body)),
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': io.BytesIO(body),
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': True,
+        'wsgi.run_once': False,
+    }
+    for name, value in scope['headers']:
+        key = name.decode('latin-1').upper().replace('-', '_')
+        value = value.decode('latin-1')
+        if key == 'CONTENT_TYPE':
+            env[key] = value
+        elif key != 'CONTENT_LENGTH':
+            key = 'HTTP_' + key
+            env[key] = f'{env[key]},{value}' if key in env else value
+    return env
+
+def _start_wsgi(environ):
+    started = []
+    def start_response(status, headers, exc_info=None):
+        started[:] = [status, headers]
+    result = flask_app(environ, start_response)
+    return result, started
+
+async def _serve_wsgi(scope, body, send):
+    """Run the Flask app on the WSGI pool and stream its response."""
+    loop = asyncio.get_running_loop()
+    result, (status, headers) = await loop.run_in_executor(_wsgi_pool, _start_wsgi,
+                                                          _environ(scope, body))
+    await send({'type': 'http.response.start', 'status': int(status.split(' ', 1)[0]),
+                'headers': [(k.lower().encode('latin-1'), v.encode('latin-1'))
+                            for k, v in headers]})
+    chunks = iter(result)
+    try:
+        while True:
+            chunk = await loop.run_in_executor(_wsgi_pool, next, chunks, None)
+            if chunk is None:
+                break
+            if chunk:
+                await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+    finally:
+        if hasattr(result, 'close'):
+            await loop.run_in_executor(_wsgi_pool, result.close)
+    await send({'type': 'http.response.body', 'body': b''})
+
+async def _serve_payload(scope, body, send, payload_fn, where):
+    global _blueprint_pending
+    route, method = scope['path'], scope['method']
+    try:
+        data = json.loads(body) if body else {}
+    except ValueError:
+        data = None
+    if not isinstance(data, dict):
+        return await _respond_json(send, 400, {'message': 'Request body must be a JSON object'})
+
+    if where == INLINE and aiml.model_ready():
+        return await _respond(send, *_run_payload(route, method, payload_fn, data))
+    if where == INLINE:
+        # First request before the model is loaded: load it off the event loop
+        result = await asyncio.get_running_loop().run_in_executor(
+            _wsgi_pool, _run_payload, route, method, payload_fn, data)
+        return await _respond(send, *result)
+
+    if _blueprint_pending >= BLUEPRINT_THREADS + BLUEPRINT_QUEUE:
+        SHED_REQUESTS.inc(route)
+        return await _respond_json(send, 429, {'message': 'Blueprint service is busy, retry shortly'},
+                                   [(b'retry-after', str(RETRY_AFTER_SECONDS).encode('latin-1'))])
+    _blueprint_pending += 1
+    try:
+        if payload_fn is aiml.blueprint_payload and data.get('stream'):
+            return await _stream_blueprint(route, method, data, send)
+        result = await asyncio.get_running_loop().run_in_executor(
+            _blueprint_pool, _run_payload, route, method, payload_fn, data)
+    finally:
+        _blueprint_pending -= 1
+    await _respond(send, *result)
+
+async def _stream_blueprint(route, method, data, send):
+    """NDJSON blueprint: each line is produced on the blueprint pool and sent as soon as it is ready."""
+    loop = asyncio.get_running_loop()
+    t0 = time.perf_counter()
+    stages, status = {}, 200
+    track_in_flight(route, 1)
+    try:
+        try:
+            req = aiml.blueprint_request(data)
+        except ValueError as e:
+            status = 400
+            return await _respond_json(send, 400, {'message': str(e)})
+        try:
+            plan = await loop.run_in_executor(_blueprint_pool, _timed, stages,
+                                              aiml.blueprint_plan, req)
+        except Exception:
+            traceback.print_exc()
+            status = 500
+            return await _respond_json(send, 500, {'message': 'Internal server error'})
+        await send({'type': 'http.response.start', 'status': 200,
+                    'headers': [(b'content-type', b'application/x-ndjson'),
+                                (b'cache-control', b'no-cache'), (b'x-accel-buffering', b'no')]})
+        lines = aiml.blueprint_lines(plan, bool(data.get('preview')))
+        try:
+            while True:
+                line = await loop.run_in_executor(_blueprint_pool, _timed, stages,
+                                                  next, lines, None)
+                if line is None:
+                    break
+                await send({'type': 'http.response.body', 'body': line.encode('utf-8'),
+                            'more_body': True})
+        except Exception:
+            # Headers are out; ending the body early (no 'done' line) tells the client
+            traceback.print_exc()
+            status = 500
+        finally:
+            await loop.run_in_executor(_blueprint_pool, lines.close)
+        await send({'type': 'http.response.body', 'body': b''})
+    finally:
+        track_in_flight(route, -1)
+        observe_request(route, method, status, time.perf_counter() - t0, stages)
+
+def _with_cors(send):
+    """Match flask-cors' default for the natively handled routes."""
+    async def cors_send(msg):
+        if msg['type'] == 'http.response.start' and not any(
+                k == b'access-control-allow-origin' for k, _ in msg['headers']):
+            msg = {**msg, 'headers': [*msg['headers'], (b'access-control-allow-origin', b'*')]}
+        await send(msg)
+    return cors_send
+
+async def _job_events(send, job_id):
+    """SSE for a blueprint job, polling its state from the event loop."""
+    route, t0, status = JOB_EVENTS_ROUTE, time.perf_counter(), 200
+    track_in_flight(route, 1)
+    try:
+        job = aiml.BLUEPRINT_JOBS.get(job_id)
+        if job is None:
+            status = 404
+            return await _respond_json(send, 404, {'message': 'Job not found or expired'})
+        await _send_job_events(send, job_id, job)
+    finally:
+        # observed when the stream ends (or the client goes), not when it starts
+        track_in_flight(route, -1)
+        observe_request(route, 'GET', status, time.perf_counter() - t0, {})
+
+async def _send_job_events(send, job_id, job):
+    await send({'type': 'http.response.start', 'status': 200,
+                'headers': [(b'content-type', b'text/event-stream; charset=utf-8'),
+                            (b'cache-control', b'no-cache'), (b'x-accel-buffering', b'no')]})
+    loop = asyncio.get_running_loop()
+    sent_at = loop.time()
+    await send({'type': 'http.response.body', 'body': aiml.job_event(job).encode('utf-8'),
+                'more_body': True})
+    while not job['finished']:
+        await asyncio.sleep(JOB_POLL_SECONDS)
+        nxt = aiml.BLUEPRINT_JOBS.get(job_id)
+        if nxt is None:
+            break
+        if nxt['version'] > job['version']:
+            chunk, job = aiml.job_event(nxt), nxt
+        elif loop.time() - sent_at >= aiml.JOB_HEARTBEAT_SECONDS:
+            chunk = ': keep-alive\n\n'
+        else:
+            continue
+        sent_at = loop.time()
+        await send({'type': 'http.response.body', 'body': chunk.encode('utf-8'), 'more_body': True})
+    await send({'type': 'http.response.body', 'body': b''})
+
+async def _lifespan(receive, send):
+    while True:
+        msg = await receive()
+        if msg['type'] == 'lifespan.startup':
+            try:
+                aiml.start_background_tasks()
+                if aiml.ESTIMATES and os.environ.get('AIML_PRELOAD_MODEL', '1') != '0':
+                    await asyncio.get_running_loop().run_in_executor(_wsgi_pool,
+                                                                     aiml.current_snapshot)
+            except Exception as e:
+                await send({'type': 'lifespan.startup.failed', 'message': repr(e)})
+                return
+            print(f"Buildease AI/ML Service ({aiml.SERVICE_ROLE}, ASGI): {aiml.startup_report()}")
+            await send({'type': 'lifespan.startup.complete'})
+        elif msg['type'] == 'lifespan.shutdown':
+            _blueprint_pool.shutdown(wait=False, cancel_futures=True)
+            _wsgi_pool.shutdown(wait=False, cancel_futures=True)
+            aiml.BLUEPRINT_JOBS.shutdown()
+            RENDER_POOL.shutdown()
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+async def app(scope, receive, send):
+    if scope['type'] == 'lifespan':
+        return await _lifespan(receive, send)
+    if scope['type'] != 'http':
+        return
+
+    if _header(scope, b'origin') is not None:
+        send = _with_cors(send)
+    method, path = scope['method'], scope['path']
+    if method == 'GET' and path in GET_ROUTES:
+        return await _respond(send, *GET_ROUTES[path](scope))
+    if (method == 'GET' and aiml.RENDERS and path.startswith(JOB_PREFIX)
+            and path.endswith('/events')):
+        return await _job_events(send, path[len(JOB_PREFIX):-len('/events')])
+    body = await _read_body(receive)
+    if body is None:
+        return await _respond_json(send, 413, {'message': 'Request body too large'})
+    route = PAYLOAD_ROUTES.get((method, path))
+    if route is not None:
+        return await _serve_payload(scope, body, send, *route)
+    await _serve_wsgi(scope, body, send)
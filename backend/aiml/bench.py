@@ -0,0 +1,331 @@
+"""
+Buildease AI/ML Service — Benchmarks
+====================================
+Reproducible timings for the aiml.py hot paths, written as JSON so runs can be
+compared across commits:
+
+    python bench.py                         # full run → bench-<commit>.json
+    python bench.py --quick -o now.json     # fewer repeats
+    python bench.py --compare base.json now.json
+
+Covers cold import, per-role startup (AIML_ROLE), train_model(), single/batched
+prediction, the extra-features parser, floor layout and candidate scoring,
+per-floor rendering and Flask test-client latency for every route at 1/2/3
+floors plus a scenario sweep. The blueprint render cache is disabled and model
+artifacts / images go to a throwaway directory unless overridden via env.
+"""
+
+import os, sys, json, time, atexit, shutil, platform, argparse, tempfile, subprocess, statistics
+from importlib.metadata import version
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+_scratch = tempfile.mkdtemp(prefix='buildease-bench-')
+atexit.register(shutil.rmtree, _scratch, ignore_errors=True)
+os.environ.setdefault('AIML_BLUEPRINT_CACHE_MB', '0')
+os.environ.setdefault('AIML_MODEL_DIR', os.path.join(_scratch, 'models'))
+os.environ.setdefault('AIML_IMAGE_DIR', os.path.join(_scratch, 'images'))
+
+FLOORS = (1, 2, 3)
+EXTRA_TEXTS = [
+    '',
+    'study room',
+    'study, pooja room and gym',
+    'Home office, walk-in closet, servant room, terrace, library and a home theater please',
+    'We want a large utility area, a laundry, store room, guest room and a prayer room near the entrance',
+]
+ESTIMATE_BODY = {'city': 'mumbai', 'area': 1800, 'quality': 'premium', 'materials': 'foreign'}
+
+
+def _stats(samples):
+    """Summary in milliseconds for a list of durations in seconds."""
+    ms = sorted(s * 1000 for s in samples)
+    return {
+        'n': len(ms),
+        'median_ms': round(statistics.median(ms), 4),
+        'p95_ms': round(ms[min(len(ms) - 1, int(len(ms) * 0.95))], 4),
+        'min_ms': round(ms[0], 4),
+        'mean_ms': round(statistics.fmean(ms), 4),
+    }
+
+def _time(fn, repeat, warmup=1):
+    for _ in range(warmup):
+        fn()
+    samples = []
+    for _ in range(repeat):
+        t = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - t)
+    return samples
+
+def _git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=HERE,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+# ═══════════════════════════════════════════════════════════════════════════════
+# BENCHMARKS
+# ═══════════════════════════════════════════════════════════════════════════════
+
+def bench_cold_import(repeat):
+    """Fresh-interpreter `import aiml` time (model loading is lazy)."""
+    code = ('import time; t = time.perf_counter(); import aiml; '
+            'print(time.perf_counter() - t)')
+    samples = []
+    for _ in range(repeat):
+        out = subprocess.run([sys.executable, '-c', code], cwd=HERE, env=os.environ,
+                             capture_output=True, text=True, check=True).stdout
+        samples.append(float(out.strip().splitlines()[-1]))
+    return _stats(samples)
+
+ROLE_WARMUP = {
+    'estimator': 'aiml.predict_interval([0, 1800, 1, 0, 2])',
+    'renderer': "aiml.render_floor_png(aiml.Layout.empty(), 20.0, 26.0, '', 0)",
+    'all': ("aiml.predict_interval([0, 1800, 1, 0, 2]); "
+            "aiml.render_floor_png(aiml.Layout.empty(), 20.0, 26.0, '', 0)"),
+}
+
+def bench_startup(repeat):
+    """
+    Per AIML_ROLE, in a fresh interpreter with the artifacts already built:
+    import time, time until the role's first request is served, peak RSS
+    and which heavy libraries ended up loaded.
+    """
+    out = {}
+    for role, warm in ROLE_WARMUP.items():
+        code = ('import time, json; t = time.perf_counter(); import aiml; '
+                f'i = time.perf_counter() - t; {warm}; r = time.perf_counter() - t; '
+                'print(json.dumps([i, r, aiml.startup_report()]))')
+        runs = []
+        for _ in range(repeat):
+            res = subprocess.run([sys.executable, '-c', code], cwd=HERE,
+                                 env={**os.environ, 'AIML_ROLE': role},
+                                 capture_output=True, text=True, check=True).stdout
+            runs.append(json.loads(res.strip().splitlines()[-1]))
+        out[role] = {
+            'import': _stats([r[0] for r in runs]),
+            'ready': _stats([r[1] for r in runs]),
+            'max_rss_mb': statistics.median(r[2]['maxRssMB'] or 0 for r in runs),
+            'loaded': runs[-1][2]['loaded'],
+        }
+    return out
+
+def bench_train(aiml, repeat):
+    samples = _time(lambda: aiml.train_model(), repeat, warmup=0)
+    return {**_stats(samples), 'samples_per_cell': aiml.TRAIN_SAMPLES_PER_CELL}
+
+def bench_predict(aiml, np, repeat, n=None):
+    model = aiml.get_cost_model()
+    evaluator = aiml.get_cost_evaluator()
+    rng = np.random.default_rng(0)
+    n = n or aiml.MAX_BATCH_ITEMS
+    batch = np.column_stack([
+        rng.integers(0, len(aiml.rate_tables().cities), n),
+        rng.uniform(300, 10000, n),
+        rng.integers(0, 3, n),
+        rng.integers(0, 2, n),
+        rng.integers(1, 4, n),
+    ]).astype(float)
+    single = batch[:1]
+    out = {'batch_size': n}
+    grid = aiml.current_snapshot().grid
+    # Intervals are centred on the served estimate; time the ensemble alone
+    points = {len(X): evaluator.predict(X) for X in (single, batch)}
+    for label, fn in (('pipeline', model.predict), ('evaluator', evaluator.predict),
+                      ('ensemble', lambda X: grid.ensemble.intervals(X, points[len(X)])),
+                      ('grid', grid.predict)):
+        out[label] = {
+            'single': _stats(_time(lambda: fn(single), repeat * 20)),
+            'batch': _stats(_time(lambda: fn(batch), repeat)),
+        }
+    return out
+
+def bench_parse(aiml, repeat):
+    texts = EXTRA_TEXTS * 200
+    samples = _time(lambda: [aiml.parse_extra_features(t) for t in texts], repeat)
+    med = statistics.median(samples)
+    return {**_stats(samples), 'texts_per_call': len(texts),
+            'texts_per_sec': round(len(texts) / med)}
+
+def _layout(aiml, floors, extras_text=EXTRA_TEXTS[2], area=2400, beds=4, baths=3):
+    extras = aiml.parse_extra_features(extras_text)
+    per_floor = area / floors
+    plot_w = (per_floor / 1.3) ** 0.5
+    plot_h = per_floor / plot_w
+    specs = aiml.build_floor_specs(area, beds, baths, floors, True, True, extras)
+    return [(aiml.position_rooms(fs['room_specs'], plot_w, plot_h), plot_w, plot_h,
+             f"Bench – {fs['label']}", fs['area'], fi == 0,
+             fi == len(specs) - 1 and floors > 1)
+            for fi, fs in enumerate(specs)]
+
+def bench_layout(aiml, repeat):
+    out = {}
+    for floors in FLOORS:
+        samples = _time(lambda: _layout(aiml, floors), repeat * 50)
+        out[f'{floors}_floors'] = {**_stats(samples),
+                                   'layouts_per_sec': round(1 / statistics.median(samples))}
+    return out
+
+def bench_candidates(aiml, repeat, n=200):
+    """Generate and score n variants of the one-floor bench layout."""
+    extras = aiml.parse_extra_features(EXTRA_TEXTS[3])
+    specs = aiml.build_floor_specs(2400, 4, 3, 1, True, True, extras)[0]['room_specs']
+    plot_w = (2400 / 1.3) ** 0.5
+    plot_h = 2400 / plot_w
+    layouts = aiml.generate_layouts(specs, plot_w, plot_h, n)
+    return {
+        'candidates': n,
+        'generate': _stats(_time(lambda: aiml.generate_layouts(specs, plot_w, plot_h, n), repeat)),
+        'score': _stats(_time(lambda: aiml.score_layouts(layouts, plot_w, plot_h), repeat)),
+    }
+
+def bench_render(aiml, repeat):
+    out = {}
+    for floors in FLOORS:
+        for fi, job in enumerate(_layout(aiml, floors)):
+            png = aiml.render_floor_png(*job)
+            out[f'{floors}_floors/floor_{fi}'] = {
+                'png': {**_stats(_time(lambda: aiml.draw_floor_plan(*job), repeat)),
+                        'bytes': len(png)},
+                'svg': {**_stats(_time(lambda: aiml.render_floor_svg(*job), repeat)),
+                        'bytes': len(aiml.render_floor_svg(*job).encode('utf-8'))},
+            }
+    return out
+
+def bench_routes(aiml, repeat):
+    client = aiml.app.test_client()
+    out = {}
+
+    def post(path, body):
+        r = client.post(path, json=body)
+        assert r.status_code == 200, (path, r.status_code, r.get_data(as_text=True)[:200])
+        return r
+
+    def first_line(body, event):
+        """Seconds until a streamed blueprint's first line of this event type."""
+        t = time.perf_counter()
+        r = client.post('/api/ai/blueprint', json={**body, 'stream': True}, buffered=False)
+        try:
+            for chunk in r.response:
+                if f'"event":"{event}"'.encode() in chunk:
+                    return time.perf_counter() - t
+        finally:
+            r.close()
+
+    for floors in FLOORS:
+        bp = {'area': 2400, 'floors': floors, 'bedrooms': 4, 'bathrooms': 3,
+              'garage': True, 'extraFeatures': EXTRA_TEXTS[2]}
+        for fmt in aiml.BLUEPRINT_FORMATS:
+            body = {**bp, 'format': fmt}
+            size = len(post('/api/ai/blueprint', body).data)
+            out[f'blueprint/{fmt}/{floors}_floors'] = {
+                **_stats(_time(lambda: post('/api/ai/blueprint', body), repeat)),
+                'bytes': size}
+        out[f'blueprint_stream/png/{floors}_floors'] = {
+            'first_floor': _stats([first_line(bp, 'floor') for _ in range(repeat)]),
+            'first_preview': _stats([first_line({**bp, 'preview': True}, 'preview')
+                                     for _ in range(repeat)]),
+        }
+        for path, body in (('/api/ai/estimate', {**ESTIMATE_BODY, 'floors': floors}),
+                           ('/api/ai/quotation', {**ESTIMATE_BODY, 'floors': floors}),
+                           ('/api/ai/prediction', {**ESTIMATE_BODY, 'floors': floors})):
+            out[f"{path.rsplit('/', 1)[1]}/{floors}_floors"] = _stats(
+                _time(lambda: post(path, body), repeat * 20))
+        items = [{**ESTIMATE_BODY, 'area': 500 + i * 9, 'floors': floors}
+                 for i in range(aiml.MAX_BATCH_ITEMS)]
+        out[f'estimate_batch_{len(items)}/{floors}_floors'] = _stats(
+            _time(lambda: post('/api/ai/estimate/batch', {'items': items}), repeat))
+
+    sweep = {'city': 'mumbai', 'area': {'start': 800, 'stop': 3000, 'step': 50},
+             'floors': {'start': 1, 'stop': 3}}
+    out['sweep_810'] = {**_stats(_time(lambda: post('/api/ai/sweep', sweep), repeat * 5)),
+                        'bytes': len(post('/api/ai/sweep', sweep).data)}
+    out['market_rates'] = _stats(_time(lambda: client.get('/api/ai/market-rates'), repeat * 20))
+    return out
+
+
+def run(repeat):
+    started = time.time()
+    results = {'cold_import': bench_cold_import(max(3, repeat // 2))}
+
+    t = time.perf_counter()
+    import numpy as np
+    import aiml
+    results['import'] = {'ms': round((time.perf_counter() - t) * 1000, 2)}
+    t = time.perf_counter()
+    aiml.get_cost_model()
+    results['first_model_load'] = {'ms': round((time.perf_counter() - t) * 1000, 2)}
+
+    results['startup'] = bench_startup(max(3, repeat // 2))
+    results['train_model'] = bench_train(aiml, max(3, repeat // 3))
+    results['predict'] = bench_predict(aiml, np, repeat)
+    results['parse_extra_features'] = bench_parse(aiml, repeat)
+    results['layout'] = bench_layout(aiml, repeat)
+    results['layout_candidates'] = bench_candidates(aiml, repeat)
+    results['render'] = bench_render(aiml, repeat)
+    results['routes'] = bench_routes(aiml, repeat)
+
+    return {
+        'meta': {
+            'commit': _git_commit(),
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+            'duration_s': round(time.time() - started, 1),
+            'repeat': repeat,
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpus': os.cpu_count(),
+            'packages': {pkg: version(pkg) for pkg in
+                         ('numpy', 'scikit-learn', 'matplotlib', 'flask')},
+            'render_processes': aiml.RENDER_PROCESSES,
+            'env': {k: v for k, v in os.environ.items() if k.startswith('AIML_')},
+        },
+        'results': results,
+    }
+
+
+# ═══════════════════════════════════════════════════════════════════════════════
+# COMPARISON
+# ═══════════════════════════════════════════════════════════════════════════════
+
+def _flatten(node, prefix=''):
+    for k, v in node.items():
+        if isinstance(v, dict):
+            yield from _flatten(v, f'{prefix}{k}.')
+        elif k in ('median_ms', 'ms', 'bytes', 'max_rss_mb'):
+            yield f'{prefix}{k}', v
+
+def compare(base_path, new_path):
+    """Print the median/size ratio new/base for every metric present in both runs."""
+    with open(base_path) as f:
+        base = dict(_flatten(json.load(f)['results']))
+    with open(new_path) as f:
+        new = dict(_flatten(json.load(f)['results']))
+    width = max(map(len, new), default=0)
+    for key, val in new.items():
+        if key in base and base[key]:
+            ratio = val / base[key]
+            flag = '  faster' if ratio < 0.9 else '  SLOWER' if ratio > 1.1 else ''
+            print(f'{key:<{width}}  {base[key]:>12.3f} → {val:>12.3f}  ×{ratio:.2f}{flag}')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark the Buildease AI/ML service.')
+    parser.add_argument('-o', '--output', help='JSON output path (default bench-<commit>.json)')
+    parser.add_argument('-n', '--repeat', type=int, default=10, help='timed iterations per case')
+    parser.add_argument('--quick', action='store_true', help='shorthand for --repeat 3')
+    parser.add_argument('--compare', nargs=2, metavar=('BASE', 'NEW'),
+                        help='compare two result files instead of running')
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        sys.exit(0)
+
+    sys.path.insert(0, HERE)
+    report = run(3 if args.quick else args.repeat)
+    out = args.output or f"bench-{report['meta']['commit'] or 'local'}.json"
+    with open(out, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f'Benchmark results written to {out} ({report["meta"]["duration_s"]}s)')
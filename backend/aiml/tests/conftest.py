@@ -0,0 +1,29 @@
+import os
+import sys
+import tempfile
+
+# Train into a scratch model dir and render inline, before aiml is imported
+_scratch = tempfile.mkdtemp(prefix='aiml-tests-')
+os.environ.setdefault('AIML_MODEL_DIR', os.path.join(_scratch, 'models'))
+os.environ.setdefault('AIML_IMAGE_DIR', os.path.join(_scratch, 'images'))
+os.environ.setdefault('AIML_RENDER_PROCESSES', '0')
+os.environ.setdefault('AIML_BLUEPRINT_CACHE_MB', '0')
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+
+
+@pytest.fixture(scope='session')
+def aiml():
+    import aiml
+    return aiml
+
+
+@pytest.fixture(scope='session')
+def snap(aiml):
+    return aiml.current_snapshot()
+
+
+@pytest.fixture(scope='session')
+def client(aiml):
+    return aiml.app.test_client()
@@ -0,0 +1,10 @@
+import numpy as np
+
+
+def test_bench_predict_runs(aiml):
+    import bench
+    out = bench.bench_predict(aiml, np, 1, n=8)
+    assert out['batch_size'] == 8
+    assert set(out) == {'batch_size', 'pipeline', 'evaluator', 'ensemble', 'grid'}
+    assert all(out[k]['batch']['n'] == 1 and out[k]['single']['n'] == 20
+               for k in ('pipeline', 'evaluator', 'ensemble', 'grid'))
@@ -0,0 +1,134 @@
+import base64
+import json
+import xml.etree.ElementTree as ET
+
+import numpy as np
+import pytest
+
+
+@pytest.mark.parametrize('field, value, message', [
+    ('area', 0, "'area' must be a positive integer"),
+    ('area', -5, "'area' must be a positive integer"),
+    ('area', 'big', "'area' must be a positive integer"),
+    ('bedrooms', 0, "'bedrooms' must be a positive integer"),
+    ('bathrooms', -1, "'bathrooms' must be a positive integer"),
+    ('floors', 0, "'floors' must be a positive integer"),
+    ('floors', 'two', "'floors' must be a positive integer"),
+    ('floors', 11, 'floors must be between 1 and 10'),
+    ('bedrooms', 70000, 'bedrooms must be between 1 and 20'),
+    ('bathrooms', 21, 'bathrooms must be between 1 and 20'),
+    ('area', 50001, 'area must be between 1 and 50000'),
+    ('extraFeatures', ['gym'], "'extraFeatures' must be a string"),
+])
+@pytest.mark.parametrize('stream', [False, True])
+def test_bad_fields_are_400_with_explicit_message(client, field, value, message, stream):
+    body = {'area': 1200, 'format': 'json', field: value, 'stream': stream}
+    r = client.post('/api/ai/blueprint', json=body)
+    assert r.status_code == 400
+    assert r.get_json()['message'] == message
+
+
+def test_stream_lines(client):
+    r = client.post('/api/ai/blueprint', json={'area': 2400, 'floors': 3, 'format': 'json',
+                                                'stream': True})
+    assert r.status_code == 200 and r.mimetype == 'application/x-ndjson'
+    lines = [json.loads(line) for line in r.get_data(as_text=True).splitlines()]
+    assert [line['event'] for line in lines] == ['blueprint', 'floor', 'floor', 'floor', 'done']
+    full = client.post('/api/ai/blueprint', json={'area': 2400, 'floors': 3,
+                                                   'format': 'json'}).get_json()
+    for line in lines[1:-1]:
+        floor = {k: v for k, v in line.items() if k not in ('event', 'alternative', 'floor')}
+        assert floor == full['floors'][line['floor']]
+
+
+@pytest.mark.parametrize('area, beds, baths, floors, plot', [
+    (1200, 2, 1, 1, (30.0, 40.0)), (2400, 4, 3, 2, (40.0, 60.0)),
+    (5000, 3, 5, 5, (45.0, 55.5)), (10000, 8, 4, 10, (80.0, 35.0)),
+])
+def test_vectorised_placement_matches_position_rooms(aiml, area, beds, baths, floors, plot):
+    extras = aiml.parse_extra_features('pooja room, gym and a study')
+    for fs in aiml.build_floor_specs(area, beds, baths, floors, True, True, extras):
+        specs = fs['room_specs']
+        layouts = aiml.generate_layouts(specs, *plot, 24)
+        for v in range(24):
+            variant, shift, keep_order = aiml.layout_variant(specs, v)
+            expected = aiml.position_rooms(variant, *plot, shift, keep_order).rooms
+            np.testing.assert_array_equal(layouts[v], expected)
+
+
+def test_render_cache_evicts_least_recently_used_and_spills(aiml, tmp_path):
+    cache = aiml.RenderCache(30, spill_dir=str(tmp_path))
+    cache.put('a', b'a' * 10)
+    cache.put('b', b'b' * 10)
+    cache.put('c', b'c' * 10)
+    assert cache.get('a') == b'a' * 10          # 'b' is now the oldest
+    cache.put('d', b'd' * 10)
+    assert cache.stats()['entries'] == 3 and cache.stats()['evictions'] == 1
+    assert (tmp_path / 'b.png').read_bytes() == b'b' * 10
+    assert cache.get('b') == b'b' * 10          # promoted back from disk
+    assert cache.get('zz') is None
+    st = cache.stats()
+    assert (st['hits'], st['diskHits'], st['misses']) == (1, 1, 1)
+    assert st['bytes'] <= 30
+
+
+def test_repeat_blueprint_is_served_from_the_cache(aiml, client, monkeypatch):
+    cache = aiml.RenderCache(16 * 1024 * 1024)
+    monkeypatch.setattr(aiml, 'BLUEPRINT_CACHE', cache)
+    body = {'area': 1800, 'floors': 2, 'delivery': 'inline'}
+    first = client.post('/api/ai/blueprint', json=body).get_json()
+    assert cache.stats()['misses'] == 2 and cache.stats()['entries'] == 2
+
+    monkeypatch.setattr(aiml, 'render_floor_png', None)    # any render would now fail
+    again = client.post('/api/ai/blueprint', json={**body, 'style': 'modern'}).get_json()
+    assert again == first
+    assert cache.stats()['hits'] == 2
+
+
+def test_render_pool_matches_inline_renders(aiml):
+    plan = aiml.blueprint_plan(aiml.blueprint_request({'area': 2400, 'floors': 3}))
+    jobs = plan['jobs']
+    pool = aiml.RenderPool(2, 2)
+    try:
+        done = []
+        pngs = pool.render_many(jobs, on_done=done.append)
+    finally:
+        pool.shutdown()
+    assert done == [0, 1, 2] and pool.in_flight == 0
+    assert pngs == [aiml.render_floor_png(*job) for job in jobs]
+
+
+def test_svg_and_json_formats_skip_raster_rendering(aiml, client, monkeypatch):
+    monkeypatch.setattr(aiml, 'render_floor_png', None)
+    body = {'area': 2400, 'floors': 2, 'extraFeatures': 'gym'}
+    svg = client.post('/api/ai/blueprint', json={**body, 'format': 'svg'}).get_json()
+    geo = client.post('/api/ai/blueprint', json={**body, 'format': 'json'}).get_json()
+    assert svg['format'] == 'svg' and geo['format'] == 'json'
+    for s, g in zip(svg['floors'], geo['floors']):
+        assert s['rooms'] == g['rooms'] and 'imageUrl' not in s and 'image' not in g
+        root = ET.fromstring(s['svg'])
+        assert root.tag == '{http://www.w3.org/2000/svg}svg'
+        text = ' '.join(root.itertext())
+        assert all(room['name'] in text for room in s['rooms'])
+        rooms = [r for r in g['geometry'] if r['type'] != 'corridor']
+        assert [r['name'] for r in rooms] == [r['name'] for r in g['rooms']]
+        for r in g['geometry']:
+            assert r['x'] >= 0 and r['x'] + r['w'] <= geo['plotWidth'] + 0.1
+            assert r['y'] >= 0 and r['y'] + r['h'] <= geo['plotDepth'] + 0.1
+
+
+def test_image_urls_serve_the_inline_png(client):
+    body = {'area': 1500, 'floors': 2}
+    by_url = client.post('/api/ai/blueprint', json=body).get_json()
+    inline = client.post('/api/ai/blueprint', json={**body, 'delivery': 'inline'}).get_json()
+    for u, i in zip(by_url['floors'], inline['floors']):
+        assert 'image' not in u and 'imageUrl' not in i
+        with client.get(u['imageUrl']) as r:
+            assert r.status_code == 200 and r.mimetype == 'image/png'
+            assert r.data == base64.b64decode(i['image'])
+            assert 'immutable' in r.headers['Cache-Control']
+        with client.get(u['imageUrl'], headers={'If-None-Match': r.headers['ETag']}) as r:
+            assert r.status_code == 304
+    for digest in ('0' * 64, 'not-a-digest'):
+        with client.get(f'/api/ai/blueprint/image/{digest}.png') as r:
+            assert r.status_code == 404
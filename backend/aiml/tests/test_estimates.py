@@ -0,0 +1,96 @@
+import asyncio
+import io
+import itertools
+import json
+
+import numpy as np
+
+
+def test_interval_contains_estimate_across_grid(snap):
+    values = np.asarray(snap.grid.values, dtype=float).reshape(-1, 5)
+    cost, p10, p50, p90 = (np.rint(values[:, i] / 1000) * 1000 for i in range(4))
+    assert (p10 > 0).all()
+    assert (p10 <= cost).all() and (cost <= p90).all()
+    assert (p50 == cost).all()
+
+
+# Linear interpolation in area plus float32 storage, in rupees
+GRID_TOLERANCE = 2.5
+
+
+def test_grid_matches_evaluator_between_nodes(aiml, snap):
+    start, stop, _ = aiml.GRID_AREA
+    combos = itertools.product(range(len(snap.rates.cities)), snap.rates.quality_map.values(),
+                               range(len(aiml.GRID_MATERIALS)), aiml.GRID_FLOORS)
+    rng = np.random.default_rng(0)
+    X = np.array([(c, area, q, m, f) for c, q, m, f in combos
+                  for area in rng.uniform(start, stop, 40)], dtype=float)
+    expected = snap.evaluator.predict(X)
+    np.testing.assert_allclose(snap.grid.predict(X)[:, 0], expected, rtol=0, atol=GRID_TOLERANCE)
+    rows = [(int(c), area, int(q), int(m), int(f)) for c, area, q, m, f in X[::7].tolist()]
+    looked_up = np.array([snap.grid.lookup(row)[0] for row in rows])
+    np.testing.assert_allclose(looked_up, expected[::7], rtol=0, atol=GRID_TOLERANCE)
+
+
+def test_interval_contains_estimate_off_grid(aiml, snap):
+    # Off-grid rows are computed directly instead of interpolated
+    X = np.array([[0, 12000, 2, 1, 2], [1, 250, 0, 0, 1], [2, 1800, 1, 0, 5]], dtype=float)
+    est = snap.grid.predict(X)
+    assert (est[:, 1] > 0).all()
+    assert (est[:, 1] <= est[:, 0]).all() and (est[:, 0] <= est[:, 3]).all()
+
+
+def test_estimate_endpoint_interval(client):
+    for body in ({'city': 'mumbai', 'quality': 'premium', 'materials': 'foreign',
+                  'area': 3000, 'floors': 2},
+                 {'city': 'bangalore', 'quality': 'mid', 'area': 1200}):
+        r = client.post('/api/ai/estimate', json=body).get_json()
+        iv = r['interval']
+        assert 0 < iv['p10'] <= r['estimatedCost'] <= iv['p90']
+        assert iv['p50'] == r['estimatedCost']
+
+
+def _asgi(method, path, body=None):
+    """(status, headers, body bytes) for one request through asgi.app."""
+    import asgi
+    messages = [{'type': 'http.request', 'body': json.dumps(body).encode() if body else b''}]
+    sent = []
+
+    async def receive():
+        return messages.pop(0) if messages else {'type': 'http.disconnect'}
+
+    async def send(msg):
+        sent.append(msg)
+
+    scope = {'type': 'http', 'method': method, 'path': path, 'query_string': b'',
+             'headers': [(b'content-type', b'application/json')]}
+    asyncio.run(asgi.app(scope, receive, send))
+    return (sent[0]['status'], dict(sent[0]['headers']),
+            b''.join(m.get('body', b'') for m in sent[1:]))
+
+
+def test_asgi_inline_estimates_match_flask(client):
+    for route in ('/api/ai/estimate', '/api/ai/quotation', '/api/ai/prediction'):
+        for body in ({'city': 'mumbai', 'quality': 'premium', 'area': 3000, 'floors': 2},
+                     {'area': 0}):
+            flask = client.post(route, json=body)
+            status, headers, data = _asgi('POST', route, body)
+            assert (status, data) == (flask.status_code, flask.data)
+            assert headers[b'content-type'] == b'application/json'
+
+
+def test_asgi_sheds_blueprints_when_the_pool_is_full(aiml, monkeypatch):
+    import asgi
+    monkeypatch.setattr(asgi, '_blueprint_pending', asgi.BLUEPRINT_THREADS + asgi.BLUEPRINT_QUEUE)
+    status, headers, data = _asgi('POST', '/api/ai/blueprint', {'area': 1200})
+    assert status == 429 and headers[b'retry-after'] == str(asgi.RETRY_AFTER_SECONDS).encode()
+    assert _asgi('POST', '/api/ai/estimate', {'area': 1200})[0] == 200
+
+
+def test_asgi_serves_other_routes_through_flask(aiml, snap):
+    key = f"v{aiml.MODEL_VERSION}-{aiml.model_key(snap.rates)}"
+    route = aiml.GRID_URL_PREFIX + '<key>.npy'
+    status, _, data = _asgi('GET', f'{aiml.GRID_URL_PREFIX}{key}.npy')
+    assert status == 200
+    np.testing.assert_array_equal(np.load(io.BytesIO(data)), snap.grid.values)
+    assert aiml._in_flight.get(route, 0) == 0
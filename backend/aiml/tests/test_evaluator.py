@@ -0,0 +1,47 @@
+import itertools
+
+import numpy as np
+import pytest
+
+
+@pytest.fixture(scope='module')
+def pipeline(aiml, snap):
+    return aiml.load_cost_pipeline(snap.rates)
+
+
+@pytest.fixture(scope='module')
+def evaluator(aiml, pipeline):
+    return aiml.PolyRidgeEvaluator.from_pipeline(pipeline)
+
+
+def test_served_evaluator_is_closed_form(aiml, snap):
+    assert isinstance(snap.evaluator, aiml.PolyRidgeEvaluator)
+
+
+def test_matches_pipeline_on_random_inputs(snap, pipeline, evaluator):
+    tables = snap.rates
+    rng = np.random.default_rng(0)
+    n = 5000
+    X = np.column_stack([rng.integers(0, len(tables.cities), n),
+                         rng.uniform(100, 20000, n),
+                         rng.integers(0, len(tables.quality_map), n),
+                         rng.integers(0, 2, n),
+                         rng.integers(1, 11, n)]).astype(float)
+    np.testing.assert_allclose(evaluator.predict(X), pipeline.predict(X), rtol=1e-9, atol=1e-6)
+
+
+def test_matches_pipeline_on_every_category_at_area_edges(snap, pipeline, evaluator):
+    tables = snap.rates
+    rows = list(itertools.product(range(len(tables.cities)), (1, 500, 5000, 10000, 50000),
+                                  tables.quality_map.values(), (0, 1), (1, 2, 3)))
+    X = np.array(rows, dtype=float)
+    np.testing.assert_allclose(evaluator.predict(X), pipeline.predict(X), rtol=1e-9, atol=1e-6)
+
+
+def test_saved_evaluator_round_trips(aiml, snap, pipeline, tmp_path):
+    path = tmp_path / 'evaluator.npz'
+    with open(path, 'wb') as f:
+        aiml.PolyRidgeEvaluator.from_pipeline(pipeline).save(f)
+    X = aiml._parity_probe(snap.rates)
+    np.testing.assert_allclose(aiml.PolyRidgeEvaluator.load(path).predict(X), pipeline.predict(X),
+                               rtol=1e-9, atol=1e-6)
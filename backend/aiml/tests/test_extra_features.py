@@ -0,0 +1,28 @@
+import pytest
+
+
+def _names(aiml, text):
+    return [e['name'] for e in aiml.parse_extra_features(text)]
+
+
+@pytest.mark.parametrize('text, expected', [
+    ('', []),
+    ('study room', ['Study Room']),
+    ('2 guest rooms', ['Guest Room', 'Guest Room 2']),
+    ('a gym', ['Gym']),
+    ('no gym', []),
+    ('without gym', []),
+    ('house without a gym', []),
+    ('without any gym please', []),
+    ('a study but no gym', ['Study Room']),
+    ('² gym', ['Gym']),
+    ('٢ guest rooms', ['Guest Room', 'Guest Room 2']),
+])
+def test_parse_extra_features(aiml, text, expected):
+    assert _names(aiml, text) == expected
+
+
+def test_superscript_count_is_not_a_500(client):
+    r = client.post('/api/ai/blueprint', json={'area': 1200, 'format': 'json',
+                                               'extraFeatures': '² gym'})
+    assert r.status_code == 200 and r.get_json()['extraFeatures'] == ['Gym']
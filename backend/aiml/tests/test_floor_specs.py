@@ -0,0 +1,93 @@
+import itertools
+
+import pytest
+
+
+def _rooms(aiml, floor):
+    names = floor['room_specs'].room_names()
+    types = [aiml.ROOM_TYPES[t] for t in floor['room_specs'].rooms['type'].tolist()]
+    return list(zip(names, types))
+
+
+def _count(aiml, specs, rtype):
+    return [sum(t == rtype for _, t in _rooms(aiml, f)) for f in specs]
+
+
+@pytest.mark.parametrize('beds, baths, floors', list(itertools.product(
+    range(1, 9), range(1, 6), range(1, 11))))
+def test_requested_counts_are_never_exceeded(aiml, beds, baths, floors):
+    specs = aiml.build_floor_specs(2400, beds, baths, floors, True, True, [])
+    assert len(specs) == floors
+    assert sum(_count(aiml, specs, 'bedroom')) == beds
+    assert sum(_count(aiml, specs, 'bathroom')) == max(baths, 1 if floors > 1 else 0)
+
+
+def test_three_beds_over_five_floors(aiml):
+    specs = aiml.build_floor_specs(5000, 3, 5, 5, False, True, [])
+    names = [n for f in specs for n, t in _rooms(aiml, f) if t == 'bedroom']
+    assert names == ['Master Bedroom', 'Bedroom 2', 'Bedroom 3']
+    assert _count(aiml, specs, 'bedroom') == [0, 1, 1, 1, 0]
+    assert _count(aiml, specs, 'bathroom') == [1, 1, 1, 1, 1]
+    assert [n for n, t in _rooms(aiml, specs[1]) if t == 'bathroom'] == ['Attached Bath']
+
+
+def test_eight_beds_over_ten_floors(aiml):
+    specs = aiml.build_floor_specs(10000, 8, 4, 10, False, False, [])
+    names = [n for f in specs for n, t in _rooms(aiml, f) if t == 'bedroom']
+    assert 'Bedroom 9' not in names and len(names) == 8
+    assert _count(aiml, specs, 'bedroom') == [0, 1, 1, 1, 1, 1, 1, 1, 1, 0]
+    assert _count(aiml, specs, 'bathroom') == [1, 0, 0, 0, 0, 0, 0, 1, 1, 1]
+
+
+def test_three_floors_keep_original_split(aiml):
+    specs = aiml.build_floor_specs(3000, 6, 4, 3, True, True, [])
+    assert _rooms(aiml, specs[1])[:3] == [('Master Bedroom', 'bedroom'), ('Bedroom 2', 'bedroom'),
+                                          ('Attached Bath', 'bathroom')]
+    assert _count(aiml, specs, 'bedroom') == [0, 2, 4]
+    assert _count(aiml, specs, 'bathroom') == [1, 1, 2]
+    assert [n for n, t in _rooms(aiml, specs[2]) if t == 'terrace'] == ['Terrace']
+
+
+def test_two_floors_keep_original_rooms(aiml):
+    extras = aiml.parse_extra_features('pooja room and gym')
+    specs = aiml.build_floor_specs(2400, 4, 3, 2, True, True, extras)
+    assert _rooms(aiml, specs[0]) == [
+        ('Living Room', 'living'), ('Dining Room', 'dining'), ('Kitchen', 'kitchen'),
+        ('Bathroom', 'bathroom'), ('Staircase', 'staircase'), ('Garage', 'garage'),
+        ('Pooja Room', 'pooja')]
+    assert _rooms(aiml, specs[1]) == [
+        ('Master Bedroom', 'bedroom'), ('Bedroom 2', 'bedroom'), ('Bedroom 3', 'bedroom'),
+        ('Bedroom 4', 'bedroom'), ('Attached Bath', 'bathroom'), ('Bathroom 3', 'bathroom'),
+        ('Staircase', 'staircase'), ('Balcony', 'balcony'), ('Gym', 'gym')]
+
+
+@pytest.mark.parametrize('beds, baths, floors', [
+    (b, c, f) for b, c, f in itertools.product(range(1, 9), range(1, 6), range(2, 11))
+    if f <= max(3, b + c)])
+def test_baths_are_numbered_across_the_house_and_no_floor_is_empty(aiml, beds, baths, floors):
+    specs = aiml.build_floor_specs(3000, beds, baths, floors, False, False, [])
+    names = [n for f in specs for n, t in _rooms(aiml, f) if t == 'bathroom']
+    numbered = ['Bathroom 2' if n == 'Attached Bath' else n for n in names]
+    assert numbered == ['Bathroom'] + [f'Bathroom {i}' for i in range(2, len(names) + 1)]
+    for f in specs[1:]:
+        assert any(t != 'staircase' for _, t in _rooms(aiml, f))
+    first_bed = next(i for i, f in enumerate(specs) if _count(aiml, [f], 'bedroom')[0])
+    assert first_bed == 1
+
+
+def test_four_floors_seven_baths(aiml):
+    specs = aiml.build_floor_specs(4000, 3, 7, 4, False, False, [])
+    assert [[n for n, t in _rooms(aiml, f) if t == 'bathroom'] for f in specs] == [
+        ['Bathroom'], ['Attached Bath', 'Bathroom 3'], ['Bathroom 4', 'Bathroom 5'],
+        ['Bathroom 6', 'Bathroom 7']]
+
+
+def test_more_floors_than_rooms_is_400(client):
+    r = client.post('/api/ai/blueprint', json={'bedrooms': 2, 'bathrooms': 2, 'floors': 5,
+                                               'format': 'json'})
+    assert r.status_code == 400
+    assert r.get_json()['message'] == 'floors above 3 must be at most bedrooms + bathrooms'
+    for beds, baths, floors in ((1, 1, 3), (2, 2, 4)):
+        r = client.post('/api/ai/blueprint', json={'bedrooms': beds, 'bathrooms': baths,
+                                                   'floors': floors, 'format': 'json'})
+        assert r.status_code == 200
@@ -0,0 +1,112 @@
+import json
+import threading
+import time
+
+import pytest
+
+ROUTE = '/api/ai/blueprint/jobs'
+
+
+def _finished(jobs, job_id):
+    job = jobs.get(job_id)
+    while not job['finished']:
+        job = jobs.wait(job_id, job['version'], 5)
+    return job
+
+
+def _events(text):
+    for block in text.strip().split('\n\n'):
+        fields = dict(line.split(': ', 1) for line in block.splitlines())
+        yield fields['event'], json.loads(fields['data'])
+
+
+@pytest.mark.parametrize('field, value', [('format', 'gif'), ('floors', 'two'), ('area', 0),
+                                          ('delivery', 'email')])
+def test_bad_body_is_400_and_not_queued(aiml, client, field, value):
+    before = aiml.BLUEPRINT_JOBS.counts()
+    r = client.post(ROUTE, json={'area': 1200, field: value})
+    sync = client.post('/api/ai/blueprint', json={'area': 1200, field: value})
+    assert r.status_code == sync.status_code == 400
+    assert r.get_json()['message'] == sync.get_json()['message']
+    assert 'Retry-After' not in r.headers
+    assert aiml.BLUEPRINT_JOBS.counts() == before
+
+
+def test_job_runs_to_the_sync_result(aiml, client):
+    body = {'area': 2400, 'floors': 2, 'format': 'json'}
+    r = client.post(ROUTE, json=body)
+    assert r.status_code == 202
+    view = r.get_json()
+    assert r.headers['Location'] == view['statusUrl']
+    _finished(aiml.BLUEPRINT_JOBS, view['jobId'])
+
+    status = client.get(view['statusUrl']).get_json()
+    assert status['status'] == 'done' and status['httpStatus'] == 200
+    assert status['progress'] == {'done': 2, 'total': 2}
+    assert status['result'] == client.post('/api/ai/blueprint', json=body).get_json()
+    assert client.get(f'{ROUTE}/nope').status_code == 404
+
+
+def test_events_stream_progress_then_done(aiml, client, monkeypatch):
+    gate = threading.Event()
+
+    def gated(data, progress):
+        progress(1, 2)
+        gate.wait(5)
+        progress(2, 2)
+        return {'ok': True}, 200
+    monkeypatch.setattr(aiml, 'blueprint_payload', gated)
+
+    view = client.post(ROUTE, json={'area': 1200}).get_json()
+    job = aiml.BLUEPRINT_JOBS.get(view['jobId'])
+    while job['progress']['done'] < 1:
+        job = aiml.BLUEPRINT_JOBS.wait(job['id'], job['version'], 5)
+    r = client.get(view['eventsUrl'], buffered=False)
+    assert r.mimetype == 'text/event-stream'
+    gate.set()
+    events = list(_events(r.get_data(as_text=True)))
+    assert events[0] == ('progress', {**view, 'status': 'running',
+                                      'progress': {'done': 1, 'total': 2}})
+    assert events[-1][0] == 'done' and events[-1][1]['result'] == {'ok': True}
+    assert all(kind == 'progress' for kind, _ in events[:-1])
+
+
+def test_full_backlog_is_429(aiml, client, monkeypatch):
+    gate = threading.Event()
+    monkeypatch.setattr(aiml, 'BLUEPRINT_JOBS', aiml.JobQueue(1, 1, 60, 10))
+    monkeypatch.setattr(aiml, 'blueprint_payload', lambda data, progress: (gate.wait(5), 200))
+    try:
+        assert client.post(ROUTE, json={'area': 1200}).status_code == 202
+        assert client.post(ROUTE, json={'area': 1200}).status_code == 202
+        r = client.post(ROUTE, json={'area': 1200})
+        assert r.status_code == 429
+        assert r.headers['Retry-After'] == str(aiml.JOB_RETRY_AFTER_SECONDS)
+    finally:
+        gate.set()
+        aiml.BLUEPRINT_JOBS.shutdown()
+
+
+def test_finished_jobs_expire_after_ttl(aiml):
+    jobs = aiml.JobQueue(1, 4, 0.05, 10)
+    try:
+        first = jobs.submit(lambda data, progress: ({}, 200), None)['id']
+        _finished(jobs, first)
+        assert jobs.get(first) is not None
+        time.sleep(0.1)
+        second = jobs.submit(lambda data, progress: ({}, 200), None)['id']
+        assert jobs.get(first) is None
+        assert jobs.get(second) is not None
+    finally:
+        jobs.shutdown()
+
+
+def test_retained_jobs_are_capped(aiml):
+    jobs = aiml.JobQueue(1, 4, 60, 2)
+    try:
+        ids = []
+        for _ in range(4):
+            ids.append(jobs.submit(lambda data, progress: ({}, 200), None)['id'])
+            _finished(jobs, ids[-1])
+        assert [jobs.get(jid) is not None for jid in ids] == [False, True, True, True]
+    finally:
+        jobs.shutdown()
@@ -0,0 +1,66 @@
+import time
+
+ROUTE = '/api/ai/blueprint'
+LABELS = (ROUTE, 'POST', '200')
+
+
+def _in_flight(aiml, route=ROUTE):
+    return aiml._in_flight.get(route, 0)
+
+
+def _observed(aiml):
+    counts, total = aiml.REQUEST_SECONDS._series.get(LABELS, [[0], 0.0])
+    return sum(counts), total
+
+
+def test_streamed_request_is_observed_when_body_closes(aiml, client, monkeypatch):
+    def slow_lines(plan, preview):
+        yield '{"event": "blueprint"}\n'
+        time.sleep(0.2)
+        yield '{"event": "done"}\n'
+    monkeypatch.setattr(aiml, 'blueprint_lines', slow_lines)
+
+    before, busy = _observed(aiml), _in_flight(aiml)
+    r = client.post(ROUTE, json={'area': 1200, 'format': 'json', 'stream': True},
+                    buffered=False)
+    assert _in_flight(aiml) == busy + 1
+    assert _observed(aiml) == before
+    assert b''.join(r.response) == b'{"event": "blueprint"}\n{"event": "done"}\n'
+    r.close()
+
+    count, total = _observed(aiml)
+    assert _in_flight(aiml) == busy
+    assert count == before[0] + 1
+    assert total - before[1] >= 0.2
+
+
+def test_abandoned_stream_leaves_in_flight(aiml, client):
+    busy = _in_flight(aiml)
+    r = client.post(ROUTE, json={'area': 2400, 'floors': 3, 'format': 'json', 'stream': True},
+                    buffered=False)
+    next(iter(r.response))
+    assert _in_flight(aiml) == busy + 1
+    r.close()
+    assert _in_flight(aiml) == busy
+
+
+def test_buffered_request_is_observed_once(aiml, client):
+    before, busy = _observed(aiml), _in_flight(aiml)
+    r = client.post(ROUTE, json={'area': 1200, 'format': 'json'})
+    assert r.status_code == 200
+    assert _observed(aiml)[0] == before[0] + 1
+    assert _in_flight(aiml) == busy
+
+
+def test_file_responses_leave_in_flight(aiml, client):
+    image = client.post(ROUTE, json={'area': 1200}).get_json()['floors'][0]['imageUrl']
+    grid = client.get('/api/ai/estimate-grid').get_json()['url']
+    for url, route in ((image, aiml.IMAGE_URL_PREFIX + '<digest>.png'),
+                       (grid, aiml.GRID_URL_PREFIX + '<key>.npy')):
+        labels = (route, 'GET', '200')
+        before = sum(aiml.REQUEST_SECONDS._series.get(labels, [[0], 0.0])[0])
+        r = client.get(url)
+        assert r.status_code == 200
+        r.close()
+        assert _in_flight(aiml, route) == 0
+        assert sum(aiml.REQUEST_SECONDS._series[labels][0]) == before + 1
@@ -0,0 +1,77 @@
+import base64
+import json
+
+import numpy as np
+import pytest
+
+ROUTE = '/api/ai/sweep'
+BODY = {'city': ['mumbai', 'delhi'], 'quality': 'mid', 'materials': 'indian',
+        'floors': {'start': 1, 'stop': 3}, 'area': {'start': 1000, 'stop': 1500, 'step': 250}}
+
+
+def test_json_surface_matches_single_estimates(client):
+    r = client.post(ROUTE, json={**BODY, 'encoding': 'json'}).get_json()
+    assert r['shape'] == [2, 1, 1, 3, 3] and r['count'] == 18
+    assert r['axes']['floors'] == [1, 2, 3] and r['axes']['area'] == [1000, 1250, 1500]
+    cost = np.array(r['values']['cost']).reshape(r['shape'])
+    for (ci, _, _, fi, ai), value in np.ndenumerate(cost):
+        est = client.post('/api/ai/estimate', json={
+            'city': r['axes']['city'][ci], 'quality': 'mid', 'materials': 'indian',
+            'floors': r['axes']['floors'][fi], 'area': r['axes']['area'][ai]}).get_json()
+        assert value == est['estimatedCost']
+        assert r['values']['p90'][np.ravel_multi_index((ci, 0, 0, fi, ai), r['shape'])] \
+            == est['interval']['p90']
+
+
+def test_base64_matches_json(client):
+    plain = client.post(ROUTE, json={**BODY, 'encoding': 'json'}).get_json()
+    packed = client.post(ROUTE, json=BODY).get_json()
+    assert packed['encoding'] == 'base64' and packed['dtype'] == '<f4'
+    for channel, values in plain['values'].items():
+        decoded = np.frombuffer(base64.b64decode(packed['values'][channel]), '<f4')
+        np.testing.assert_allclose(decoded, values, rtol=1e-6, atol=1e-3)
+
+
+def test_ndjson_series_match_json(client):
+    plain = client.post(ROUTE, json={**BODY, 'encoding': 'json'}).get_json()
+    r = client.post(ROUTE, json={**BODY, 'encoding': 'ndjson'})
+    assert r.mimetype == 'application/x-ndjson'
+    header, *series = (json.loads(line) for line in r.get_data(as_text=True).splitlines())
+    assert header['encoding'] == 'ndjson' and header['shape'] == plain['shape']
+    assert len(series) == 6
+    assert [(s['city'], s['floors']) for s in series] == [
+        (c, f) for c in ('mumbai', 'delhi') for f in (1, 2, 3)]
+    for channel in plain['channels']:
+        assert [v for s in series for v in s[channel]] == plain['values'][channel]
+
+
+@pytest.mark.parametrize('encoding', ['json', 'ndjson'])
+def test_too_many_points_is_400(aiml, client, encoding):
+    body = {'city': list(aiml.rate_tables().cities), 'floors': {'start': 1, 'stop': 10},
+            'area': {'start': 100, 'stop': 20000, 'step': 10}, 'encoding': encoding}
+    r = client.post(ROUTE, json=body)
+    assert r.status_code == 400
+    assert f'at most {aiml.MAX_SWEEP_POINTS} allowed' in r.get_json()['message']
+
+
+@pytest.mark.parametrize('axis, spec, message', [
+    ('floors', {'start': 1, 'stop': 3, 'step': 0.5}, "'floors' range needs whole-number"),
+    ('area', {'start': 1000.5, 'stop': 2000, 'step': 100}, "'area' range needs whole-number"),
+    ('area', {'start': 2000, 'stop': 1000}, "'area' is not a valid range"),
+    ('area', {'start': 1000, 'stop': 2000, 'step': 0}, "'area' is not a valid range"),
+    ('area', {'start': 1000}, "'area' range needs numeric start and stop"),
+    ('area', {'start': 1, 'stop': 100000}, "'area' has more than"),
+    ('city', {'start': 1, 'stop': 2}, "'city' is not a valid range"),
+    ('area', {'start': 1000, 'stop': float('inf')}, "'area' is not a valid range"),
+    ('area', {'start': 1000, 'stop': 10 ** 400}, "'area' range needs numeric start and stop"),
+    ('area', [1000, 1250.5], "'area' has an invalid value"),
+    ('floors', 1.5, "'floors' has an invalid value"),
+    ('floors', [1, float('nan')], "'floors' has an invalid value"),
+    ('city', ['atlantis', 'mumbai'], "'city' must be among"),
+    ('city', 5, "'city' must be among"),
+])
+@pytest.mark.parametrize('encoding', ['json', 'ndjson'])
+def test_bad_range_is_400(client, axis, spec, message, encoding):
+    r = client.post(ROUTE, json={**BODY, axis: spec, 'encoding': encoding})
+    assert r.status_code == 400
+    assert r.get_json()['message'].startswith(message)
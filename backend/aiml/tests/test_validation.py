@@ -0,0 +1,48 @@
+import pytest
+
+BASE = {'city': 'bangalore', 'area': 1200, 'quality': 'mid', 'floors': 1}
+
+
+@pytest.mark.parametrize('route', ['/api/ai/estimate', '/api/ai/quotation', '/api/ai/prediction'])
+@pytest.mark.parametrize('field, value', [
+    ('quality', 'luxury'), ('quality', ['mid']), ('area', 0), ('area', -5), ('area', 'abc'),
+    ('area', None), ('floors', 0), ('floors', 'two'), ('city', 5), ('city', ['x']),
+    ('city', None), ('city', 'atlantis'), ('materials', 1), ('materials', 'plastic'),
+])
+def test_bad_fields_are_400(client, route, field, value):
+    r = client.post(route, json={**BASE, field: value})
+    assert r.status_code == 400
+    assert f"'{field}'" in r.get_json()['message']
+
+
+@pytest.mark.parametrize('route', ['/api/ai/estimate', '/api/ai/quotation', '/api/ai/prediction'])
+def test_defaults_and_numeric_strings_are_accepted(client, route):
+    assert client.post(route, json={}).status_code == 200
+    assert client.post(route, json={**BASE, 'area': '1500', 'floors': '2'}).status_code == 200
+
+
+def test_batch_reports_the_item_and_field(client):
+    items = [BASE, {**BASE, 'area': 0}]
+    r = client.post('/api/ai/estimate/batch', json={'items': items})
+    assert r.status_code == 400
+    assert r.get_json()['message'] == "items[1]: 'area' must be a positive integer"
+    r = client.post('/api/ai/estimate/batch', json={'items': [BASE, 'x']})
+    assert r.status_code == 400
+    r = client.post('/api/ai/estimate/batch', json={'items': [BASE, {**BASE, 'city': None}]})
+    assert r.status_code == 400
+    assert r.get_json()['message'].startswith("items[1]: 'city' must be one of")
+
+
+def test_bad_margin_is_400(client):
+    r = client.post('/api/ai/quotation', json={**BASE, 'margin': 'lots'})
+    assert r.status_code == 400 and "'margin'" in r.get_json()['message']
+
+
+@pytest.mark.parametrize('route', ['/api/ai/estimate', '/api/ai/estimate/batch',
+                                   '/api/ai/quotation', '/api/ai/prediction', '/api/ai/blueprint',
+                                   '/api/ai/blueprint/jobs', '/api/ai/sweep'])
+@pytest.mark.parametrize('body', [[1, 2], 5, 'x', True])
+def test_non_object_body_is_400(client, route, body):
+    r = client.post(route, json=body)
+    assert r.status_code == 400
+    assert r.get_json()['message'] == 'Request body must be a JSON object'
@@ -5,71 +5,108 @@ const https = require('https');
 
 const AIML_URL = process.env.AIML_URL || 'http://localhost:5001';
 const httpModule = AIML_URL.startsWith('https') ? https : http;
+const AIML_TIMEOUT_MS = parseInt(process.env.AIML_TIMEOUT_MS, 10) || 60000;
 
-// Helper to proxy requests to the Python AI service
+// Pooled keep-alive connections to the Python AI service
+const agent = new httpModule.Agent({
+  keepAlive: true,
+  maxSockets: parseInt(process.env.AIML_MAX_SOCKETS, 10) || 32,
+});
+
+// Upstream headers forwarded to the client unchanged
+const PASSTHROUGH_HEADERS = ['content-type', 'content-length', 'cache-control', 'etag', 'last-modified', 'server-timing', 'retry-after', 'location', 'x-accel-buffering'];
+
+// Helper to proxy requests to the Python AI service.
+// The upstream response is piped through as-is (no buffering or JSON
+// re-serialization), so large blueprint payloads stream with backpressure
+// and NDJSON / server-sent event lines reach the client as they are written.
 function proxyToAI(aiPath, req, res) {
-  const postData = JSON.stringify(req.body);
   const url = new URL(aiPath, AIML_URL);
+  const postData = req.method === 'GET' ? null : JSON.stringify(req.body || {});
+
+  const headers = { Accept: req.headers.accept || 'application/json' };
+  if (postData !== null) {
+    headers['Content-Type'] = 'application/json';
+    headers['Content-Length'] = Buffer.byteLength(postData);
+  }
+  if (req.headers['if-none-match']) headers['If-None-Match'] = req.headers['if-none-match'];
 
   const options = {
     hostname: url.hostname,
     port: url.port,
-    path: url.pathname,
+    path: url.pathname + url.search,
     method: req.method,
-    headers: {
-      'Content-Type': 'application/json',
-      'Content-Length': Buffer.byteLength(postData),
-    },
+    headers,
+    agent,
+    timeout: AIML_TIMEOUT_MS,
   };
 
   const proxyReq = httpModule.request(options, (proxyRes) => {
-    let data = '';
-    proxyRes.on('data', (chunk) => { data += chunk; });
-    proxyRes.on('end', () => {
-      try {
-        res.status(proxyRes.statusCode).json(JSON.parse(data));
-      } catch {
-        res.status(500).json({ message: 'Invalid response from AI service' });
-      }
+    res.status(proxyRes.statusCode);
+    PASSTHROUGH_HEADERS.forEach((h) => {
+      if (proxyRes.headers[h]) res.setHeader(h, proxyRes.headers[h]);
     });
+    proxyRes.pipe(res);
+  });
+
+  proxyReq.on('timeout', () => {
+    proxyReq.destroy(Object.assign(new Error('AI service timed out'), { code: 'ETIMEDOUT' }));
+  });
+
+  proxyReq.on('error', (err) => {
+    if (res.headersSent) {
+      res.destroy(err);
+    } else if (err.code === 'ETIMEDOUT') {
+      res.status(504).json({ message: 'AI service timed out.' });
+    } else {
+      res.status(503).json({ message: 'AI service is unavailable. Make sure the Python server is running on port 5001.' });
+    }
   });
 
-  proxyReq.on('error', () => {
-    res.status(503).json({ message: 'AI service is unavailable. Make sure the Python server is running on port 5001.' });
+  // Stop the upstream work if the client goes away mid-response
+  res.on('close', () => {
+    if (!res.writableFinished) proxyReq.destroy();
   });
 
-  proxyReq.write(postData);
+  if (postData !== null) proxyReq.write(postData);
   proxyReq.end();
 }
 
-// AI Blueprint Generation
+// AI Blueprint Generation ({ stream: true } returns NDJSON, one line per floor as it renders)
 router.post('/blueprint', (req, res) => proxyToAI('/api/ai/blueprint', req, res));
 
+// Background blueprint jobs: submit, poll status, or stream progress (server-sent events)
+router.post('/blueprint/jobs', (req, res) => proxyToAI('/api/ai/blueprint/jobs', req, res));
+router.get('/blueprint/jobs/:id', (req, res) =>
+  proxyToAI(`/api/ai/blueprint/jobs/${encodeURIComponent(req.params.id)}`, req, res));
+router.get('/blueprint/jobs/:id/events', (req, res) =>
+  proxyToAI(`/api/ai/blueprint/jobs/${encodeURIComponent(req.params.id)}/events`, req, res));
+
+// Blueprint floor images (content-addressed, long-lived cache headers)
+router.get('/blueprint/image/:file', (req, res) =>
+  proxyToAI(`/api/ai/blueprint/image/${encodeURIComponent(req.params.file)}`, req, res));
+
 // AI Cost Estimation (ML model)
 router.post('/estimate', (req, res) => proxyToAI('/api/ai/estimate', req, res));
 
+// AI Batch Cost Estimation (many configurations, one model call)
+router.post('/estimate/batch', (req, res) => proxyToAI('/api/ai/estimate/batch', req, res));
+
 // AI Quotation (ML model)
 router.post('/quotation', (req, res) => proxyToAI('/api/ai/quotation', req, res));
 
 // AI Budget Prediction (ML model)
 router.post('/prediction', (req, res) => proxyToAI('/api/ai/prediction', req, res));
 
+// AI Scenario Sweep (cost surface over an area × quality × floors × materials grid)
+router.post('/sweep', (req, res) => proxyToAI('/api/ai/sweep', req, res));
+
 // AI Market Rates
-router.get('/market-rates', (req, res) => {
-  const url = new URL('/api/ai/market-rates', AIML_URL);
-  httpModule.get(url.href, (proxyRes) => {
-    let data = '';
-    proxyRes.on('data', (chunk) => { data += chunk; });
-    proxyRes.on('end', () => {
-      try {
-        res.json(JSON.parse(data));
-      } catch {
-        res.status(500).json({ message: 'Invalid response from AI service' });
-      }
-    });
-  }).on('error', () => {
-    res.status(503).json({ message: 'AI service is unavailable.' });
-  });
-});
+router.get('/market-rates', (req, res) => proxyToAI('/api/ai/market-rates', req, res));
+
+// Precomputed estimate grid for offline quoting: manifest, then the .npy it points to
+router.get('/estimate-grid', (req, res) => proxyToAI('/api/ai/estimate-grid', req, res));
+router.get('/estimate-grid/:file', (req, res) =>
+  proxyToAI(`/api/ai/estimate-grid/${encodeURIComponent(req.params.file)}`, req, res));
 
 module.exports = router;
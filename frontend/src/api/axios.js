@@ -68,10 +68,18 @@ export const getMarketRates = () => API.get('/budget/rates');
 
 // AI/ML (Python service via proxy)
 export const generateBlueprint = (data) => API.post('/ai/blueprint', data);
+export const submitBlueprintJob = (data) => API.post('/ai/blueprint/jobs', data);
+export const getBlueprintJob = (id) => API.get(`/ai/blueprint/jobs/${id}`);
 export const aiEstimate = (data) => API.post('/ai/estimate', data);
+export const aiEstimateBatch = (items) => API.post('/ai/estimate/batch', { items });
 export const aiQuotation = (data) => API.post('/ai/quotation', data);
 export const aiPrediction = (data) => API.post('/ai/prediction', data);
 export const getAIMarketRates = () => API.get('/ai/market-rates');
+export const aiSweep = (data) => API.post('/ai/sweep', data);
+// Decode one base64 channel of a sweep response into a Float32Array (row-major over `order`)
+export const sweepChannel = (b64) => new Float32Array(Uint8Array.from(atob(b64), (c) => c.charCodeAt(0)).buffer);
+// Resolve a path returned by the AI service (e.g. a blueprint imageUrl) against the API origin
+export const aiAssetUrl = (path) => new URL(path, new URL(API.defaults.baseURL, window.location.origin)).href;
 
 // Notifications
 export const getNotifications = () => API.get('/notifications');
@@ -1,6 +1,6 @@
 import { useState } from 'react';
 import GlassCard from '../../components/common/GlassCard';
-import { generateBlueprint, aiEstimate } from '../../api/axios';
+import { generateBlueprint, aiEstimate, aiAssetUrl } from '../../api/axios';
 
 export default function AIDesigner() {
   const [formData, setFormData] = useState({
@@ -149,7 +149,7 @@ export default function AIDesigner() {
               {/* Blueprint Image */}
               <div className="flex justify-center bg-gray-900/80 rounded-lg p-4 border border-gray-700/50">
                 <img
-                  src={`data:image/png;base64,${floor.image}`}
+                  src={floor.imageUrl ? aiAssetUrl(floor.imageUrl) : `data:image/png;base64,${floor.image}`}
                   alt={floor.label}
                   className="max-w-full rounded shadow-lg"
                 />
@@ -179,6 +179,9 @@ export default function AIDesigner() {
           <h3 className="text-xl font-bold mb-2">ML Cost Estimation</h3>
           <p className="text-sm text-gray-400 mb-4">Confidence: <span className="text-green-400 font-semibold">{(estimate.confidence * 100).toFixed(0)}%</span></p>
           <p className="text-4xl font-bold neon-yellow-text mb-4">₹{estimate.estimatedCost?.toLocaleString('en-IN')}</p>
+          {estimate.interval && (
+            <p className="text-sm text-gray-400 -mt-2 mb-4">Likely range (P10–P90): ₹{estimate.interval.p10?.toLocaleString('en-IN')} – ₹{estimate.interval.p90?.toLocaleString('en-IN')}</p>
+          )}
 
           <div className="grid md:grid-cols-2 gap-6">
             {/* Breakdown */}